@@ -0,0 +1,113 @@
+"""
+Benchmarks `HubConnection.get_dataset()`'s single-pass multi-format discovery against the previous approach of calling
+`ds.dataset()` once per `admin.json` file format. Run from the repo root, e.g.:
+
+    uv run python benchmarks/bench_get_dataset.py --num-files 50000
+"""
+
+import datetime
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pyarrow import csv
+
+from hubdata import HubConnection, connect_hub
+
+FILE_FORMATS = ('csv', 'parquet', 'arrow')
+
+
+def make_multi_format_hub(hub_dir: Path, num_files: int, num_models: int):
+    """
+    Writes a minimal synthetic hub to `hub_dir` that has `num_files` single-row model output files spread across
+    `num_models` model directories, cycling through the csv, parquet, and arrow formats.
+    """
+    (hub_dir / 'hub-config').mkdir(parents=True)
+    num_rounds = -(-num_files // num_models)  # ceiling
+    round_ids = [(datetime.date(2000, 1, 1) + datetime.timedelta(weeks=idx)).isoformat() for idx in range(num_rounds)]
+    with open(hub_dir / 'hub-config' / 'admin.json', 'w') as fp:
+        json.dump({'name': 'bench', 'file_format': list(FILE_FORMATS), 'model_output_dir': 'model-output'}, fp)
+    with open(hub_dir / 'hub-config' / 'tasks.json', 'w') as fp:
+        json.dump({'rounds': [{'round_id_from_variable': True, 'round_id': 'reference_date', 'model_tasks': [{
+            'task_ids': {'reference_date': {'required': None, 'optional': round_ids},
+                         'location': {'required': None, 'optional': ['US']}},
+            'output_type': {'mean': {'output_type_id': {'required': ['NA']},
+                                     'value': {'type': 'double'}}}}]}]}, fp)
+    with open(hub_dir / 'hub-config' / 'model-metadata-schema.json', 'w') as fp:
+        json.dump({}, fp)
+
+    file_idx = 0
+    for round_id in round_ids:
+        for model_idx in range(num_models):
+            if file_idx == num_files:
+                return
+
+            model_id = f'team{model_idx}-model'
+            model_dir = hub_dir / 'model-output' / model_id
+            model_dir.mkdir(parents=True, exist_ok=True)
+            table = pa.table({'reference_date': [datetime.date.fromisoformat(round_id)], 'location': ['US'],
+                              'output_type': ['mean'], 'output_type_id': ['NA'], 'value': [float(file_idx)]})
+            file_format = FILE_FORMATS[file_idx % len(FILE_FORMATS)]
+            file_path = model_dir / f'{round_id}-{model_id}.{file_format}'
+            if file_format == 'csv':
+                csv.write_csv(table, file_path)
+            elif file_format == 'parquet':
+                pq.write_table(table, file_path)
+            else:
+                feather.write_feather(table, file_path, compression='uncompressed')
+            file_idx += 1
+
+
+def legacy_get_dataset(hub_connection: HubConnection, ignore_files=('README', '.DS_Store')) -> ds.Dataset:
+    """
+    The pre-single-pass `get_dataset()` implementation: one `ds.dataset()` discovery (and invalid file scan) per format.
+    """
+    model_out_files = hub_connection._list_model_out_files()
+    datasets = []
+    for file_format in hub_connection.admin['file_format']:
+        _ignore_files = [file_info for file_info in model_out_files
+                         if (file_info.extension != file_format)
+                         or any([file_info.base_name.startswith(ignore_file) for ignore_file in ignore_files])]
+        datasets.append(ds.dataset(hub_connection.model_output_dir, filesystem=hub_connection._filesystem,
+                                   format=file_format, schema=hub_connection.schema, partitioning=['model_id'],
+                                   exclude_invalid_files=False,
+                                   ignore_prefixes=[file_info.base_name for file_info in _ignore_files]))
+    return ds.dataset([dataset for dataset in datasets if len(dataset.files) != 0])
+
+
+def _best_time(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@click.command()
+@click.option('--num-files', default=50_000, show_default=True)
+@click.option('--num-models', default=50, show_default=True)
+@click.option('--repeat', default=3, show_default=True)
+def main(num_files, num_models, repeat):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hub_dir = Path(tmp_dir) / 'hub'
+        click.echo(f'writing synthetic hub: {num_files:,} files, {num_models} models')
+        make_multi_format_hub(hub_dir, num_files, num_models)
+        hub_connection = connect_hub(hub_dir)
+        assert legacy_get_dataset(hub_connection).count_rows() == hub_connection.get_dataset().count_rows()
+
+        legacy_secs = _best_time(lambda: legacy_get_dataset(hub_connection), repeat)
+        single_pass_secs = _best_time(lambda: hub_connection.get_dataset(), repeat)
+        click.echo(f'per-format discovery: {legacy_secs:.3f}s')
+        click.echo(f'single-pass discovery: {single_pass_secs:.3f}s')
+        click.echo(f'speedup: {legacy_secs / single_pass_secs:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmarks serial vs. concurrent model output listing (`connect_hub(..., list_concurrency=N)`) against a local hub
+wrapped in a latency-injecting file system that mimics an object store: each listing request costs a fixed round trip,
+and listings are paginated. Run from the repo root, e.g.:
+
+    uv run python benchmarks/bench_listing.py --num-files 20000 --latency-ms 50
+"""
+
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import click
+from pyarrow import fs
+from synthetic_hub import make_synthetic_hub
+
+from hubdata import connect_hub
+
+
+class LatencyFileSystemHandler(fs.FileSystemHandler):
+    """
+    A pyarrow FileSystemHandler that delegates to a wrapped fs.FileSystem, sleeping `latency_secs` per listing request.
+    Like S3's ListObjectsV2, a listing returns at most `page_size` entries per request, so large listings need several
+    sequential requests.
+    """
+
+
+    def __init__(self, wrapped_fs: fs.FileSystem, latency_secs: float, page_size: int = 1000):
+        self.wrapped_fs = wrapped_fs
+        self.latency_secs = latency_secs
+        self.page_size = page_size
+
+
+    def __eq__(self, other):
+        return isinstance(other, LatencyFileSystemHandler) and (self.wrapped_fs == other.wrapped_fs)
+
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+    def get_type_name(self):
+        return f'latency+{self.wrapped_fs.type_name}'
+
+
+    def normalize_path(self, path):
+        return self.wrapped_fs.normalize_path(path)
+
+
+    def get_file_info(self, paths):
+        time.sleep(self.latency_secs * len(paths))
+        return self.wrapped_fs.get_file_info(paths)
+
+
+    def get_file_info_selector(self, selector):
+        file_infos = self.wrapped_fs.get_file_info(selector)
+        time.sleep(self.latency_secs * (1 + len(file_infos) // self.page_size))
+        return file_infos
+
+
+    def open_input_stream(self, path):
+        time.sleep(self.latency_secs)
+        return self.wrapped_fs.open_input_stream(path)
+
+
+    def open_input_file(self, path):
+        time.sleep(self.latency_secs)
+        return self.wrapped_fs.open_input_file(path)
+
+
+    # the benchmark only reads, so mutators are unsupported rather than delegated, e.g., so that
+    # `delete_root_dir_contents()` can never empty the wrapped file system
+    def create_dir(self, path, recursive):
+        raise NotImplementedError
+
+
+    def delete_dir(self, path):
+        raise NotImplementedError
+
+
+    def delete_dir_contents(self, path, missing_dir_ok=False):
+        raise NotImplementedError
+
+
+    def delete_root_dir_contents(self):
+        raise NotImplementedError
+
+
+    def delete_file(self, path):
+        raise NotImplementedError
+
+
+    def move(self, src, dest):
+        raise NotImplementedError
+
+
+    def copy_file(self, src, dest):
+        raise NotImplementedError
+
+
+    def open_output_stream(self, path, metadata):
+        raise NotImplementedError
+
+
+    def open_append_stream(self, path, metadata):
+        raise NotImplementedError
+
+
+@click.command()
+@click.option('--num-files', default=20_000, show_default=True)
+@click.option('--num-models', default=100, show_default=True)
+@click.option('--latency-ms', default=50, show_default=True, help='simulated round trip per listing request')
+@click.option('--concurrency', default=16, show_default=True)
+def main(num_files, num_models, latency_ms, concurrency):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hub_dir = Path(tmp_dir) / 'hub'
+        hub_info = make_synthetic_hub(hub_dir, num_models=num_models, num_rounds=math.ceil(num_files / num_models),
+                                      num_rows=1)
+        click.echo(f"wrote synthetic hub: {hub_info['num_files']:,} files, {num_models} models")
+
+        latency_fs = fs.PyFileSystem(LatencyFileSystemHandler(fs.LocalFileSystem(), latency_ms / 1000))
+        results = {}
+        for list_concurrency in (None, concurrency):
+            hub_connection = connect_hub(hub_dir, list_concurrency=list_concurrency)
+            hub_connection._filesystem = latency_fs  # list through the latency-injecting wrapper
+            start = time.perf_counter()
+            model_out_files = hub_connection._list_model_out_files()
+            results[list_concurrency] = (time.perf_counter() - start, sorted(_.path for _ in model_out_files))
+
+        assert results[None][1] == results[concurrency][1]
+        click.echo(f'serial listing: {results[None][0]:.3f}s')
+        click.echo(f'concurrent listing ({concurrency} threads): {results[concurrency][0]:.3f}s')
+        click.echo(f'speedup: {results[None][0] / results[concurrency][0]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmarks `hubdata.scoring`'s vectorized `score_quantiles()` and `score_samples()` against a naive reference that
+scores one forecast at a time in Python, using a synthetic FluSight-sized round of model output joined with oracle
+output (as `join_oracle()` yields it). Checks that both compute the same scores. Run from the repo root, e.g.:
+
+    uv run python benchmarks/bench_scoring.py --num-models 50 --num-samples 100
+"""
+
+import itertools
+import random
+import time
+
+import click
+import pyarrow as pa
+
+from hubdata.scoring import NON_FORECAST_COLUMNS, score_quantiles, score_samples
+
+QUANTILE_LEVELS = [0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8,
+                   0.85, 0.9, 0.95, 0.975, 0.99]
+
+TASK_IDS = {
+    'target': ['wk inc flu hosp', 'wk inc covid hosp'],
+    'horizon': [0, 1, 2, 3],
+    'location': ['US'] + [f'{fips:02}' for fips in range(1, 57)],
+}
+
+
+def make_joined_table(output_type: str, num_models: int, num_samples: int, seed: int = 0) -> pa.Table:
+    """
+    :return: a `join_oracle()`-like table with one forecast per model and TASK_IDS combination: QUANTILE_LEVELS
+        quantiles if `output_type` is 'quantile', or `num_samples` samples if it's 'sample'
+    """
+    rng = random.Random(seed)
+    output_type_ids = [str(level) for level in QUANTILE_LEVELS] if output_type == 'quantile' \
+        else [str(sample_idx) for sample_idx in range(num_samples)]
+    columns = {col_name: [] for col_name in list(TASK_IDS) + ['model_id', 'output_type', 'output_type_id', 'value',
+                                                               'oracle_value']}
+    for task_id_values in itertools.product(*TASK_IDS.values()):
+        oracle_value = rng.uniform(0, 1000)
+        for model_idx in range(num_models):
+            center, spread = oracle_value * rng.uniform(0.5, 1.5), rng.uniform(10, 200)
+            values = sorted(rng.gauss(center, spread) for _ in output_type_ids)  # NB: sorted so quantiles increase
+            for output_type_id, value in zip(output_type_ids, values):
+                for col_name, task_id_value in zip(TASK_IDS, task_id_values):
+                    columns[col_name].append(task_id_value)
+                columns['model_id'].append(f'team{model_idx}-model')
+                columns['output_type'].append(output_type)
+                columns['output_type_id'].append(output_type_id)
+                columns['value'].append(value)
+                columns['oracle_value'].append(oracle_value)
+    return pa.table(columns)
+
+
+def naive_scores(table: pa.Table) -> dict[tuple, float]:
+    """
+    The reference: groups rows into forecasts in Python and scores each one with per-row loops. WIS is the mean of
+    twice the pinball losses, and CRPS uses the O(m^2) pairwise definition.
+
+    :return: a dict that maps forecast tuples (model_id and task ID values) to their WIS or CRPS
+    """
+    forecast_columns = [col_name for col_name in table.column_names if col_name not in NON_FORECAST_COLUMNS]
+    forecast_to_rows = {}
+    for row in table.to_pylist():
+        forecast_to_rows.setdefault(tuple(row[col_name] for col_name in forecast_columns), []).append(row)
+
+    forecast_to_score = {}
+    for forecast, rows in forecast_to_rows.items():
+        oracle_value = rows[0]['oracle_value']
+        if rows[0]['output_type'] == 'quantile':
+            losses = [2 * (oracle_value - row['value']) * (float(row['output_type_id'])
+                                                           - (1 if oracle_value < row['value'] else 0))
+                      for row in rows]
+            forecast_to_score[forecast] = sum(losses) / len(losses)
+        else:
+            values = [row['value'] for row in rows]
+            forecast_to_score[forecast] = sum(abs(value - oracle_value) for value in values) / len(values) \
+                - sum(abs(value1 - value2) for value1 in values for value2 in values) / (2 * len(values) ** 2)
+    return forecast_to_score
+
+
+def _timed(func) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+@click.command()
+@click.option('--num-models', default=50, show_default=True)
+@click.option('--num-samples', default=100, show_default=True)
+def main(num_models, num_samples):
+    for output_type, score_fcn, score_name in [('quantile', score_quantiles, 'wis'),
+                                               ('sample', score_samples, 'crps')]:
+        table = make_joined_table(output_type, num_models, num_samples)
+        vectorized_secs, scores = _timed(lambda: score_fcn(table))
+        naive_secs, forecast_to_score = _timed(lambda: naive_scores(table))
+
+        forecast_columns = [col_name for col_name in scores.column_names if col_name in table.column_names]
+        for row in scores.to_pylist():
+            exp_score = forecast_to_score[tuple(row[col_name] for col_name in forecast_columns)]
+            assert abs(row[score_name] - exp_score) <= 1e-6 * max(1.0, abs(exp_score)), (row, exp_score)
+
+        click.echo(f'{output_type}: {table.num_rows:,} rows, {scores.num_rows:,} forecasts')
+        click.echo(f'  naive: {naive_secs:.3f}s')
+        click.echo(f'  vectorized: {vectorized_secs:.3f}s')
+        click.echo(f'  speedup: {naive_secs / vectorized_secs:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Runs repeatable timed scenarios against a synthetic hub (see **synthetic_hub.py**) and writes the results as JSON so
+that runs can be compared over time: listing, schema creation, dataset creation, full (serial and process pool) and
+filtered scans, time series and oracle output target data reads, and ensembles. Run from the repo root, e.g.:
+
+    uv run python benchmarks/bench_suite.py --num-models 20 --num-rounds 52 --file-format csv --output before.json
+    # ... change something ...
+    uv run python benchmarks/bench_suite.py --num-models 20 --num-rounds 52 --file-format csv --output after.json \
+        --baseline before.json
+"""
+
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import pyarrow as pa
+from synthetic_hub import DEFAULT_SPEC, FILE_FORMATS, make_synthetic_hub
+
+import hubdata
+from hubdata import connect_hub, connect_target_data
+from hubdata.create_hub_schema import _clear_schema_cache
+from hubdata.create_target_data_schema import TargetType
+
+RESULTS_VERSION = 1
+
+
+def scenarios(hub_dir: Path, spec: dict) -> dict:
+    """
+    :return: a dict that maps scenario names to no-arg functions that run them against the hub in `hub_dir`. each
+        function returns a count that can be used to check that runs did the same work (e.g., the number of rows read),
+        or None
+    """
+    hub_connection = connect_hub(hub_dir)
+    round_id = hub_connection.tasks['rounds'][0]['model_tasks'][0]['task_ids'][spec['round_id']]['optional'][-1]
+    location = spec['task_ids']['location'][-1] if 'location' in spec['task_ids'] else None
+
+    def connect():
+        connect_hub(hub_dir)
+
+    def create_schema():
+        _clear_schema_cache()  # NB: otherwise we'd time the memoized schema
+        hubdata.create_hub_schema(hub_connection.tasks)
+
+    def filtered_scan():
+        # a typical query: one round of one output type (and one location if the spec has one)
+        filters = {spec['round_id']: round_id, 'output_type': next(iter(spec['output_types']))}
+        if location is not None:
+            filters['location'] = location
+        return hub_connection.query(**filters).to_table().num_rows
+
+    return {
+        'connect_hub': connect,
+        'list_files': lambda: len(hub_connection._list_model_out_files()),
+        'create_hub_schema': create_schema,
+        'get_dataset': lambda: len(hub_connection.get_dataset().files),
+        'full_scan': lambda: hub_connection.to_table().num_rows,
+        'full_scan_processes': lambda: hub_connection.to_table(parallel='processes').num_rows,
+        'filtered_scan': filtered_scan,
+        'count_rows': lambda: hub_connection.get_dataset().count_rows(),
+        'time_series': lambda: connect_target_data(hub_dir, TargetType.TIME_SERIES).to_table().num_rows,
+        'oracle_output': lambda: connect_target_data(hub_dir, TargetType.ORACLE_OUTPUT).to_table().num_rows,
+        'ensemble_mean': lambda: hubdata.build_ensemble(hub_connection).num_rows,
+        'ensemble_median': lambda: hubdata.build_ensemble(hub_connection, agg='median').num_rows,
+    }
+
+
+def time_scenario(scenario_fcn, repeat: int, warmup: int) -> dict:
+    """
+    Runs `scenario_fcn` `warmup` times untimed and then `repeat` times timed.
+
+    :return: a dict with the timings in seconds: 'min', 'median', 'max', and 'times', plus 'count' as returned by
+        `scenario_fcn`
+    """
+    for _ in range(warmup):
+        scenario_fcn()
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        count = scenario_fcn()
+        times.append(time.perf_counter() - start_time)
+    return {'min': min(times), 'median': statistics.median(times), 'max': max(times), 'times': times,
+            'count': count}
+
+
+@click.command()
+@click.option('--spec', 'spec_file', type=click.Path(exists=True, path_type=Path),
+              help='JSON file with a synthetic hub spec. defaults to synthetic_hub.DEFAULT_SPEC')
+@click.option('--num-models', default=10, show_default=True)
+@click.option('--num-rounds', default=10, show_default=True)
+@click.option('--num-rows', type=int, help="rows per model output file. defaults to all of the spec's combinations")
+@click.option('--file-format', type=click.Choice(FILE_FORMATS), default='csv', show_default=True)
+@click.option('--scenario', 'scenario_names', multiple=True,
+              help='a scenario to run. can be repeated. defaults to all of them')
+@click.option('--repeat', default=5, show_default=True, help='timed runs per scenario')
+@click.option('--warmup', default=1, show_default=True, help='untimed runs per scenario, e.g., to warm OS caches')
+@click.option('--output', type=click.Path(path_type=Path), help='JSON file to write results to. defaults to stdout')
+@click.option('--baseline', type=click.Path(exists=True, path_type=Path),
+              help='JSON results of an earlier run to compare median times against')
+def main(spec_file, num_models, num_rounds, num_rows, file_format, scenario_names, repeat, warmup, output, baseline):
+    spec = json.loads(spec_file.read_text()) if spec_file else DEFAULT_SPEC
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hub_dir = Path(tmp_dir) / 'hub'
+        hub_info = make_synthetic_hub(hub_dir, spec, num_models, num_rounds, num_rows, file_format)
+        click.echo(f'wrote synthetic hub: {json.dumps(hub_info)}', err=True)
+        name_to_scenario = scenarios(hub_dir, spec)
+        unknown_names = set(scenario_names) - set(name_to_scenario)
+        if unknown_names:
+            raise click.BadParameter(f'unknown scenarios: {sorted(unknown_names)}. valid ones: '
+                                     f'{list(name_to_scenario)}', param_hint='--scenario')
+
+        scenario_results = {}
+        for scenario_name, scenario_fcn in name_to_scenario.items():
+            if scenario_names and (scenario_name not in scenario_names):
+                continue
+
+            scenario_results[scenario_name] = time_scenario(scenario_fcn, repeat, warmup)
+            click.echo(f'{scenario_name}: {scenario_results[scenario_name]["median"]:.4f}s (median)', err=True)
+
+    results = {'version': RESULTS_VERSION,
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+               'environment': {'hubdata': hubdata.__version__, 'pyarrow': pa.__version__,
+                               'python': sys.version.split()[0], 'platform': platform.platform(),
+                               'cpu_count': pa.cpu_count()},
+               'hub': hub_info | {'spec': spec},
+               'repeat': repeat,
+               'warmup': warmup,
+               'scenarios': scenario_results}
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+    else:
+        click.echo(json.dumps(results, indent=2))
+
+    if baseline:
+        baseline_results = json.loads(baseline.read_text())
+        for scenario_name, scenario_result in scenario_results.items():
+            baseline_result = baseline_results['scenarios'].get(scenario_name)
+            if baseline_result is not None:
+                click.echo(f'{scenario_name}: {baseline_result["median"] / scenario_result["median"]:.2f}x '
+                           f'faster than baseline', err=True)
+
+
+if __name__ == '__main__':
+    main()
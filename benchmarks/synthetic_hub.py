@@ -0,0 +1,191 @@
+"""
+Writes synthetic hubs of a given size for benchmarking: `num_models` models x `num_rounds` rounds, each model output
+file having `num_rows` rows, in csv, parquet, or arrow format, plus time series and oracle output target data. The
+hub's task IDs and output types come from a small tasks.json-like spec (see `DEFAULT_SPEC`). Generation is
+deterministic, so the same arguments always write the same hub. Used by **bench_suite.py**, and can be run from the
+repo root to write a hub for other experiments, e.g.:
+
+    uv run python benchmarks/synthetic_hub.py /tmp/bench-hub --num-models 20 --num-rounds 52 --file-format parquet
+"""
+
+import datetime
+import itertools
+import json
+from pathlib import Path
+
+import click
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pyarrow import csv
+
+from hubdata import create_hub_schema
+
+FILE_FORMATS = ('csv', 'parquet', 'arrow')
+
+# a spec has:
+# - 'round_id': the name of the round ID task ID. its values are weekly dates, one per round
+# - 'task_ids': the other task IDs, mapped to their value lists
+# - 'output_types': output type names mapped to their output type ID lists. None means the output type has no IDs
+#   (e.g., 'mean')
+# - 'observable_unit': the task IDs that identify a target data observation, together with the round ID's date
+# each model output file has one row per combination of task ID values and output type IDs, truncated to `num_rows`
+DEFAULT_SPEC = {
+    'round_id': 'reference_date',
+    'task_ids': {
+        'target': ['wk inc flu hosp', 'wk inc covid hosp'],
+        'horizon': [-1, 0, 1, 2, 3],
+        'location': ['US'] + [f'{fips:02}' for fips in range(1, 57)],
+    },
+    'output_types': {
+        'quantile': [0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75,
+                     0.8, 0.85, 0.9, 0.95, 0.975, 0.99],
+        'mean': None,
+    },
+    'observable_unit': ['target', 'location'],
+}
+
+
+def round_ids(num_rounds: int) -> list[str]:
+    """
+    :return: `num_rounds` weekly ISO dates, starting on a Saturday
+    """
+    return [(datetime.date(2023, 10, 14) + datetime.timedelta(weeks=idx)).isoformat() for idx in range(num_rounds)]
+
+
+def spec_to_tasks(spec: dict, num_rounds: int) -> dict:
+    """
+    :return: a hub's tasks.json contents for `spec` with `num_rounds` rounds
+    """
+    task_ids = {spec['round_id']: {'required': None, 'optional': round_ids(num_rounds)}}
+    task_ids.update({task_id: {'required': None, 'optional': values} for task_id, values in spec['task_ids'].items()})
+    output_types = {output_type: {'output_type_id': {'required': output_type_ids}
+                                  if output_type_ids is not None else {'required': None, 'optional': ['NA']},
+                                  'value': {'type': 'double', 'minimum': 0}}
+                    for output_type, output_type_ids in spec['output_types'].items()}
+    return {'schema_version': 'https://raw.githubusercontent.com/hubverse-org/schemas/main/v5.0.0/tasks-schema.json',
+            'rounds': [{'round_id_from_variable': True, 'round_id': spec['round_id'],
+                        'model_tasks': [{'task_ids': task_ids, 'output_type': output_types}]}]}
+
+
+def make_synthetic_hub(hub_dir: Path, spec: dict = DEFAULT_SPEC, num_models: int = 10, num_rounds: int = 10,
+                       num_rows: int | None = None, file_format: str = 'parquet') -> dict:
+    """
+    Writes a synthetic hub to `hub_dir`, which must not exist or be empty.
+
+    :param hub_dir: the hub's root directory
+    :param spec: a spec as documented at `DEFAULT_SPEC`
+    :param num_models: number of model directories
+    :param num_rounds: number of rounds. each model has one file per round
+    :param num_rows: number of rows per model output file. defaults to all combinations of `spec`'s task ID values and
+        output type IDs
+    :param file_format: one of FILE_FORMATS. target data is written as csv if 'csv', and as parquet otherwise
+    :return: a dict that summarizes the hub: 'num_models', 'num_rounds', 'num_rows' (per file), 'num_files',
+        'file_format', and 'model_output_rows'
+    :raise: ValueError if `num_rows` is larger than the number of combinations, or if `file_format` is invalid
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f'invalid file_format: {file_format!r}. must be one of {FILE_FORMATS}')
+
+    tasks = spec_to_tasks(spec, num_rounds)
+    schema = create_hub_schema(tasks)
+    rows_table = _model_output_rows(spec, schema, num_rows)
+    (hub_dir / 'hub-config').mkdir(parents=True)
+    _write_json(hub_dir / 'hub-config' / 'admin.json',
+                {'name': 'synthetic', 'file_format': [file_format], 'model_output_dir': 'model-output'})
+    _write_json(hub_dir / 'hub-config' / 'tasks.json', tasks)
+    _write_json(hub_dir / 'hub-config' / 'model-metadata-schema.json', {})
+    _write_json(hub_dir / 'hub-config' / 'target-data.json',
+                {'observable_unit': spec['observable_unit'], 'date_col': 'target_end_date'})
+
+    # model output: the same rows in each file, with the file's round ID and seeded random values
+    for model_idx in range(num_models):
+        model_id = f'team{model_idx}-model'
+        (hub_dir / 'model-output' / model_id).mkdir(parents=True)
+        for round_idx, round_id in enumerate(round_ids(num_rounds)):
+            table = rows_table \
+                .add_column(0, spec['round_id'], pa.array([datetime.date.fromisoformat(round_id)] * len(rows_table),
+                                                          schema.field(spec['round_id']).type)) \
+                .append_column('value', _random_values(len(rows_table), model_idx * num_rounds + round_idx))
+            _write_table(table, hub_dir / 'model-output' / model_id / f'{round_id}-{model_id}.{file_format}',
+                         file_format)
+
+    # target data: one observation per round date and observable unit
+    (hub_dir / 'target-data').mkdir()
+    unit_values = list(itertools.product(*[spec['task_ids'][task_id] for task_id in spec['observable_unit']]))
+    target_end_dates = [datetime.date.fromisoformat(round_id) for round_id in round_ids(num_rounds)
+                        for _ in unit_values]
+    target_columns = {task_id: pa.array([values[col_idx] for _ in range(num_rounds) for values in unit_values],
+                                        schema.field(task_id).type)
+                      for col_idx, task_id in enumerate(spec['observable_unit'])}
+    target_columns['target_end_date'] = pa.array(target_end_dates, pa.date32())
+    target_ext = 'csv' if file_format == 'csv' else 'parquet'
+    for target_name, value_col_name, seed in [('time-series', 'observation', -1),
+                                              ('oracle-output', 'oracle_value', -2)]:
+        table = pa.table(target_columns).append_column(value_col_name, _random_values(len(target_end_dates), seed))
+        _write_table(table, hub_dir / 'target-data' / f'{target_name}.{target_ext}', target_ext)
+
+    return {'num_models': num_models, 'num_rounds': num_rounds, 'num_rows': len(rows_table),
+            'num_files': num_models * num_rounds, 'file_format': file_format,
+            'model_output_rows': num_models * num_rounds * len(rows_table)}
+
+
+def _model_output_rows(spec: dict, schema: pa.Schema, num_rows: int | None) -> pa.Table:
+    """
+    :return: a pa.Table of the task ID, output_type, and output_type_id columns shared by every model output file,
+        i.e., one row per combination of `spec`'s task ID values and output type IDs, truncated to `num_rows`
+    """
+    task_ids = list(spec['task_ids'])
+    output_type_ids = [(output_type, output_type_id) for output_type, ids in spec['output_types'].items()
+                       for output_type_id in (ids if ids is not None else [None])]
+    combinations = itertools.product(*[spec['task_ids'][task_id] for task_id in task_ids], output_type_ids)
+    rows = list(itertools.islice(combinations, num_rows))
+    if (num_rows is not None) and (len(rows) < num_rows):
+        raise ValueError(f'num_rows is larger than the spec allows: {num_rows} > {len(rows)}. add task ID values or '
+                         f'output type IDs to the spec')
+
+    columns = {task_id: pa.array([row[col_idx] for row in rows], schema.field(task_id).type)
+               for col_idx, task_id in enumerate(task_ids)}
+    columns['output_type'] = pa.array([row[-1][0] for row in rows], schema.field('output_type').type)
+    columns['output_type_id'] = pa.array([row[-1][1] for row in rows]).cast(schema.field('output_type_id').type)
+    return pa.table(columns)
+
+
+def _random_values(num_values: int, seed: int) -> pa.Array:
+    """
+    :return: `num_values` repeatable random doubles in [0, 1000)
+    """
+    return pc.multiply(pc.random(num_values, initializer=seed), 1000)
+
+
+def _write_table(table: pa.Table, path: Path, file_format: str):
+    if file_format == 'csv':
+        csv.write_csv(table, path)
+    elif file_format == 'parquet':
+        pq.write_table(table, path)
+    else:
+        feather.write_feather(table, path, compression='uncompressed')
+
+
+def _write_json(path: Path, obj: dict):
+    with open(path, 'w') as fp:
+        json.dump(obj, fp, indent=2)
+
+
+@click.command()
+@click.argument('hub_dir', type=click.Path(path_type=Path))
+@click.option('--spec', 'spec_file', type=click.Path(exists=True, path_type=Path),
+              help='JSON file with a spec like DEFAULT_SPEC. defaults to DEFAULT_SPEC')
+@click.option('--num-models', default=10, show_default=True)
+@click.option('--num-rounds', default=10, show_default=True)
+@click.option('--num-rows', type=int, help="rows per model output file. defaults to all of the spec's combinations")
+@click.option('--file-format', type=click.Choice(FILE_FORMATS), default='parquet', show_default=True)
+def main(hub_dir, spec_file, num_models, num_rounds, num_rows, file_format):
+    spec = json.loads(spec_file.read_text()) if spec_file else DEFAULT_SPEC
+    hub_info = make_synthetic_hub(hub_dir, spec, num_models, num_rounds, num_rows, file_format)
+    click.echo(f'wrote synthetic hub to {hub_dir}: {json.dumps(hub_info)}')
+
+
+if __name__ == '__main__':
+    main()
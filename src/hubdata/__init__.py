@@ -1,9 +1,18 @@
+from hubdata.compact import compact_hub
 from hubdata.connect_hub import HubConnection, connect_hub
 from hubdata.connect_target_data import TargetDataConnection, connect_target_data
 from hubdata.create_hub_schema import create_hub_schema
 from hubdata.create_target_data_schema import create_target_data_schema
+from hubdata.ensemble import build_ensemble, write_model_output
+from hubdata.filesystems import register_filesystem
+from hubdata.join import join_oracle
+from hubdata.profiling import ProfileSummary, profile
+from hubdata.samples import compact_samples, expand_samples
+from hubdata.stats_index import build_stats_index
 
 __all__ = ['connect_hub', 'HubConnection', 'create_hub_schema', 'connect_target_data', 'TargetDataConnection',
-           'create_target_data_schema']
+           'create_target_data_schema', 'compact_hub', 'build_stats_index', 'profile',
+           'ProfileSummary', 'register_filesystem', 'join_oracle', 'build_ensemble',
+           'write_model_output', 'compact_samples', 'expand_samples']
 
 __version__ = '0.2.0'
@@ -1,3 +1,4 @@
+import functools
 from pathlib import Path
 
 import click
@@ -5,10 +6,15 @@ import pyarrow as pa
 import structlog
 from rich.console import Console, Group
 from rich.panel import Panel
+from rich.table import Table
 
-from hubdata import connect_hub, connect_target_data
+from hubdata import build_stats_index, compact_hub, connect_hub, connect_target_data
+from hubdata.compact import DEFAULT_ROW_GROUP_SIZE
+from hubdata.connect_hub import _read_stats_index
 from hubdata.create_target_data_schema import TargetType
+from hubdata.fragment_cache import DEFAULT_CACHE_MAX_BYTES, FragmentCache
 from hubdata.logging import setup_logging
+from hubdata.profiling import ProfileSummary, profile
 
 setup_logging()
 logger = structlog.get_logger()
@@ -19,8 +25,60 @@ def cli():
     pass
 
 
+def _profile_option(command_fcn):
+    """
+    A decorator that adds a `--profile` flag to a subcommand. When passed, the subcommand is run inside a `profile()`
+    block, which logs timing events as they happen, and a summary of them is printed at the end.
+    """
+
+
+    @click.option('--profile', 'do_profile', is_flag=True, help='log timing events and print a summary of them')
+    @functools.wraps(command_fcn)
+    def wrapper(*args, do_profile, **kwargs):
+        if not do_profile:
+            return command_fcn(*args, **kwargs)
+
+        with profile() as profile_summary:
+            command_fcn(*args, **kwargs)
+        _print_profile_summary(profile_summary)
+
+
+    return wrapper
+
+
+def _print_profile_summary(profile_summary: ProfileSummary):
+    console = Console()
+    totals = profile_summary.totals()
+    duration_lines = ['[b]durations[/b]:']
+    for event_name, duration in totals['durations'].items():
+        duration_lines.append(f'- [green]{event_name}[/green]: [bright_magenta]{duration * 1000:,.1f} ms '
+                              f'({totals["counts"][event_name]:,})[/bright_magenta]')
+    files_per_format = ', '.join(f'{file_format}: {num_files:,}'
+                                 for file_format, num_files in totals['files_per_format'].items())
+    count_lines = ['\n[b]totals[/b]:',
+                   f'- [green]files[/green]: [bright_magenta]{files_per_format or "none listed"}[/bright_magenta]',
+                   f'- [green]bytes[/green]: [bright_magenta]{totals["num_bytes"]:,}[/bright_magenta]',
+                   f'- [green]rows[/green]: [bright_magenta]{totals["num_rows"]:,}[/bright_magenta]',
+                   f'- [green]batches[/green]: [bright_magenta]{totals["num_batches"]:,}[/bright_magenta]',
+                   f'- [green]cast[/green]: [bright_magenta]{totals["cast_duration"] * 1000:,.1f} ms[/bright_magenta]']
+
+    # finally, print a Panel containing all the groups
+    console.print(
+        Panel(
+            Group(Group(*duration_lines), Group(*count_lines)),
+            border_style='green',
+            expand=False,
+            padding=(1, 2),
+            subtitle='[italic]hubdata[/italic]',
+            subtitle_align='right',
+            title='[bright_red]profile[/bright_red]',
+            title_align='left')
+    )
+
+
 @cli.command(name='schema')
 @click.argument('hub_path')
+@_profile_option
 def print_schema(hub_path):
     """
     A subcommand that prints the output of `create_hub_schema()` for `hub_path`.
@@ -61,6 +119,7 @@ def print_schema(hub_path):
 
 @cli.command(name='dataset')
 @click.argument('hub_path')
+@_profile_option
 def print_dataset_info(hub_path):
     """
     A subcommand that prints dataset information for `hub_path`.
@@ -115,8 +174,211 @@ def print_dataset_info(hub_path):
     )
 
 
+@cli.command(name='compact')
+@click.argument('hub_path')
+@click.option('--partition-by-round', is_flag=True, help='also partition by the round ID column')
+@click.option('--row-group-size', default=DEFAULT_ROW_GROUP_SIZE, show_default=True,
+              help='target number of rows per Parquet row group')
+@click.option('--full', is_flag=True, help='rewrite all models, not only those whose files changed')
+@_profile_option
+def compact(hub_path, partition_by_round, row_group_size, full):
+    """
+    A subcommand that rewrites `hub_path`'s model output into a compacted, hive-partitioned Parquet mirror via
+    `compact_hub()`, and then prints information about the mirror. Only models whose files changed since the last
+    compaction are rewritten unless `--full` is passed.
+
+    :param hub_path: as passed to `connect_hub()`: either a local file system hub path or a cloud-based hub URI.
+        Note: A local file system path must be an ABSOLUTE path and not a relative one
+    """
+    console = Console()
+    try:
+        with console.status('Compacting model output...'):
+            compacted_dir = compact_hub(hub_path, partition_by_round=partition_by_round,
+                                        row_group_size=row_group_size, full=full)
+            compacted_ds = connect_hub(hub_path, prefer_compacted=True).get_dataset()
+    except Exception as ex:
+        print(f'There was a problem compacting hub: {ex}')
+        return
+
+    # create the hub_path group lines
+    hub_path_lines = ['[b]hub_path[/b]:',
+                      f'- {hub_path}']
+
+    # create the compacted group lines
+    partition_names = ', '.join(compacted_ds.partitioning.schema.names)
+    compacted_lines = ['\n[b]compacted[/b]:',
+                       f'- [green]location[/green]: [bright_magenta]{compacted_dir}[/bright_magenta]',
+                       f'- [green]partitions[/green]: [bright_magenta]{partition_names}[/bright_magenta]',
+                       f'- [green]files[/green]: [bright_magenta]{len(compacted_ds.files):,}[/bright_magenta]',
+                       f'- [green]rows[/green]: [bright_magenta]{compacted_ds.count_rows():,}[/bright_magenta]']
+
+    # finally, print a Panel containing all the groups
+    console.print(
+        Panel(
+            Group(Group(*hub_path_lines), Group(*compacted_lines)),
+            border_style='green',
+            expand=False,
+            padding=(1, 2),
+            subtitle='[italic]hubdata[/italic]',
+            subtitle_align='right',
+            title='[bright_red]compact[/bright_red]',
+            title_align='left')
+    )
+
+
+@cli.command(name='index')
+@click.argument('hub_path')
+@click.option('--full', is_flag=True, help='re-read all files, not only those that changed')
+@_profile_option
+def index(hub_path, full):
+    """
+    A subcommand that builds `hub_path`'s model output statistics index via `build_stats_index()`, and then prints
+    information about the index. Only files that changed since the last build are read unless `--full` is passed.
+
+    :param hub_path: as passed to `connect_hub()`: either a local file system hub path or a cloud-based hub URI.
+        Note: A local file system path must be an ABSOLUTE path and not a relative one
+    """
+    console = Console()
+    try:
+        with console.status('Building stats index...'):
+            stats_index_path = build_stats_index(hub_path, full=full)
+            hub_connection = connect_hub(hub_path)
+            stats_index = _read_stats_index(hub_connection._filesystem, stats_index_path, hub_connection.schema)
+    except Exception as ex:
+        print(f'There was a problem building stats index: {ex}')
+        return
+
+    # create the hub_path group lines
+    hub_path_lines = ['[b]hub_path[/b]:',
+                      f'- {hub_path}']
+
+    # create the index group lines
+    column_names = ', '.join(sorted({col_name.rsplit('.', 1)[0] for col_name in stats_index.column_names
+                                     if col_name.endswith('.min')}))
+    index_lines = ['\n[b]stats index[/b]:',
+                   f'- [green]location[/green]: [bright_magenta]{stats_index_path}[/bright_magenta]',
+                   f'- [green]files[/green]: [bright_magenta]{stats_index.num_rows:,}[/bright_magenta]',
+                   f'- [green]columns[/green]: [bright_magenta]{column_names}[/bright_magenta]']
+
+    # finally, print a Panel containing all the groups
+    console.print(
+        Panel(
+            Group(Group(*hub_path_lines), Group(*index_lines)),
+            border_style='green',
+            expand=False,
+            padding=(1, 2),
+            subtitle='[italic]hubdata[/italic]',
+            subtitle_align='right',
+            title='[bright_red]index[/bright_red]',
+            title_align='left')
+    )
+
+
+@cli.command(name='query')
+@click.argument('hub_path')
+@click.argument('sql')
+@click.option('--max-rows', default=50, show_default=True, help='maximum number of result rows to print')
+@_profile_option
+def query(hub_path, sql, max_rows):
+    """
+    A subcommand that runs the SQL query `sql` over `hub_path` via `HubConnection.sql()` and prints the result. The
+    query can use the `model_output`, `time_series`, and `oracle_output` relations. Requires the optional duckdb
+    package.
+
+    :param hub_path: as passed to `connect_hub()`: either a local file system hub path or a cloud-based hub URI.
+        Note: A local file system path must be an ABSOLUTE path and not a relative one
+    """
+    console = Console()
+    try:
+        with console.status('Running query...'):
+            result = connect_hub(hub_path).sql(sql)
+    except Exception as ex:
+        print(f'There was a problem running query: {ex}')
+        return
+
+    result_table = Table(*result.column_names, border_style='green', caption=f'{result.num_rows:,} rows',
+                         caption_justify='right')
+    for row in result.slice(0, max_rows).to_pylist():
+        result_table.add_row(*[str(value) for value in row.values()])
+    console.print(result_table)
+
+
+@cli.group(name='cache')
+def cache():
+    """
+    Subcommands that manage the local fragment cache used by `connect_hub(..., cache_fragments=True)`.
+    """
+    pass
+
+
+@cache.command(name='stats')
+@click.argument('cache_dir')
+@_profile_option
+def cache_stats(cache_dir):
+    """
+    A subcommand that prints statistics about the fragment cache in `cache_dir`.
+
+    :param cache_dir: the `cache_dir` passed to `connect_hub()`
+    """
+    _print_cache_stats(FragmentCache(cache_dir), None)
+
+
+@cache.command(name='prune')
+@click.argument('cache_dir')
+@click.option('--max-bytes', default=DEFAULT_CACHE_MAX_BYTES, show_default=True,
+              help='evict least recently used fragments until the cache is at most this size')
+@_profile_option
+def cache_prune(cache_dir, max_bytes):
+    """
+    A subcommand that evicts least recently used fragments from the fragment cache in `cache_dir`, and then prints
+    statistics about it.
+
+    :param cache_dir: the `cache_dir` passed to `connect_hub()`
+    """
+    fragment_cache = FragmentCache(cache_dir, max_bytes)
+    _print_cache_stats(fragment_cache, fragment_cache.prune())
+
+
+@cache.command(name='clear')
+@click.argument('cache_dir')
+@_profile_option
+def cache_clear(cache_dir):
+    """
+    A subcommand that deletes all fragments from the fragment cache in `cache_dir`, and then prints statistics about it.
+
+    :param cache_dir: the `cache_dir` passed to `connect_hub()`
+    """
+    fragment_cache = FragmentCache(cache_dir)
+    _print_cache_stats(fragment_cache, fragment_cache.clear())
+
+
+def _print_cache_stats(fragment_cache: FragmentCache, num_evicted: int | None):
+    console = Console()
+    cache_stats = fragment_cache.stats()
+    cache_lines = ['[b]fragment cache[/b]:',
+                   f'- [green]location[/green]: [bright_magenta]{fragment_cache.fragments_dir}[/bright_magenta]',
+                   f'- [green]fragments[/green]: [bright_magenta]{cache_stats["num_fragments"]:,}[/bright_magenta]',
+                   f'- [green]bytes[/green]: [bright_magenta]{cache_stats["num_bytes"]:,}[/bright_magenta]']
+    if num_evicted is not None:
+        cache_lines.append(f'- [green]evicted[/green]: [bright_magenta]{num_evicted:,}[/bright_magenta]')
+
+    # finally, print a Panel containing the group
+    console.print(
+        Panel(
+            Group(*cache_lines),
+            border_style='green',
+            expand=False,
+            padding=(1, 2),
+            subtitle='[italic]hubdata[/italic]',
+            subtitle_align='right',
+            title='[bright_red]cache[/bright_red]',
+            title_align='left')
+    )
+
+
 @cli.command(name='time-series')
 @click.argument('hub_path')
+@_profile_option
 def print_target_data_time_series(hub_path):
     """
     A subcommand that prints target data time-series information for `hub_path`, including its schema.
@@ -129,6 +391,7 @@ def print_target_data_time_series(hub_path):
 
 @cli.command(name='oracle-output')
 @click.argument('hub_path')
+@_profile_option
 def print_target_data_oracle_output(hub_path):
     """
     A subcommand that prints target data oracle-output information for `hub_path`, including its schema.
@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import structlog
+from pyarrow import fs
+
+from hubdata.connect_hub import (
+    COMPACTION_METADATA_FILE_NAME,
+    HubConnection,
+    _read_compaction_metadata,
+    _schema_to_json,
+    connect_hub,
+)
+from hubdata.create_hub_schema import _round_id_col_name
+
+logger = structlog.get_logger()
+
+COMPACTION_METADATA_VERSION = 2
+DEFAULT_ROW_GROUP_SIZE = 1_000_000
+
+
+def compact_hub(hub_path: str | Path, partition_by_round: bool = False,
+                row_group_size: int = DEFAULT_ROW_GROUP_SIZE, compression: str = 'zstd', full: bool = False) -> str:
+    """
+    Rewrites a hub's model output into a compacted, hive-partitioned Parquet mirror located at
+    `HubConnection.compacted_dir`. The mirror is partitioned by `model_id` and optionally by round, its files have
+    column statistics, and its schema is exactly the one returned by `create_hub_schema()`. Reading many small CSV files
+    is dominated by per-file open and parse overhead, so reading the mirror is typically much faster. Use
+    `connect_hub(..., prefer_compacted=True)` to read from the mirror.
+
+    Compaction is incremental: the mirror's metadata file records the source files (paths, sizes, and mtimes) that fed
+    each model's partition, and a repeat compaction only rewrites the partitions of model directories that gained, lost,
+    or modified files, and removes those of deleted model directories. A full rewrite is done if `full` is True, if
+    there is no mirror, or if the mirror was written with a different schema or different options. Files directly in
+    the model output directory (i.e., not in a model directory) are not compacted.
+
+    :param hub_path: str or Path pointing to a hub's root directory as passed to `connect_hub()`
+    :param partition_by_round: True if the mirror should also be partitioned by the hub's round ID column, e.g.,
+        `reference_date`. requires all rounds to set `round_id_from_variable` with the same `round_id`
+    :param row_group_size: target number of rows per Parquet row group. small files are combined until it is reached
+    :param compression: Parquet compression codec, e.g., 'zstd', 'snappy', or 'none'
+    :param full: True to rewrite every model's partition regardless of what changed
+    :return: the path of the mirror in the hub's file system
+    :raise: RuntimeError if `hub_path` is invalid
+    :raise: ValueError if `partition_by_round` is True but the hub has no single round ID column
+    """
+    hub_conn = connect_hub(hub_path)  # NB: no cache_dir, so that listed sizes and mtimes are current
+    partition_cols = ['model_id']
+    if partition_by_round:
+        round_id_col_name = _round_id_col_name(hub_conn.tasks)
+        if round_id_col_name is None:
+            raise ValueError('cannot partition by round: hub rounds do not all get their round ID from the same '
+                             'task ID variable')
+        partition_cols.append(round_id_col_name)
+    options = {'partition_cols': partition_cols, 'row_group_size': row_group_size, 'compression': compression}
+
+    # group the current model output files by model, keeping only those get_dataset() would read
+    file_format_to_files, _ = hub_conn._group_files_by_format(hub_conn._list_model_out_files(),
+                                                              hub_conn._file_formats(), ('README', '.DS_Store'))
+    model_id_to_sources = hub_conn._model_id_to_sources(file_format_to_files)
+
+    # decide which model partitions to (re)write and which to delete
+    filesystem, compacted_dir = hub_conn._filesystem, hub_conn.compacted_dir
+    old_metadata = _read_compaction_metadata(filesystem, compacted_dir)
+    is_full = full or (old_metadata is None) or (old_metadata.get('version') != COMPACTION_METADATA_VERSION) \
+        or (old_metadata['schema'] != _schema_to_json(hub_conn.schema)) or (old_metadata['options'] != options)
+    old_models: dict[str, dict] = {} if is_full else old_metadata['models']
+    changed_model_ids = sorted(model_id for model_id, sources in model_id_to_sources.items()
+                               if (model_id not in old_models) or (old_models[model_id]['sources'] != sources))
+    removed_model_ids = sorted(set(old_models) - set(model_id_to_sources))
+    logger.info(f'compacting model output: {hub_conn.model_output_dir!r} -> {compacted_dir!r}. rewriting '
+                f'{len(changed_model_ids)} of {len(model_id_to_sources)} models, removing {len(removed_model_ids)}')
+
+    # remove the metadata first so that readers fall back to the model output directory while we rewrite
+    metadata_path = f'{compacted_dir}/{COMPACTION_METADATA_FILE_NAME}'
+    if filesystem.get_file_info(metadata_path).type != fs.FileType.NotFound:
+        filesystem.delete_file(metadata_path)
+    if is_full:
+        filesystem.delete_dir_contents(compacted_dir, missing_dir_ok=True)
+    else:
+        for model_id in changed_model_ids + removed_model_ids:
+            if model_id in old_models:
+                _delete_model_partition(filesystem, compacted_dir, old_models[model_id]['files'])
+
+    new_models = {model_id: model for model_id, model in old_models.items() if model_id in model_id_to_sources}
+    for model_id in changed_model_ids:
+        sources = model_id_to_sources[model_id]
+        source_paths = {source[0] for source in sources}
+        model_dataset = hub_conn._dataset_from_file_groups(
+            {file_format: [file_info for file_info in format_files if file_info.path in source_paths]
+             for file_format, format_files in file_format_to_files.items()}, False)
+        new_models[model_id] = {'sources': sources,
+                                'files': _write_model_partition(hub_conn, model_dataset, partition_cols,
+                                                                row_group_size, compression)}
+
+    with filesystem.open_output_stream(metadata_path) as metadata_fp:
+        metadata_fp.write(json.dumps({'version': COMPACTION_METADATA_VERSION,
+                                      'partition_cols': partition_cols,
+                                      'schema': _schema_to_json(hub_conn.schema),
+                                      'options': options,
+                                      'models': new_models}).encode())
+    return compacted_dir
+
+
+def _write_model_partition(hub_conn: HubConnection, model_dataset: ds.Dataset, partition_cols: list[str],
+                           row_group_size: int, compression: str) -> list[str]:
+    """
+    compact_hub() helper that writes one model's data to the mirror.
+
+    :return: the paths of the written Parquet files, relative to the mirror
+    """
+    written_paths: list[str] = []
+    ds.write_dataset(model_dataset, hub_conn.compacted_dir, filesystem=hub_conn._filesystem, format='parquet',
+                     partitioning=ds.partitioning(pa.schema([hub_conn.schema.field(col_name)
+                                                             for col_name in partition_cols]), flavor='hive'),
+                     file_options=ds.ParquetFileFormat().make_write_options(compression=compression,
+                                                                            write_statistics=True),
+                     min_rows_per_group=row_group_size, max_rows_per_group=row_group_size,
+                     basename_template='part-{i}.parquet', existing_data_behavior='overwrite_or_ignore',
+                     file_visitor=lambda written_file: written_paths.append(written_file.path))
+    return sorted(written_path[len(hub_conn.compacted_dir):].strip('/') for written_path in written_paths)
+
+
+def _delete_model_partition(filesystem: fs.FileSystem, compacted_dir: str, files: list[str]):
+    """
+    compact_hub() helper that deletes a model's top-level partition directory (e.g., `model_id=team1-goodmodel/`) given
+    the mirror-relative paths of its files as recorded by `_write_model_partition()`
+    """
+    for partition_dir_name in {file.split('/')[0] for file in files}:
+        filesystem.delete_dir(f'{compacted_dir}/{partition_dir_name}')
@@ -1,16 +1,43 @@
+import functools
 import json
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 import pyarrow as pa
+import pyarrow.csv as pcsv
 import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import structlog
 from pyarrow import fs
 
-from hubdata.create_hub_schema import create_hub_schema
+from hubdata.create_hub_schema import _round_id_col_name, create_hub_schema
+from hubdata.filesystems import filesystem_from_uri, filesystem_path
+from hubdata.fragment_cache import DEFAULT_CACHE_MAX_BYTES, FragmentCache
+from hubdata.listing import list_files
+from hubdata.manifest_cache import DEFAULT_LISTING_TTL, list_files_with_manifest
+from hubdata.parallel import PARALLEL_CHOICES, scan_to_table_processes
+from hubdata.profiling import is_profiling, profile_batches, record, record_file_sizes, scan_to_table, timed
+from hubdata.query import query_expression
+from hubdata.sql import aggregate_dataset, sql_query
 
 logger = structlog.get_logger()
 
+COMPACTED_DIR_NAME = '.hubdata/compacted-model-output'  # relative to the hub's root. written by `compact_hub()`
+COMPACTION_METADATA_FILE_NAME = '_hubdata_compaction.json'  # inside COMPACTED_DIR_NAME. pyarrow ignores `_` prefixes
+STATS_INDEX_FILE_NAME = '.hubdata/stats-index.parquet'  # relative to the hub's root. written by `build_stats_index()`
+STATS_INDEX_METADATA_KEY = 'hubdata'  # the stats index's Parquet schema metadata key
+
+FRAGMENT_FETCH_CONCURRENCY = 8  # max number of model output files read at once to fill the fragment cache
+
+DEFAULT_BATCH_SIZE = 131_072  # `iter_batches()` defaults. the same batch size as pyarrow's scanner default
+DEFAULT_READAHEAD = 4
+
+DEFAULT_CSV_BLOCK_SIZE = 1 << 20  # bytes of CSV parsed per block. pyarrow's default
+CSV_NULL_VALUES = ['NA', '']  # CSV values read as null in every column if `csv_na_as_null`. R hubData's default
+
 
 class HubConnection:
     """
@@ -19,160 +46,753 @@ class HubConnection:
 
     Instance variables:
     - hub_path: str pointing to a hub's root directory as passed to `connect_hub()`
-    - schema: the pa.Schema for `HubConnection.get_dataset()`. created by the constructor via `create_hub_schema()`
+    - schema: the pa.Schema for `HubConnection.get_dataset()`. created via `create_hub_schema()`
     - admin: the hub's `admin.json` contents as a dict
     - tasks: "" `tasks.json` ""
+    - model_metadata_schema: "" `model-metadata-schema.json` "", or None if not found
     - model_output_dir: Path to the hub's model output directory
+    - cache_dir: the optional local directory used to cache model output file listings and hub schemas, as passed to
+        `connect_hub()`
+    - prefer_compacted: bool as passed to `connect_hub()`
+    - compacted_dir: path to the hub's compacted Parquet mirror of model_output_dir as written by `compact_hub()`
+    - stats_index_path: path to the hub's model output statistics index as written by `build_stats_index()`
+    - list_concurrency: int or None as passed to `connect_hub()`
+    - lazy: bool as passed to `connect_hub()`
+    - fragment_cache: a FragmentCache if `cache_fragments` was passed to `connect_hub()`, and None otherwise
+    - csv_block_size: int as passed to `connect_hub()`
+    - csv_use_threads: bool as passed to `connect_hub()`
+    - categorical: str as passed to `connect_hub()`
+    - csv_na_as_null: bool as passed to `connect_hub()`
+    - listing_ttl: float as passed to `connect_hub()`
+
+    The `admin`, `tasks`, `model_metadata_schema`, `schema`, and `model_output_dir` variables are loaded on first
+    access and then cached. The three hub-config files are read concurrently. Unless `lazy` is True, the constructor
+    accesses them so that any errors are raised by `connect_hub()`.
     """
 
 
-    def __init__(self, hub_path: str | Path):
+    def __init__(self, hub_path: str | Path, cache_dir: str | Path | None = None, prefer_compacted: bool = False,
+                 list_concurrency: int | None = None, lazy: bool = False, cache_fragments: bool = False,
+                 cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES, csv_block_size: int = DEFAULT_CSV_BLOCK_SIZE,
+                 csv_use_threads: bool = True, categorical: str = 'none', filesystem: fs.FileSystem | None = None,
+                 csv_na_as_null: bool = False, listing_ttl: float = DEFAULT_LISTING_TTL):
         """
         :param hub_path: str or Path pointing to a hub's root directory as passed to `connect_hub()`
+        :param cache_dir: optional str or Path as passed to `connect_hub()`
+        :param prefer_compacted: bool as passed to `connect_hub()`
+        :param list_concurrency: optional int as passed to `connect_hub()`
+        :param lazy: bool as passed to `connect_hub()`
+        :param cache_fragments: bool as passed to `connect_hub()`
+        :param cache_max_bytes: int as passed to `connect_hub()`
+        :param csv_block_size: int as passed to `connect_hub()`
+        :param csv_use_threads: bool as passed to `connect_hub()`
+        :param categorical: str as passed to `connect_hub()`
+        :param filesystem: optional fs.FileSystem as passed to `connect_hub()`
+        :param csv_na_as_null: bool as passed to `connect_hub()`
+        :param listing_ttl: float as passed to `connect_hub()`
         """
-        # set self.hub_path and then get an arrow FileSystem for it, letting it decide the correct subclass based on
-        # that arg, catching any errors. also set two internal instance variables used by HubConnection.get_dataset():
-        # self._filesystem and self._filesystem_path
+        # set self.hub_path and then get an arrow FileSystem for it (unless one was passed), letting it decide the
+        # correct subclass based on that arg, catching any errors. also set two internal instance variables used by
+        # HubConnection.get_dataset(): self._filesystem and self._filesystem_path
         self.hub_path: str | Path = hub_path
         try:
-            self._filesystem, self._filesystem_path = fs.FileSystem.from_uri(self.hub_path)
+            self._filesystem, self._filesystem_path = filesystem_from_uri(self.hub_path) if filesystem is None \
+                else (filesystem, filesystem_path(self.hub_path))
         except Exception:
             raise RuntimeError(f'invalid hub_path: {self.hub_path}')
 
-        # set self.admin and self.tasks, checking for existence
-        try:
-            with self._filesystem.open_input_file(f'{self._filesystem_path}/hub-config/admin.json') as admin_fp, \
-                    self._filesystem.open_input_file(f'{self._filesystem_path}/hub-config/tasks.json') as tasks_fp:
-                self.admin = json.load(admin_fp)
-                self.tasks = json.load(tasks_fp)
-        except Exception as ex:
-            raise RuntimeError(f'admin.json or tasks.json not found: {ex}')
-
-        # set schema
-        self.schema = create_hub_schema(self.tasks)
-
-        # set self.model_metadata_schema, first checking for model-metadata-schema.json existence. warn (not error) if
-        # not found to be consistent with R hubData
-        self.model_metadata_schema: dict | None = None
-        try:
-            with (self._filesystem.open_input_file(f'{self._filesystem_path}/hub-config/model-metadata-schema.json')
-                  as model_metadata_fp):
-                self.model_metadata_schema = json.load(model_metadata_fp)
-        except Exception as ex:
-            self.model_metadata_schema = None
-            logger.warn(f'model-metadata-schema.json not found: {ex!r}')
-
-        # set self.model_output_dir, first checking for directory existence
+        self.cache_dir: str | Path | None = cache_dir
+        self.listing_ttl = listing_ttl
+        self.prefer_compacted = prefer_compacted
+        self.compacted_dir = f'{self._filesystem_path}/{COMPACTED_DIR_NAME}'
+        self.stats_index_path = f'{self._filesystem_path}/{STATS_INDEX_FILE_NAME}'
+        self.list_concurrency = list_concurrency
+        self.lazy = lazy
+        if cache_fragments and (cache_dir is None):
+            raise ValueError('cache_fragments requires cache_dir')
+        self.fragment_cache = FragmentCache(cache_dir, cache_max_bytes) if cache_fragments else None
+        self.csv_block_size = csv_block_size
+        self.csv_use_threads = csv_use_threads
+        self.csv_na_as_null = csv_na_as_null
+        if categorical not in ['none', 'auto']:
+            raise ValueError(f"invalid {categorical=}. must be one of 'none' or 'auto'")
+        self.categorical = categorical
+
+        # hub-config file contents, set by `_load_hub_config()`
+        self._hub_config: tuple[dict, dict, dict | None] | None = None
+        self._hub_config_lock = threading.Lock()
+
+        if not lazy:
+            # load everything now, raising RuntimeError if admin.json or tasks.json is not found. also check for
+            # model_output_dir existence. warn (not error) if not found
+            _ = self.schema
+            if self._filesystem.get_file_info(self.model_output_dir).type == fs.FileType.NotFound:
+                logger.warn(f'model_output_dir not found: {self.model_output_dir!r}')
+
+
+    @property
+    def admin(self) -> dict:
+        return self._load_hub_config()[0]
+
+
+    @property
+    def tasks(self) -> dict:
+        return self._load_hub_config()[1]
+
+
+    @property
+    def model_metadata_schema(self) -> dict | None:
+        return self._load_hub_config()[2]
+
+
+    @functools.cached_property
+    def schema(self) -> pa.Schema:
+        return create_hub_schema(self.tasks, cache_dir=self.cache_dir, categorical=self.categorical)
+
+
+    @functools.cached_property
+    def model_output_dir(self) -> str:
         model_output_dir_name = self.admin['model_output_dir'] if 'model_output_dir' in self.admin else 'model-output'
-        model_output_dir = f'{self._filesystem_path}/{model_output_dir_name}'
-        if self._filesystem.get_file_info(model_output_dir).type == fs.FileType.NotFound:
-            logger.warn(f'model_output_dir not found: {model_output_dir!r}')
-        self.model_output_dir = model_output_dir
+        return f'{self._filesystem_path}/{model_output_dir_name}'
+
+
+    @functools.cached_property
+    def _round_id_col_name(self) -> str | None:
+        """
+        the round ID column used for pruning files by round - see `_partition_expression()`. None if the hub has no
+        single round ID column
+        """
+        return _round_id_col_name(self.tasks)
+
+
+    def _load_hub_config(self) -> tuple[dict, dict, dict | None]:
+        """
+        Property helper that reads admin.json, tasks.json, and model-metadata-schema.json concurrently the first time
+        it is called, and then returns the cached contents.
+
+        :return: a 3-tuple: (admin, tasks, model_metadata_schema). the last is None if not found (we warn rather than
+            error to be consistent with R hubData)
+        :raise: RuntimeError if admin.json or tasks.json is not found
+        """
+        with self._hub_config_lock:
+            if self._hub_config is not None:
+                return self._hub_config
+
+
+            def load_json(file_name):
+                with self._filesystem.open_input_file(f'{self._filesystem_path}/hub-config/{file_name}') as fp:
+                    return json.load(fp)
+
+
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                admin_future, tasks_future, model_metadata_future = [
+                    executor.submit(load_json, file_name)
+                    for file_name in ['admin.json', 'tasks.json', 'model-metadata-schema.json']]
+            try:
+                admin, tasks = admin_future.result(), tasks_future.result()
+            except Exception as ex:
+                raise RuntimeError(f'admin.json or tasks.json not found: {ex}')
+
+            try:
+                model_metadata_schema = model_metadata_future.result()
+            except Exception as ex:
+                model_metadata_schema = None
+                logger.warn(f'model-metadata-schema.json not found: {ex!r}')
+
+            self._hub_config = (admin, tasks, model_metadata_schema)
+            return self._hub_config
 
 
     def get_dataset(self, exclude_invalid_files: bool = False,
-                    ignore_files: Iterable[str] = ('README', '.DS_Store')) -> ds.Dataset:
+                    ignore_files: Iterable[str] = ('README', '.DS_Store'),
+                    filter: ds.Expression | None = None) -> ds.Dataset:
         """
         Main entry point for getting a pyarrow dataset to work with. Prints a warning about any files that were skipped
         during dataset file discovery.
 
-        :param: exclude_invalid_files: variable passed through to pyarrow's `dataset.dataset()` method. defaults to
-            False, which works for most situations
+        :param: exclude_invalid_files: True if files that cannot be opened in their format should be dropped from the
+            dataset. defaults to False, which works for most situations. NB: passing True requires opening every file
         :param: ignore_files a str list of file **names** (not paths) or file **prefixes** to ignore when discovering
             model output files to include in dataset connections. Parent directory names should not be included. The
             default is to ignore the common files `"README"` and `".DS_Store"`, but additional files can be excluded by
             specifying them here.
-        :return: a pyarrow.dataset.Dataset for my model_output_dir
-        """
-        # create the dataset. NB: we are using dataset "directory partitioning" to automatically get the `model_id`
-        # column from directory names. regarding performance on S3-based datasets, we default `exclude_invalid_files` to
-        # False, which speeds up pyarrow's dataset processing, but opens the door to errors: "unsupported files may be
-        # present in the Dataset (resulting in an error at scan time)". we prevent this from happening by manually
-        # constructing and passing `ignore_prefixes` based on file extensions. this method accepts `ignore_files` to
-        # allow custom prefixes to ignore. it defaults to common ones for hubs
-
-        # NB: we force file_formats to .parquet if not a LocalFileSystem (e.g., an S3FileSystem). otherwise we use the
-        # list from self.admin['file_format']
-        file_formats = ['parquet'] if not isinstance(self._filesystem, fs.LocalFileSystem) \
-            else self.admin['file_format']
-        model_out_files = self._list_model_out_files()  # model_output_dir, type='file'
-        datasets = []
-        file_format_to_ignore_files: dict[str, list[fs.FileInfo]] = {}  # for warning
-        for file_format in file_formats:
-            _ignore_files = self._list_invalid_format_files(model_out_files, file_format, ignore_files)
-            file_format_to_ignore_files[file_format] = _ignore_files
-            dataset = ds.dataset(self.model_output_dir, filesystem=self._filesystem, format=file_format,
-                                 schema=self.schema, partitioning=['model_id'],  # NB: hard-coded partitioning!
-                                 exclude_invalid_files=exclude_invalid_files,
-                                 ignore_prefixes=[file_info.base_name for file_info in _ignore_files])
-            datasets.append(dataset)
-        datasets = [dataset for dataset in datasets if len(dataset.files) != 0]
-        self._warn_unopened_files(model_out_files, ignore_files, file_format_to_ignore_files)
+        :param: filter: optional `ds.Expression` that the dataset will be scanned with. only used if I was created with
+            `cache_fragments=True`, in which case only the files whose partition expressions (`model_id` and round ID)
+            and stats index value ranges can match `filter` are fetched into the cache and included in the dataset, so
+            that a filtered scan does not fetch unrelated files. `to_table()`, `iter_batches()`, `query()`, and
+            `aggregate()` pass their filters. NB: the returned dataset then only has rows that might match `filter`.
+            defaults to None, which fetches every file
+        :return: a pyarrow.dataset.Dataset for my model_output_dir. if I was created with `prefer_compacted=True` and
+            the hub has an up-to-date compacted mirror (see `compact_hub()`) then the dataset reads from that mirror
+            instead, and the above args are ignored. the mirror is up-to-date if it was written for the hub's current
+            schema and from the currently listed model output files (paths, sizes, and mtimes). if the hub has a stats
+            index (see `build_stats_index()`) then its per-file value ranges are used to skip files that cannot match a
+            filter
+        """
+        # create the dataset. NB: we list model_output_dir exactly once, split the listed files by extension into one
+        # group per file format, and then build each format's FileSystemDataset directly from its group's paths. this
+        # means pyarrow does no discovery of its own, so connection cost does not grow with files x formats. we set
+        # the `model_id` column from directory names ourselves - see `_partition_expression()`. regarding performance
+        # on S3-based datasets, we default `exclude_invalid_files` to False, which avoids opening every file, but opens
+        # the door to errors: "unsupported files may be present in the Dataset (resulting in an error at scan time)".
+        # we prevent this from happening by only including files with the format's extension. this method accepts
+        # `ignore_files` to allow custom prefixes to ignore. it defaults to common ones for hubs
+        with timed('list_files') as event_fields:
+            model_out_files = self._list_model_out_files()  # model_output_dir, type='file'
+            event_fields['num_files'] = len(model_out_files)
+        record_file_sizes(model_out_files)  # NB: for 'scan_fragment' events' `num_bytes`. a no-op if not profiling
+        if self.prefer_compacted:
+            compacted_dataset = self._compacted_dataset(model_out_files)
+            if compacted_dataset is not None:
+                return compacted_dataset
+
+        file_format_to_files, unopened_files = self._group_files_by_format(model_out_files, self._file_formats(),
+                                                                           ignore_files)
+        record('group_files', files_per_format={file_format: len(format_files)
+                                                for file_format, format_files in file_format_to_files.items()})
+        self._warn_unopened_files(unopened_files)
+        return self._dataset_from_file_groups(file_format_to_files, exclude_invalid_files, self._stats_expressions(),
+                                              filter)
+
+
+    def _file_formats(self) -> list[str]:
+        """
+        get_dataset() helper that returns the file formats to read. NB: we force file_formats to .parquet if not a
+        LocalFileSystem (e.g., an S3FileSystem). otherwise we use the list from self.admin['file_format']
+        """
+        return ['parquet'] if not isinstance(self._filesystem, fs.LocalFileSystem) else self.admin['file_format']
+
+
+    def _dataset_from_file_groups(self, file_format_to_files: dict[str, list[fs.FileInfo]],
+                                  exclude_invalid_files: bool,
+                                  stats_expressions: dict[str, tuple[int, int, ds.Expression]] | None = None,
+                                  filter: ds.Expression | None = None) -> ds.Dataset:
+        """
+        get_dataset() helper that returns a FileSystemDataset if only one of `file_format_to_files`'s formats has
+        files, and a UnionDataset of one FileSystemDataset per format otherwise
+
+        :param file_format_to_files: as returned by `_group_files_by_format()`
+        :param exclude_invalid_files: as passed to `get_dataset()`
+        :param stats_expressions: optional dict as returned by `_stats_expressions()`
+        :param filter: as passed to `get_dataset()`
+        """
+        datasets = [self._dataset_from_files(format_files, file_format, exclude_invalid_files, stats_expressions,
+                                             filter)
+                    for file_format, format_files in file_format_to_files.items()]
+        datasets = [dataset for dataset in datasets if len(dataset.files) != 0] or datasets[:1]  # NB: keep the schema
         if len(datasets) == 1:
             return datasets[0]
         else:
-            return ds.dataset([dataset for dataset in datasets
-                               if isinstance(dataset, pa.dataset.FileSystemDataset) and (len(dataset.files) != 0)])
+            return ds.dataset(datasets)
+
+
+    def _compacted_dataset(self, model_out_files: list[fs.FileInfo]) -> ds.FileSystemDataset | None:
+        """
+        get_dataset() helper that returns a dataset for my compacted mirror, or None (with a warning) if the mirror does
+        not exist, was written for a different schema (e.g., because tasks.json changed since compaction), or is stale,
+        i.e., model output files were added, removed, or modified since compaction
+
+        :param model_out_files: as returned by `_list_model_out_files()`
+        """
+        compaction_metadata = _read_compaction_metadata(self._filesystem, self.compacted_dir)
+        if compaction_metadata is None:
+            logger.warn(f'compacted model output not found. using model_output_dir: {self.compacted_dir!r}')
+            return None
+        elif compaction_metadata['schema'] != _schema_to_json(self.schema):
+            logger.warn(f'compacted model output schema does not match hub schema. using model_output_dir: '
+                        f'{self.compacted_dir!r}')
+            return None
+
+        file_format_to_files, _ = self._group_files_by_format(model_out_files, self._file_formats(),
+                                                              ('README', '.DS_Store'))  # NB: as `compact_hub()` does
+        compacted_sources = {model_id: model['sources'] for model_id, model in compaction_metadata['models'].items()}
+        if self._model_id_to_sources(file_format_to_files) != compacted_sources:
+            logger.warn(f'compacted model output is out of date. using model_output_dir. re-run compact_hub() to '
+                        f'update it: {self.compacted_dir!r}')
+            return None
+
+        partition_schema = pa.schema([self.schema.field(col_name)
+                                      for col_name in compaction_metadata['partition_cols']])
+        partitioning = _hive_partitioning(self._filesystem, self.compacted_dir, partition_schema) \
+            if any(pa.types.is_dictionary(field.type) for field in partition_schema) \
+            else ds.partitioning(partition_schema, flavor='hive')
+        return ds.dataset(self.compacted_dir, filesystem=self._filesystem, format='parquet', schema=self.schema,
+                          partitioning=partitioning)
 
 
     def _list_model_out_files(self) -> list[fs.FileInfo]:
         """
         get_dataset() helper that returns a list of all files in self.model_output_dir. note that for now uses
         FileSystem.get_file_info() regardless of whether it's a LocalFileSystem or S3FileSystem. also note that no
-        filtering of files is done, i.e., invalid files might be included
+        filtering of files is done, i.e., invalid files might be included. if self.cache_dir was passed then the listing
+        is read from (and incrementally refreshed in) an on-disk manifest - see `list_files_with_manifest()`. if
+        self.list_concurrency was passed then model directories are listed concurrently - see `list_files()`
         """
-        return [file_info
-                for file_info in
-                self._filesystem.get_file_info(fs.FileSelector(self.model_output_dir, recursive=True))
-                if file_info.type == fs.FileType.File]
+        if self.cache_dir is not None:
+            return list_files_with_manifest(self._filesystem, self.model_output_dir, self.cache_dir,
+                                            f'{self._filesystem.type_name}://{self._filesystem_path}',
+                                            self.list_concurrency, self.listing_ttl)
 
+        return list_files(self._filesystem, self.model_output_dir, self.list_concurrency)
 
-    @staticmethod
-    def _list_invalid_format_files(model_out_files: list[fs.FileInfo], file_format: str,
-                                   ignore_files_default: Iterable[str]) -> list[fs.FileInfo]:
+
+    def _dataset_from_files(self, file_infos: list[fs.FileInfo], file_format: str, exclude_invalid_files: bool,
+                            stats_expressions: dict[str, tuple[int, int, ds.Expression]] | None = None,
+                            filter: ds.Expression | None = None) -> ds.FileSystemDataset:
+        """
+        get_dataset() helper that creates a FileSystemDataset for `file_infos` via `ds.FileSystemDataset.from_paths()`,
+        i.e., without pyarrow doing its own file discovery. each file's `model_id` partition value is set from its
+        parent directory name, which is what `ds.dataset()`'s directory partitioning does
+
+        :param file_infos: files to include, all of which must have the `file_format` extension
+        :param file_format: one of the `admin.json` "file_format" values: 'csv', 'parquet', or 'arrow'
+        :param exclude_invalid_files: True if files that `file_format` cannot open should be dropped. NB: this requires
+            opening every file
+        :param stats_expressions: optional dict as returned by `_stats_expressions()`. a file's stats expression is
+            added to its partition expression if the file's size and mtime match those it was indexed with
+        :param filter: as passed to `get_dataset()`
+        """
+        format_obj = _file_format_for_name(file_format, self.schema, self.csv_block_size, self.csv_use_threads,
+                                           self.csv_na_as_null)
+        if exclude_invalid_files:
+            file_infos = [file_info for file_info in file_infos if self._is_valid_file(file_info, format_obj)]
+
+        partition_expressions = []
+        for file_info in file_infos:
+            expression = self._partition_expression(file_info)
+            size, mtime_ns, stats_expression = (stats_expressions or {}).get(
+                file_info.path[len(self.model_output_dir):].strip('/'), (None, None, None))
+            if (stats_expression is not None) and (size == file_info.size) and (mtime_ns == file_info.mtime_ns):
+                expression = expression & stats_expression
+            partition_expressions.append(expression)
+        dataset = ds.FileSystemDataset.from_paths([file_info.path for file_info in file_infos], schema=self.schema,
+                                                  format=format_obj, filesystem=self._filesystem,
+                                                  partitions=partition_expressions)
+        if self.fragment_cache is None:
+            return dataset
+
+        if filter is not None:  # NB: get_fragments() only evaluates partition expressions, i.e., reads no files
+            fragment_paths = {fragment.path for fragment in dataset.get_fragments(filter=filter)}
+            file_infos, partition_expressions = \
+                [file_info for file_info in file_infos if file_info.path in fragment_paths], \
+                [expression for file_info, expression in zip(file_infos, partition_expressions)
+                 if file_info.path in fragment_paths]
+        return self._dataset_from_cached_files(file_infos, format_obj, partition_expressions)
+
+
+    def _dataset_from_cached_files(self, file_infos: list[fs.FileInfo], format_obj: ds.FileFormat,
+                                   partition_expressions: list[ds.Expression]) -> ds.FileSystemDataset:
         """
-        get_dataset() helper that returns a list of file paths in `model_out_files` that do *not* match the
-        `file_format` extension
+        _dataset_from_files() helper that returns a FileSystemDataset over `file_infos`' memory-mapped fragments in my
+        fragment_cache, first reading any uncached files (up to FRAGMENT_FETCH_CONCURRENCY at once) and then evicting
+        least recently used fragments other than these if the cache is over its size cap
         """
-        return [file_info for file_info in model_out_files
-                if (file_info.extension != file_format)
-                or any([file_info.base_name.startswith(ignore_file) for ignore_file in ignore_files_default])]
 
 
-    @staticmethod
-    def _warn_unopened_files(model_out_files: list[fs.FileInfo], ignore_files_default: Iterable[str],
-                             file_format_to_ignore_files: dict[str, list[fs.FileInfo]]):
+        def fetch(file_info):
+            return self.fragment_cache.fetch(self._filesystem, file_info, format_obj, self.schema)
+
+
+        with ThreadPoolExecutor(max_workers=FRAGMENT_FETCH_CONCURRENCY) as executor:
+            fragment_paths = list(executor.map(fetch, file_infos))
+        self.fragment_cache.prune(keep=set(fragment_paths))
+        return ds.FileSystemDataset.from_paths(fragment_paths, schema=self.schema, format=ds.IpcFileFormat(),
+                                               filesystem=fs.LocalFileSystem(use_mmap=True),
+                                               partitions=partition_expressions)
+
+
+    def _stats_expressions(self) -> dict[str, tuple[int, int, ds.Expression]] | None:
         """
-        get_dataset() helper
+        get_dataset() helper that converts my stats index (see `build_stats_index()`) to expressions that pyarrow can
+        use to skip files, i.e., `min <= col <= max` (or `col == min` when they are equal) for each indexed column that
+        has no nulls in the file.
+
+        :return: a dict that maps each indexed file's path (relative to model_output_dir) to a 3-tuple: (size,
+            mtime_ns, expression). returns None if there is no index or it is for a different schema
         """
+        stats_index = _read_stats_index(self._filesystem, self.stats_index_path, self.schema)
+        if stats_index is None:
+            return None
+
+        columns = json.loads(stats_index.schema.metadata[STATS_INDEX_METADATA_KEY.encode()])['columns']
+        path_to_stats_expression = {}
+        for row in stats_index.to_pylist():
+            expression = ds.scalar(True)
+            for col_name in columns:
+                col_min, col_max = row[f'{col_name}.min'], row[f'{col_name}.max']
+                if (col_min is None) or (col_max is None) or row[f'{col_name}.null_count']:
+                    continue
+
+                pa_type = self.schema.field(col_name).type
+                expression = expression & (ds.field(col_name) == pa.scalar(col_min, pa_type)) if col_min == col_max \
+                    else expression & (ds.field(col_name) >= pa.scalar(col_min, pa_type)) \
+                    & (ds.field(col_name) <= pa.scalar(col_max, pa_type))
+            path_to_stats_expression[row['path']] = (row['size'], row['mtime_ns'], expression)
+        return path_to_stats_expression
+
+
+    def _partition_expression(self, file_info: fs.FileInfo) -> ds.Expression:
+        """
+        _dataset_from_files() helper that returns the partition expression for `file_info`, i.e., `model_id == <dir>`
+        for files inside a model directory, and an always-true expression otherwise. in addition, if the hub has a
+        round ID column (e.g., `reference_date`) and the file is named following the hubverse
+        `<round_id>-<model_id>.<ext>` convention then `<round_col> == <round_id>` is added. pyarrow uses these
+        expressions to skip whole files without any I/O when a filter cannot match them, e.g., a filter on the round
+        column. NB: this assumes (as hub validations require) that the round ID in a file's name matches its data
+        """
+        model_id = self._model_id_for_file(file_info)
+        if (model_id is None) or ('model_id' not in self.schema.names):
+            return ds.scalar(True)
+
+        expression = ds.field('model_id') == pa.scalar(model_id, self.schema.field('model_id').type)
+        if self._round_id_col_name not in self.schema.names:  # also handles None
+            return expression
+
+        stem = file_info.base_name[:-(len(file_info.extension) + 1)] if file_info.extension else file_info.base_name
+        if not stem.endswith(f'-{model_id}'):
+            return expression
+
+        round_id_scalar = _round_id_scalar(stem[:-(len(model_id) + 1)],
+                                           self.schema.field(self._round_id_col_name).type)
+        return expression if round_id_scalar is None \
+            else expression & (ds.field(self._round_id_col_name) == round_id_scalar)
+
+
+    def _model_id_to_sources(self, file_format_to_files: dict[str, list[fs.FileInfo]]) -> dict[str, list[list]]:
+        """
+        Helper that returns the source files that `compact_hub()` records for each model.
+
+        :param file_format_to_files: as returned by `_group_files_by_format()`
+        :return: a dict that maps each model_id to a sorted list of its files' `[path, size, mtime_ns]`. files directly
+            in model_output_dir are skipped
+        """
+        model_id_to_sources = defaultdict(list)
+        for format_files in file_format_to_files.values():
+            for file_info in format_files:
+                model_id = self._model_id_for_file(file_info)
+                if model_id is not None:
+                    model_id_to_sources[model_id].append([file_info.path, file_info.size, file_info.mtime_ns])
+        return {model_id: sorted(sources) for model_id, sources in model_id_to_sources.items()}
+
+
+    def _model_id_for_file(self, file_info: fs.FileInfo) -> str | None:
+        """
+        :return: the name of the model directory that `file_info` is in, or None if it is directly in model_output_dir
+        """
+        rel_parts = file_info.path[len(self.model_output_dir):].strip('/').split('/')
+        return rel_parts[0] if len(rel_parts) > 1 else None
 
 
-        def is_present_all_file_formats(file_info):
-            return all([file_info in ignore_files for ignore_files in file_format_to_ignore_files.values()])
+    def _is_valid_file(self, file_info: fs.FileInfo, format_obj: ds.FileFormat) -> bool:
+        """
+        _dataset_from_files() helper that returns True if `format_obj` can read `file_info`'s schema
+        """
+        try:
+            format_obj.inspect(file_info.path, filesystem=self._filesystem)
+            return True
+        except Exception:
+            return False
+
 
+    @staticmethod
+    def _group_files_by_format(model_out_files: list[fs.FileInfo], file_formats: Iterable[str],
+                               ignore_files_default: Iterable[str]) \
+            -> tuple[dict[str, list[fs.FileInfo]], list[fs.FileInfo]]:
+        """
+        get_dataset() helper that splits `model_out_files` by extension in a single pass.
+
+        :param model_out_files: as returned by `_list_model_out_files()`
+        :param file_formats: the file formats (extensions) to group by
+        :param ignore_files_default: file name prefixes to skip, as passed to `get_dataset()`
+        :return: a 2-tuple: (file_format_to_files, unopened_files). the former maps each of `file_formats` to the
+            files with that extension, sorted by path. the latter lists files that match none of `file_formats` and
+            that were not skipped via `ignore_files_default`
+        """
+        ignore_files_default = tuple(ignore_files_default)
+        file_format_to_files: dict[str, list[fs.FileInfo]] = {file_format: [] for file_format in file_formats}
+        unopened_files: list[fs.FileInfo] = []
+        for file_info in sorted(model_out_files, key=lambda _: _.path):
+            if file_info.base_name.startswith(ignore_files_default):
+                continue
+            elif file_info.extension in file_format_to_files:
+                file_format_to_files[file_info.extension].append(file_info)
+            else:
+                unopened_files.append(file_info)
+        return file_format_to_files, unopened_files
 
-        # warn about files in model_out_files that are present in all file_format_to_ignore_files.values(), i.e., that
-        # were never OK for any file_format
-        unopened_files = [model_out_file for model_out_file in model_out_files
-                          if is_present_all_file_formats(model_out_file)
-                          and not any([model_out_file.base_name.startswith(ignore_file)
-                                       for ignore_file in ignore_files_default])]
 
+    @staticmethod
+    def _warn_unopened_files(unopened_files: list[fs.FileInfo]):
+        """
+        get_dataset() helper that warns about files that were never OK for any file format, i.e., the second item
+        returned by `_group_files_by_format()`
+        """
         if unopened_files:
             plural = 's' if len(unopened_files) > 1 else ''
             logger.warn(f'ignored {len(unopened_files)} file{plural}: '
                         f'{[model_out_file.path for model_out_file in unopened_files]}')
 
 
-    def to_table(self, *args, **kwargs) -> pa.Table:
+    def to_table(self, *args, parallel: str | None = None, workers: int | None = None, **kwargs) -> pa.Table:
         """
         A convenience function that simply passes args and kwargs to `pyarrow.dataset.Dataset.to_table()`, returning the
-        `pyarrow.Table`.
+        `pyarrow.Table`. Records per-file scan events inside a `profile()` block. A `filter` kwarg is also passed to
+        `get_dataset()`, e.g., so that only the files it might match are fetched into the fragment cache.
+
+        :param parallel: None (the default) to scan in this process, or 'processes' to split `get_dataset()`'s files
+            into shards that are read by a pool of worker processes, which can be faster for hubs with many small CSV
+            files, where per-file overhead dominates. The result is identical to the serial one. see
+            `scan_to_table_processes()`
+        :param workers: the number of worker processes if `parallel` is 'processes'. Defaults to the number of CPUs
+        :raise: ValueError if `parallel` is invalid
+        """
+        if parallel is None:
+            return scan_to_table(self.get_dataset(filter=kwargs.get('filter')), *args, **kwargs)
+        elif parallel in PARALLEL_CHOICES:
+            return scan_to_table_processes(self.get_dataset(filter=kwargs.get('filter')), workers, *args, **kwargs)
+        else:
+            raise ValueError(f'invalid {parallel=}. must be None or one of {PARALLEL_CHOICES}')
+
+
+    def iter_batches(self, columns: list[str] | None = None, filter: ds.Expression | None = None,
+                     batch_size: int = DEFAULT_BATCH_SIZE, readahead: int = DEFAULT_READAHEAD,
+                     **get_dataset_kwargs) -> Iterator[pa.RecordBatch]:
+        """
+        A streaming alternative to `to_table()` for hubs whose model output is too large to fit in memory. Yields
+        `pa.RecordBatch`es having the hub's schema (or the `columns` subset of it) as they are read.
+
+        :param columns: optional list of column names to read. defaults to all of them
+        :param filter: optional `ds.Expression` used to filter rows. it's pushed down to pyarrow so that files and row
+            groups that cannot match are skipped
+        :param batch_size: maximum number of rows per batch
+        :param readahead: maximum number of files to read ahead of the batch being yielded. roughly bounds memory to
+            `2 * readahead * batch_size` rows. lower it to use less memory and raise it for more throughput, e.g., for
+            cloud-based hubs with many small files
+        :param get_dataset_kwargs: passed to `get_dataset()`
+        :return: an iterator of pa.RecordBatch
+        """
+        return _iter_dataset_batches(self.get_dataset(filter=filter, **get_dataset_kwargs), columns, filter, batch_size,
+                                     readahead)
+
+
+    def query(self, columns: list[str] | None = None, **filters) -> ds.Scanner:
+        """
+        Builds a lazy `ds.Scanner` over `get_dataset()` that's filtered by `filters`, e.g.,
+        `query(model_id=['team1-goodmodel'], output_type='quantile', reference_date='2022-10-22', horizon=range(0, 2))`.
+        Filter values are validated against and converted to `HubConnection.schema`'s types before being compiled into
+        a single pushed-down filter expression, so, e.g., `model_id` and round ID filters skip non-matching files
+        without opening them. Nothing is read until the scanner is consumed, e.g., via `Scanner.to_table()`,
+        `Scanner.to_batches()`, or `Scanner.count_rows()`.
+
+        :param columns: optional list of column names to read. defaults to all of them
+        :param filters: column names mapped to values as documented in `query.query_expression()`
+        :return: a ds.Scanner
+        :raise: ValueError if a filter names an unknown column or has a value that cannot be converted to its type
+        """
+        filter = query_expression(self.schema, filters)
+        return self.get_dataset(filter=filter).scanner(columns=columns, filter=filter)
+
+
+    def sql(self, query: str) -> pa.Table:
         """
-        return self.get_dataset().to_table(*args, **kwargs)
+        Runs a SQL query over my data using an embedded DuckDB database, e.g.,
+        `sql("SELECT model_id, count(*) AS n FROM model_output WHERE output_type = 'quantile' GROUP BY model_id")`.
+        The query can use these relations (tables), each of which is scanned lazily with projection and filter
+        pushdown: `model_output` (`get_dataset()`), and if the hub has target data, `time_series` and `oracle_output`
+        (`TargetDataConnection.get_dataset()`). Requires the optional duckdb package - see `aggregate()` for a
+        pyarrow-only alternative.
+
+        :param query: a DuckDB SQL query
+        :return: the query result as a pa.Table
+        :raise: ImportError if duckdb is not installed
+        :raise: RuntimeError if `query` uses a target data relation that the hub does not have
+        """
+        # NB: imported here to avoid a circular import
+        from hubdata.connect_target_data import TargetDataConnection
+        from hubdata.create_target_data_schema import TargetType
+
+        return sql_query({'model_output': self.get_dataset,
+                          'time_series': lambda: TargetDataConnection(self, TargetType.TIME_SERIES).get_dataset(),
+                          'oracle_output': lambda: TargetDataConnection(self, TargetType.ORACLE_OUTPUT).get_dataset()},
+                         query)
+
+
+    def aggregate(self, aggregations: list[tuple[str, str]], group_by: Iterable[str] = (),
+                  filter: ds.Expression | None = None) -> pa.Table:
+        """
+        Aggregates `get_dataset()` without materializing it, using a pyarrow Acero plan that reads only the needed
+        columns and runs multi-threaded, e.g., `aggregate([('value', 'count')], group_by=['model_id', 'output_type'])`.
+        Args are as documented in `sql.aggregate_dataset()`.
+
+        :return: a pa.Table with one column per `group_by` item followed by one per `aggregations` item
+        """
+        return aggregate_dataset(self.get_dataset(filter=filter), aggregations, group_by, filter)
+
+
+def _iter_dataset_batches(dataset: ds.Dataset, columns: list[str] | None, filter: ds.Expression | None,
+                          batch_size: int, readahead: int) -> Iterator[pa.RecordBatch]:
+    """
+    `iter_batches()` helper shared by `HubConnection` and `TargetDataConnection`. args are as documented there.
+    """
+    if (batch_size < 1) or (readahead < 1):
+        raise ValueError(f'batch_size and readahead must be positive: {batch_size=}, {readahead=}')
+
+    # NB: pyarrow's default readahead is 16 batches for each of 4 files. we read ahead whole files (up to `readahead`
+    # of them) but limit each one to one batch ahead
+    scanner = dataset.scanner(columns=columns, filter=filter, batch_size=batch_size, batch_readahead=1,
+                              fragment_readahead=readahead)
+    return profile_batches(scanner, dataset.schema) if is_profiling() else scanner.to_batches()
+
+
+def _file_format_for_name(file_format: str, schema: pa.Schema | None = None,
+                          csv_block_size: int = DEFAULT_CSV_BLOCK_SIZE, csv_use_threads: bool = True,
+                          csv_na_as_null: bool = False) -> ds.FileFormat:
+    """
+    :param file_format: one of the `admin.json` "file_format" values: 'csv', 'parquet', or 'arrow'
+    :param schema: optional schema that CSV files are read with - see `_csv_file_format()`
+    :param csv_block_size: as passed to `connect_hub()`
+    :param csv_use_threads: as passed to `connect_hub()`
+    :param csv_na_as_null: as passed to `connect_hub()`
+    :return: a new ds.FileFormat for `file_format`
+    :raise: ValueError if `file_format` is invalid
+    """
+    if file_format == 'csv':
+        return _csv_file_format(schema, csv_block_size, csv_use_threads, csv_na_as_null)
+
+    try:
+        return {
+            'parquet': ds.ParquetFileFormat,
+            'arrow': ds.IpcFileFormat,
+        }[file_format]()
+    except KeyError:
+        raise ValueError(f'invalid file_format={file_format}')
+
+
+def _csv_file_format(schema: pa.Schema | None, block_size: int, use_threads: bool,
+                     na_as_null: bool = False) -> ds.CsvFileFormat:
+    """
+    _file_format_for_name() helper that returns a ds.CsvFileFormat whose options are derived from `schema`. NB: the
+    dataset scanner already parses CSV columns into the dataset schema's types, but setting them in the format means
+    that they also apply when a single file is read outside of a scan, e.g., by `FragmentCache.fetch()` and
+    `_is_valid_file()`. columns of dictionary type are parsed directly into dictionaries. null handling is pyarrow's
+    default (string columns keep 'NA' and '') unless `na_as_null` is True, in which case CSV_NULL_VALUES are read as
+    null in columns of every type, including strings, so CSV files agree with Parquet and Arrow ones about missing
+    values, e.g., a mean's `output_type_id`
+    """
+    null_kwargs = {'null_values': CSV_NULL_VALUES, 'strings_can_be_null': True, 'quoted_strings_can_be_null': True} \
+        if na_as_null else {}
+    convert_options = pcsv.ConvertOptions(
+        column_types={field.name: field.type for field in schema} if schema is not None else None, **null_kwargs)
+    read_options = pcsv.ReadOptions(block_size=block_size, use_threads=use_threads)
+    return ds.CsvFileFormat(convert_options=convert_options, read_options=read_options)
+
+
+def _hive_partitioning(filesystem: fs.FileSystem, path: str, schema: pa.Schema) -> ds.Partitioning:
+    """
+    Returns a hive ds.Partitioning for the directory at `path` whose partition columns have `schema`'s types (columns
+    not in `schema` keep their discovered types). Needed when some of them are dictionary (categorical) columns because
+    pyarrow requires their dictionaries up front, which we discover from the directory names. NB: this lists `path`.
+    """
+    discovered = ds.dataset(path, filesystem=filesystem, format='parquet',
+                            partitioning=ds.HivePartitioning.discover(infer_dictionary=True)).partitioning
+    fields = [schema.field(col_name) if col_name in schema.names else discovered.schema.field(col_name)
+              for col_name in discovered.schema.names]
+    dictionaries = {field.name: dictionary for field, dictionary in zip(fields, discovered.dictionaries)
+                    if pa.types.is_dictionary(field.type)}
+    return ds.partitioning(pa.schema(fields), flavor='hive', dictionaries=dictionaries)
+
+
+def _round_ids(dataset: ds.Dataset, round_col_name: str | None) -> list:
+    """
+    Helper that returns the round IDs of `dataset`'s files, which `HubConnection.get_dataset()` sets in their partition
+    expressions, e.g., for running a query one round at a time. Reads no data.
+
+    :return: a sorted list of round IDs, or `[None]` if any file has no round ID, meaning a single pass over all rounds
+    """
+    if round_col_name is None:
+        return [None]
+
+    round_ids = set()
+    for fragment in dataset.get_fragments():
+        round_id = ds.get_partition_keys(fragment.partition_expression).get(round_col_name)
+        if round_id is None:
+            return [None]
+
+        round_ids.add(round_id)
+    return sorted(round_ids)
+
+
+@functools.lru_cache(maxsize=4096)
+def _round_id_scalar(round_id: str, pa_type: pa.DataType) -> pa.Scalar | None:
+    """
+    _partition_expression() helper that converts a round ID parsed from a file name to a scalar of the round ID
+    column's type. memoized because a hub has many more files than rounds
+
+    :return: a pa.Scalar, or None if `round_id` cannot be converted to `pa_type`, e.g., a file name not following the
+        hubverse naming convention
+    """
+    try:
+        return pa.scalar(round_id).cast(pa_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None
+
+
+def _read_compaction_metadata(filesystem: fs.FileSystem, compacted_dir: str) -> dict | None:
+    """
+    :return: the contents of `compacted_dir`'s COMPACTION_METADATA_FILE_NAME file as a dict, or None if not found
+    """
+    try:
+        with filesystem.open_input_file(f'{compacted_dir}/{COMPACTION_METADATA_FILE_NAME}') as metadata_fp:
+            return json.load(metadata_fp)
+    except Exception:
+        return None
+
+
+def _read_stats_index(filesystem: fs.FileSystem, stats_index_path: str, schema: pa.Schema) -> pa.Table | None:
+    """
+    :return: the stats index at `stats_index_path` as a pa.Table, or None if not found, unreadable, or built for a
+        schema other than `schema`
+    """
+    try:
+        stats_index = pq.read_table(stats_index_path, filesystem=filesystem)
+        index_metadata = json.loads(stats_index.schema.metadata[STATS_INDEX_METADATA_KEY.encode()])
+    except Exception:
+        return None
+
+    if index_metadata['schema'] != _schema_to_json(schema):
+        logger.warn(f'ignoring stats index built for a different schema: {stats_index_path!r}')
+        return None
+
+    return stats_index
+
+
+def _stats_index_columns(schema: pa.Schema, tasks: dict) -> list[str]:
+    """
+    :return: the names of the columns that `build_stats_index()` indexes: all task ID columns plus `output_type`, in
+        schema order, excluding floating point ones
+    """
+    task_id_names = {task_id_name for the_round in tasks['rounds'] for model_task in the_round['model_tasks']
+                     for task_id_name in model_task['task_ids']}
+    return [field.name for field in schema
+            if ((field.name in task_id_names) or (field.name == 'output_type'))
+            and not pa.types.is_floating(field.type)]
+
+
+def _schema_to_json(schema: pa.Schema) -> list[list[str]]:
+    """
+    :return: a json-serializable representation of `schema` that's used to detect schema changes, e.g., for compaction.
+        dictionary (categorical) types are represented by their value types because they hold the same data
+    """
+    return [[field.name, str(field.type.value_type if pa.types.is_dictionary(field.type) else field.type)]
+            for field in schema]
 
 
-def connect_hub(hub_path: str | Path) -> HubConnection:
+def connect_hub(hub_path: str | Path, cache_dir: str | Path | None = None, prefer_compacted: bool = False,
+                list_concurrency: int | None = None, lazy: bool = False, cache_fragments: bool = False,
+                cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES, csv_block_size: int = DEFAULT_CSV_BLOCK_SIZE,
+                csv_use_threads: bool = True, categorical: str = 'none',
+                filesystem: fs.FileSystem | None = None, csv_na_as_null: bool = False,
+                listing_ttl: float = DEFAULT_LISTING_TTL) -> HubConnection:
     """
     The main entry point for connecting to a hub, providing access to the instance variables documented in
     `HubConnection`, including admin.json and tasks.json as dicts. It also allows connecting to data in the hub's model
@@ -186,7 +806,60 @@ def connect_hub(hub_path: str | Path) -> HubConnection:
         From that page: Recognized URI schemes are “file”, “mock”, “s3fs”, “gs”, “gcs”, “hdfs” and “viewfs”. In
         addition, the argument can be a local path, either a pathlib.Path object or a str. NB: Passing a local path as a
         str requires an ABSOLUTE path, but passing the hub as a Path can be a relative path.
+    :param cache_dir: optional str or Path of a local directory in which to cache the hub's model output file listing
+        (paths, sizes, and mtimes), keyed by hub URI. Defaults to None (no caching). When passed,
+        `HubConnection.get_dataset()` lists only the top level of the model output directory, re-walks only the model
+        directories that are new or whose cached listing is older than `listing_ttl` (or, on local file systems, whose
+        mtime changed), and builds the dataset directly from the cached listing rather than having pyarrow re-discover
+        the files - see `list_files_with_manifest()`. This can save a lot of time for large cloud-based hubs. The hub's
+        schema is cached there too - see `create_hub_schema()`
+    :param prefer_compacted: True if `HubConnection.get_dataset()` should read from the hub's compacted Parquet mirror
+        of its model output (see `compact_hub()`) when one exists. Falls back to the model output directory (with a
+        warning) if there is no mirror, if it was written for a different schema, or if it is stale, i.e., model output
+        files were added, removed, or modified since compaction. Defaults to False
+    :param list_concurrency: optional int that, when greater than one, makes `HubConnection.get_dataset()` list the
+        model output directory by first listing its model directories and then listing up to `list_concurrency` of
+        them at once. This can greatly reduce listing latency on S3 and GCS, where a single recursive listing is
+        paginated and serial. Defaults to None (one recursive listing)
+    :param lazy: True if the hub's config files should not be read, nor its schema created, until they are first
+        used. This avoids several round trips for cloud-based hubs when only some of the `HubConnection` is needed. NB:
+        in this case a missing admin.json or tasks.json raises RuntimeError on first use rather than here. Defaults to
+        False
+    :param cache_fragments: True if `HubConnection.get_dataset()` should read model output files through a local cache
+        under `cache_dir` that stores each file, converted to the hub's schema, as an uncompressed Arrow IPC file (see
+        `FragmentCache`). `HubConnection.get_dataset()` reads the uncached files among those that its `filter` might
+        match (all of them if there is no filter), and later calls (in this or other sessions) memory-map the cached
+        copies rather than re-downloading and re-parsing them. Files are keyed by their listed sizes and mtimes, so
+        with `cache_dir`'s listing cache, a file that was modified in place is re-fetched once `listing_ttl` expires.
+        Requires `cache_dir`. Defaults to False
+    :param cache_max_bytes: the size above which least recently used cached files are evicted. Defaults to
+        DEFAULT_CACHE_MAX_BYTES (10 GiB)
+    :param csv_block_size: the number of bytes of a CSV model output file that are parsed at a time. larger blocks
+        mean fewer, larger batches, and smaller ones less memory per file being read. Defaults to DEFAULT_CSV_BLOCK_SIZE
+        (1 MiB)
+    :param csv_use_threads: True if blocks of a CSV file can be parsed in parallel. pass False to read each CSV file
+        with one thread, e.g., when many files are already being read at once. Defaults to True
+    :param categorical: passed to `create_hub_schema()`. `"auto"` dictionary-encodes low-cardinality string columns
+        such as `model_id`, `output_type`, `target`, and `location` in every format read by
+        `HubConnection.get_dataset()`, which saves memory and speeds up group-bys. Defaults to `"none"`
+    :param filesystem: optional pyarrow FileSystem to access the hub through, in which case `hub_path` is the hub's path
+        within it, with or without a URI scheme (e.g., 's3://my-bucket/hub' or 'my-bucket/hub' for an S3FileSystem).
+        Defaults to None, which gets the FileSystem for `hub_path` via `filesystem_from_uri()`. That function shares one
+        FileSystem per S3 or GCS bucket across all connections in the process, which saves re-resolving credentials
+        and regions and re-opening HTTP connections for each one. See also `register_filesystem()`
+    :param csv_na_as_null: True if `NA` and empty values in CSV model output files should be read as null in every
+        column, including string ones such as `output_type_id`, as R hubData does and as the same data is stored in
+        Parquet and Arrow files. Defaults to False, which keeps pyarrow's CSV defaults: such values are null in
+        non-string columns but are kept as the strings `"NA"` and `""` in string columns. NB: not applied to a compacted
+        mirror (see `compact_hub()`), which is written with the default
+    :param listing_ttl: the number of seconds for which a model directory's cached listing is reused when `cache_dir`
+        is passed. Within that time, files that were modified in place (or, on S3 and GCS, added to an already listed
+        model directory) are not seen. Pass 0 to re-walk every model directory on each `HubConnection.get_dataset()`
+        call. Defaults to DEFAULT_LISTING_TTL (5 minutes)
     :return: a HubConnection
     :raise: RuntimeError if `hub_path` is invalid
+    :raise: ValueError if `cache_fragments` is True but `cache_dir` is None, or if `categorical` is invalid
     """
-    return HubConnection(hub_path)
+    return HubConnection(hub_path, cache_dir, prefer_compacted, list_concurrency, lazy, cache_fragments,
+                         cache_max_bytes, csv_block_size, csv_use_threads, categorical, filesystem, csv_na_as_null,
+                         listing_ttl)
@@ -1,11 +1,28 @@
+import datetime
 from pathlib import Path
+from typing import Iterator
 
 import pyarrow as pa
 import pyarrow.dataset as ds
 from pyarrow import fs
 
-from hubdata.connect_hub import HubConnection, connect_hub
-from hubdata.create_target_data_schema import TargetType, create_target_data_schema
+from hubdata.connect_hub import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_READAHEAD,
+    HubConnection,
+    _hive_partitioning,
+    _iter_dataset_batches,
+    connect_hub,
+)
+from hubdata.create_target_data_schema import (
+    TargetType,
+    _target_data_json,
+    _target_data_key_columns,
+    create_target_data_schema,
+)
+from hubdata.profiling import record_file_sizes, scan_to_table
+from hubdata.query import _coerce_value
+from hubdata.sql import latest_versions
 
 
 class TargetDataConnection:
@@ -21,19 +38,23 @@ class TargetDataConnection:
     """
 
 
-    def __init__(self, hub_path: str | Path, target_type: TargetType):
+    def __init__(self, hub_path: str | Path | HubConnection, target_type: TargetType,
+                 filesystem: fs.FileSystem | None = None):
         """
-        :param hub_path: str or Path pointing to a hub's root directory as passed to `connect_target_data()`
+        :param hub_path: str or Path pointing to a hub's root directory as passed to `connect_target_data()`, or an
+            existing HubConnection to reuse
+        :param filesystem: optional fs.FileSystem as passed to `connect_target_data()`
         """
         self.target_type = target_type
 
         # raises RuntimeError if hub_path is invalid:
-        self.hub_conn = connect_hub(hub_path)
+        self.hub_conn = hub_path if isinstance(hub_path, HubConnection) \
+            else connect_hub(hub_path, filesystem=filesystem)
 
         # raises RuntimeError if hub has no target data:
         self.found_file_info = self._validate_target_data(self.hub_conn, self.target_type == TargetType.TIME_SERIES)
 
-        self.schema = create_target_data_schema(self.hub_conn.hub_path, self.target_type)
+        self.schema = create_target_data_schema(self.hub_conn, self.target_type)  # reuses hub_conn
 
 
     @staticmethod
@@ -52,11 +73,11 @@ class TargetDataConnection:
         :raise: RuntimeError if hub has no time-series target data file or dir
         """
         target_data_name = 'time-series' if is_time_series else 'oracle-output'
-        file_infos: list[fs.FileInfo] = [
-            hub_conn._filesystem.get_file_info(f'{hub_conn._filesystem_path}/{file_or_dir}')
-            for file_or_dir in
-            [f'target-data/{target_data_name}.csv', f'target-data/{target_data_name}.parquet',
-             f'target-data/{target_data_name}/']]
+        file_infos: list[fs.FileInfo] = hub_conn._filesystem.get_file_info(  # NB: one batched call
+            [f'{hub_conn._filesystem_path}/{file_or_dir}'
+             for file_or_dir in
+             [f'target-data/{target_data_name}.csv', f'target-data/{target_data_name}.parquet',
+              f'target-data/{target_data_name}/']])
         found_file_infos = [_ for _ in file_infos if _.type != fs.FileType.NotFound]
         if len(found_file_infos) == 0:  # none were found
             raise RuntimeError(
@@ -81,8 +102,12 @@ class TargetDataConnection:
         """
         if self.found_file_info.is_file:  # it's `target-data/time-series.csv` or `target-data/time-series.parquet`
             file_format, partitioning = self.found_file_info.extension, None
+            record_file_sizes([self.found_file_info])  # NB: a no-op if not profiling
         else:  # it's `target-data/time-series/`
-            file_format, partitioning = 'parquet', 'hive'
+            file_format = 'parquet'
+            partitioning = _hive_partitioning(self.hub_conn._filesystem, self.found_file_info.path, self.schema) \
+                if (self.schema is not None) and any(pa.types.is_dictionary(field.type) for field in self.schema) \
+                else 'hive'
         return ds.dataset(self.found_file_info.path, filesystem=self.hub_conn._filesystem, schema=self.schema,
                           format=file_format, partitioning=partitioning)
 
@@ -90,12 +115,53 @@ class TargetDataConnection:
     def to_table(self, *args, **kwargs) -> pa.Table:
         """
         A convenience function that simply passes args and kwargs to `pyarrow.dataset.Dataset.to_table()`, returning the
-        `pyarrow.Table`.
+        `pyarrow.Table`. Records per-file scan events inside a `profile()` block.
         """
-        return self.get_dataset().to_table(*args, **kwargs)
+        return scan_to_table(self.get_dataset(), *args, **kwargs)
 
 
-def connect_target_data(hub_path: str | Path, target_type: TargetType) -> TargetDataConnection:
+    def iter_batches(self, columns: list[str] | None = None, filter: ds.Expression | None = None,
+                     batch_size: int = DEFAULT_BATCH_SIZE, readahead: int = DEFAULT_READAHEAD) \
+            -> Iterator[pa.RecordBatch]:
+        """
+        A streaming alternative to `to_table()`. Yields `pa.RecordBatch`es having `get_dataset()`'s schema (or the
+        `columns` subset of it) as they are read. Args are as documented in `HubConnection.iter_batches()`.
+
+        :return: an iterator of pa.RecordBatch
+        """
+        return _iter_dataset_batches(self.get_dataset(), columns, filter, batch_size, readahead)
+
+
+    def as_of(self, date: datetime.date | str | None = None) -> pa.Table:
+        """
+        For versioned target data (i.e., having an `as_of` column), returns a snapshot of the data as they were known on
+        `date`: for each observation (`observable_unit` and `date_col` values, plus `output_type` and `output_type_id`
+        for oracle-output target data that has them), the row with the newest `as_of` that is not after `date`.
+        Observations first reported after `date` are excluded.
+
+        The full history is never loaded into memory: the dataset is streamed twice via `hubdata.sql.latest_versions()`,
+        first to find each observation's newest `as_of`, and then to read only the rows having those dates. For
+        target data partitioned by `as_of` (e.g., `target-data/time-series/as_of=2025-02-11/...`), the second pass skips
+        the directories of superseded versions, and both passes skip those after `date`.
+
+        :param date: a datetime.date or ISO 8601 date str (e.g., '2025-02-12'). None (the default) means the newest
+            version of every observation
+        :return: a pa.Table with `get_dataset()`'s schema, sorted by the observation columns
+        :raise: ValueError if the target data is not versioned or `date` is invalid
+        """
+        if (self.schema is None) or ('as_of' not in self.schema.names):
+            target_data_name = 'time-series' if self.target_type == TargetType.TIME_SERIES else 'oracle-output'
+            raise ValueError(f'{target_data_name} target data is not versioned: its schema has no as_of column')
+
+        key_columns = _target_data_key_columns(_target_data_json(self.hub_conn),
+                                               self.target_type == TargetType.TIME_SERIES)
+        filter = None if date is None \
+            else ds.field('as_of') <= _coerce_value('as_of', self.schema.field('as_of').type, date)
+        return latest_versions(self.get_dataset(), key_columns, 'as_of', filter)
+
+
+def connect_target_data(hub_path: str | Path | HubConnection, target_type: TargetType,
+                        filesystem: fs.FileSystem | None = None) -> TargetDataConnection:
     """
     Top-level function for accessing the time-series target data or oracle-output target data for the passed `hub_path`.
     Like `connect_hub.connect_hub()` returns a "connection" object (`TargetDataConnection` in this case) that is used to
@@ -106,8 +172,11 @@ def connect_target_data(hub_path: str | Path, target_type: TargetType) -> Target
         a hub's root directory. It is passed to https://arrow.apache.org/docs/python/generated/pyarrow.fs.FileSystem.html#pyarrow.fs.FileSystem.from_uri
         From that page: Recognized URI schemes are “file”, “mock”, “s3fs”, “gs”, “gcs”, “hdfs” and “viewfs”. In
         addition, the argument can be a local path, either a pathlib.Path object or a str. NB: Passing a local path as a
-        str requires an ABSOLUTE path, but passing the hub as a Path can be a relative path.
+        str requires an ABSOLUTE path, but passing the hub as a Path can be a relative path. Alternatively, pass an
+        existing HubConnection to reuse it and its FileSystem.
     :param target_type: a TargetType specifying the target data type
+    :param filesystem: optional pyarrow FileSystem to access the hub through, as documented for `connect_hub()`.
+        ignored if `hub_path` is a HubConnection
 
     :return a TargetDataConnection
     :raise: RuntimeError if `hub_path` is invalid
@@ -116,4 +185,4 @@ def connect_target_data(hub_path: str | Path, target_type: TargetType) -> Target
     the time-series case), or `target-data/oracle-output.csv`, `target-data/oracle-output.parquet`, or
     `target-data/oracle-output/` files/dir (for the oracle-output case)
     """
-    return TargetDataConnection(hub_path, target_type)
+    return TargetDataConnection(hub_path, target_type, filesystem)
@@ -1,14 +1,45 @@
+import hashlib
 import json
-from collections import defaultdict
+import os
+import threading
+from collections import OrderedDict, defaultdict
 from datetime import date
+from pathlib import Path
 
 import pyarrow as pa
+import pyarrow.compute as pc
+import structlog
+
+from hubdata.profiling import timed
+
+logger = structlog.get_logger()
+
+SCHEMA_CACHE_SIZE = 64  # max number of schemas kept in memory by create_hub_schema(). least recently used are evicted
+
+# _pa_type_for_req_and_opt_vals() regexes: the common form of an ISO 8601 date, which Arrow can cast to date32, and a
+# superset of the other forms that `date.fromisoformat()` accepts ("YYYYMMDD", "YYYY-Www", "YYYYWwwD", etc.)
+ISO_DATE_REGEX = r'^\d{4}-\d{2}-\d{2}$'
+ISO_DATE_OTHER_REGEX = r'^\d{4}[-W\d]{3,6}$'
+
+BATCH_INFERENCE_MIN_VALUES = 256  # shorter value lists are classified one value at a time, which is faster for them
+
+# `categorical='auto'`: the dictionary type used for categorical columns, and the max number of distinct values a
+# task ID column can have to be one
+CATEGORICAL_PA_TYPE = pa.dictionary(pa.int32(), pa.string())
+CATEGORICAL_MAX_VALUES = 1000
+
+_schema_cache: OrderedDict[str, pa.Schema] = OrderedDict()  # schema key -> schema. see `_schema_key()`
+_schema_cache_lock = threading.Lock()
 
 
 def create_hub_schema(tasks: dict, output_type_id_datatype: str = 'from_config',
-                      partitions: tuple[tuple[str, pa.DataType]] | None = (('model_id', pa.string()),)) -> pa.Schema:
+                      partitions: tuple[tuple[str, pa.DataType]] | None = (('model_id', pa.string()),),
+                      cache_dir: str | Path | None = None, categorical: str = 'none') -> pa.Schema:
     """
-    Top-level function for creating a schema for the passed `tasks`.
+    Top-level function for creating a schema for the passed `tasks`. Schemas are memoized by a hash of the contents of
+    `tasks` and the other arguments, so repeat calls for identical `tasks.json` documents return quickly. The most
+    recently used `SCHEMA_CACHE_SIZE` schemas are kept in memory, and if `cache_dir` is passed then schemas are also
+    stored there (serialized in Arrow IPC format) so that they survive across processes.
 
     :param tasks: a hub's `tasks.json` contents from which to create a schema - see `HubConnection.tasks`
     :param output_type_id_datatype: a string that's one of `"from_config"`, `"auto"`, `"character"`, `"double"`,
@@ -21,7 +52,91 @@ def create_hub_schema(tasks: dict, output_type_id_datatype: str = 'from_config',
         auto-determined.
     :param partitions: a list of 2-tuples (column_name, data_type) specifying the arrow data types
         of any partitioning column. pass None if no partitions
+    :param cache_dir: optional str or Path of a local directory in which to store schemas. created if necessary
+    :param categorical: a string that's one of `"none"` (the default) or `"auto"`. `"auto"` types these columns as
+        `CATEGORICAL_PA_TYPE` (dictionary-encoded strings) rather than as `pa.string()`: string task ID columns whose
+        values are closed (every model task lists them in `required` and/or `optional`) and number at most
+        `CATEGORICAL_MAX_VALUES`, `output_type`, and string partition columns such as `model_id`
     :return: a `pyarrow.Schema` for the passed `HubConnection`
+    :raise: ValueError if `categorical` is invalid
+    """
+    if categorical not in ['none', 'auto']:
+        raise ValueError(f"invalid {categorical=}. must be one of 'none' or 'auto'")
+
+    schema_key = _schema_key(tasks, output_type_id_datatype, partitions, categorical)
+    with _schema_cache_lock:
+        if schema_key in _schema_cache:
+            _schema_cache.move_to_end(schema_key)
+            return _schema_cache[schema_key]
+
+    schema = _read_cached_schema(cache_dir, schema_key) if cache_dir is not None else None
+    if schema is None:
+        with timed('create_hub_schema'):
+            schema = _create_hub_schema(tasks, output_type_id_datatype, partitions, categorical)
+        if cache_dir is not None:
+            _write_cached_schema(cache_dir, schema_key, schema)
+
+    with _schema_cache_lock:
+        _schema_cache[schema_key] = schema
+        _schema_cache.move_to_end(schema_key)
+        while len(_schema_cache) > SCHEMA_CACHE_SIZE:
+            _schema_cache.popitem(last=False)
+    return schema
+
+
+def _schema_key(tasks: dict, output_type_id_datatype: str, partitions: tuple[tuple[str, pa.DataType]] | None,
+                categorical: str = 'none') -> str:
+    """
+    :return: a str that identifies the schema that `create_hub_schema()` returns for the passed args: a sha256 hash of
+        `tasks`'s canonical JSON serialization plus the other args
+    """
+    key_obj = {'tasks': tasks, 'output_type_id_datatype': output_type_id_datatype,
+               'partitions': [[column_name, str(column_type)] for column_name, column_type in partitions]
+               if partitions else None, 'categorical': categorical}
+    return hashlib.sha256(json.dumps(key_obj, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def _cached_schema_path(cache_dir: str | Path, schema_key: str) -> Path:
+    return Path(cache_dir) / 'schemas' / f'{schema_key}.arrow'
+
+
+def _read_cached_schema(cache_dir: str | Path, schema_key: str) -> pa.Schema | None:
+    """
+    :return: the schema stored under `cache_dir` for `schema_key`, or None if there is none or it cannot be read
+    """
+    schema_path = _cached_schema_path(cache_dir, schema_key)
+    try:
+        return pa.ipc.read_schema(pa.py_buffer(schema_path.read_bytes()))
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.warn(f'ignoring unreadable cached schema: {str(schema_path)!r}: {ex!r}')
+        return None
+
+
+def _write_cached_schema(cache_dir: str | Path, schema_key: str, schema: pa.Schema):
+    """
+    Writes `schema` under `cache_dir` atomically so that concurrent readers never see a partial file.
+    """
+    schema_path = _cached_schema_path(cache_dir, schema_key)
+    schema_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = schema_path.with_name(f'{schema_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(schema.serialize().to_pybytes())
+    os.replace(tmp_path, schema_path)
+
+
+def _clear_schema_cache():
+    """
+    Empties create_hub_schema()'s in-memory cache. Does not touch any `cache_dir`.
+    """
+    with _schema_cache_lock:
+        _schema_cache.clear()
+
+
+def _create_hub_schema(tasks: dict, output_type_id_datatype: str,
+                       partitions: tuple[tuple[str, pa.DataType]] | None, categorical: str = 'none') -> pa.Schema:
+    """
+    create_hub_schema() helper that does the actual (uncached) work. args are as passed to it.
     """
     # build col_name_to_pa_types, which maps each found column_name to a list of pa.DataTypes that were found for it.
     # afterward we merge the data types to get the "simplest" one
@@ -57,10 +172,38 @@ def create_hub_schema(tasks: dict, output_type_id_datatype: str = 'from_config',
     if 'output_type_id' not in col_name_to_pa_type:
         col_name_to_pa_type['output_type_id'] = pa.string()
 
+    # dictionary-encode categorical columns if requested
+    if categorical == 'auto':
+        for column_name in _categorical_columns(tasks, partitions):
+            if col_name_to_pa_type.get(column_name) == pa.string():
+                col_name_to_pa_type[column_name] = CATEGORICAL_PA_TYPE
+
     # done
     return pa.schema(col_name_to_pa_type)
 
 
+def _categorical_columns(tasks: dict, partitions: tuple[tuple[str, pa.DataType]] | None) -> list[str]:
+    """
+    :return: the names of the columns that `categorical='auto'` dictionary-encodes if they are strings: task IDs whose
+        value sets are closed and small (see `create_hub_schema()`), 'output_type', and partition columns
+    """
+    task_id_to_values: dict[str, set] = defaultdict(set)
+    open_task_ids = set()
+    for the_round in tasks['rounds']:
+        for model_task in the_round['model_tasks']:
+            for task_id_key, task_id_value in model_task['task_ids'].items():
+                values = (task_id_value['required'] or []) + (task_id_value['optional'] or [])
+                if not values:  # NB: both null means any value is allowed
+                    open_task_ids.add(task_id_key)
+                task_id_to_values[task_id_key].update(values)
+    column_names = [task_id_key for task_id_key, values in task_id_to_values.items()
+                    if (task_id_key not in open_task_ids) and (len(values) <= CATEGORICAL_MAX_VALUES)]
+    column_names.append('output_type')
+    if partitions:
+        column_names.extend(column_name for column_name, _ in partitions)
+    return column_names
+
+
 def _columns_for_model_task(model_task: dict, partitions: tuple[tuple[str, pa.DataType]] | None) \
         -> list[tuple[str, pa.DataType]]:
     # columns is a list of two-tuples: model_task key (column name) and inferred pa.DataType for it. the list possibly
@@ -99,6 +242,20 @@ def _columns_for_model_task(model_task: dict, partitions: tuple[tuple[str, pa.Da
     return columns
 
 
+def _round_id_col_name(tasks: dict) -> str | None:
+    """
+    Returns the name of the task ID column that holds round IDs, i.e., the `round_id` of rounds whose
+    `round_id_from_variable` is true. Returns None if any round does not get its ID from a variable, or if rounds
+    disagree on the variable, in which case there is no single round column.
+
+    :param tasks: a hub's `tasks.json` contents - see `HubConnection.tasks`
+    :return: a column name or None
+    """
+    round_id_col_names = {the_round['round_id'] if the_round.get('round_id_from_variable') else None
+                          for the_round in tasks['rounds']}
+    return round_id_col_names.pop() if len(round_id_col_names) == 1 else None
+
+
 def _pa_type_for_hub_type(hub_type: str) -> pa.DataType:
     """
     :param: hub_type: a hub data type as defined at https://hubverse.io/en/latest/quickstart-hub-admin/tasks-config.html#step-9-optional-set-up-output-type-id-datatype
@@ -123,10 +280,55 @@ def _pa_type_for_req_and_opt_vals(required: list | None, optional: list | None)
     or None if no values passed or only "NA" passed. Note that a non-string data type is returned only if the merger of
     `required` and `optional` contains items all the same type.
 
+    Long value lists are classified together as one `pa.array` rather than one value at a time, which matters for hubs
+    with thousands of values. The result is identical to `_pa_type_for_vals_per_value()`'s, which we fall back to for
+    the rare value lists that Arrow cannot classify exactly, e.g., mixed types or non-"YYYY-MM-DD" ISO dates.
+
     :param required: from the "required" field of a rounds.model_tasks.task_ids value
     :param optional: "" "optional" ""
     :return: a pa.DataType or None
     """
+    req_and_opt_vals = (required if required else []) + (optional if optional else [])
+    if not req_and_opt_vals:
+        return None
+    elif len(req_and_opt_vals) < BATCH_INFERENCE_MIN_VALUES:
+        return _pa_type_for_vals_per_value(req_and_opt_vals)
+
+    try:
+        values = pa.array(req_and_opt_vals)
+    except (pa.ArrowException, TypeError, ValueError, OverflowError):  # mixed types, huge ints, etc.
+        return _pa_type_for_vals_per_value(req_and_opt_vals)
+
+    if values.null_count:  # a JSON null is neither "NA" nor a date or number
+        return pa.string()
+    elif pa.types.is_int64(values.type):
+        return pa.int32()
+    elif pa.types.is_float64(values.type):  # NB: Arrow also converts any bools mixed in with floats
+        return pa.string() if bool in set(map(type, req_and_opt_vals)) else pa.float64()
+    elif not pa.types.is_string(values.type):  # bools, lists, objects
+        return pa.string()
+
+    values = values.filter(pc.not_equal(values, 'NA'))  # special case: NA should not influence returned type
+    if len(values) == 0:
+        return None
+    elif not pc.all(pc.match_substring_regex(values, ISO_DATE_REGEX)).as_py():
+        # strings like "20230101" and "2023-W01" are also ISO dates, but only ones that look like one can be
+        return _pa_type_for_vals_per_value(req_and_opt_vals) \
+            if pc.all(pc.match_substring_regex(values, ISO_DATE_OTHER_REGEX)).as_py() else pa.string()
+
+    try:
+        values.cast(pa.date32())
+    except pa.ArrowInvalid:  # e.g., "2023-02-30"
+        return pa.string()
+
+    # Arrow accepts year 0, but Python's dates (and therefore hub tools) start at year 1
+    return pa.string() if pc.any(pc.starts_with(values, '0000')).as_py() else pa.date32()
+
+
+def _pa_type_for_vals_per_value(req_and_opt_vals: list) -> pa.DataType | None:
+    """
+    `_pa_type_for_req_and_opt_vals()` helper that classifies `req_and_opt_vals` one value at a time.
+    """
 
 
     def is_number(value, is_float):
@@ -145,7 +347,6 @@ def _pa_type_for_req_and_opt_vals(required: list | None, optional: list | None)
             return False
 
 
-    req_and_opt_vals = (required if required else []) + (optional if optional else [])
     pa_types = []
     for value in req_and_opt_vals:
         # try parsing in this order: NA, pa.date32, pa.float64, pa.int32
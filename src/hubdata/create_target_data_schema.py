@@ -6,7 +6,7 @@ import pyarrow as pa
 import structlog
 
 from hubdata.connect_hub import HubConnection, connect_hub
-from hubdata.create_hub_schema import _pa_type_for_hub_type
+from hubdata.create_hub_schema import _pa_type_for_hub_type, create_hub_schema
 
 logger = structlog.get_logger()
 
@@ -16,7 +16,8 @@ class TargetType(Enum):
     ORACLE_OUTPUT = auto()  # "" oracle-output ""
 
 
-def create_target_data_schema(hub_path: str | Path, target_type: TargetType) -> pa.Schema | None:
+def create_target_data_schema(hub_path: str | Path | HubConnection, target_type: TargetType,
+                              categorical: str | None = None) -> pa.Schema | None:
     """
     Top-level function for creating a time-series target schema or oracle-output target schema for the passed
     `hub_path`.
@@ -25,17 +26,26 @@ def create_target_data_schema(hub_path: str | Path, target_type: TargetType) ->
         a hub's root directory. It is passed to https://arrow.apache.org/docs/python/generated/pyarrow.fs.FileSystem.html#pyarrow.fs.FileSystem.from_uri
         From that page: Recognized URI schemes are “file”, “mock”, “s3fs”, “gs”, “gcs”, “hdfs” and “viewfs”. In
         addition, the argument can be a local path, either a pathlib.Path object or a str. NB: Passing a local path as a
-        str requires an ABSOLUTE path, but passing the hub as a Path can be a relative path.
+        str requires an ABSOLUTE path, but passing the hub as a Path can be a relative path. Alternatively, pass an
+        existing HubConnection to reuse it rather than connecting to the hub again.
     :param target_type: a TargetType specifying the target data schema type
+    :param categorical: as passed to `create_hub_schema()`. `"auto"` dictionary-encodes the observable unit and
+        `output_type` columns that the hub schema does. Defaults to None, which uses `hub_path`'s `categorical` if it is
+        a HubConnection, and `"none"` otherwise
     :return: a `pyarrow.Schema` for the passed `hub_path` if a `hub-config/target-data.json` file is present. otherwise
         returns None
     :raise: RuntimeError if `hub_path` is invalid
+    :raise: ValueError if `categorical` is invalid
     """
-    hub_conn = connect_hub(hub_path)
+    hub_conn = hub_path if isinstance(hub_path, HubConnection) else connect_hub(hub_path)
     target_data = _target_data_json(hub_conn)  # try to open hub-config/target-data.json
-    return pa.schema(_col_name_to_pa_type_for_target_data(hub_conn.schema, target_data,
-                                                          target_type == TargetType.TIME_SERIES)) \
-        if target_data is not None else None
+    if target_data is None:
+        return None
+
+    hub_schema = hub_conn.schema if (categorical is None) or (categorical == hub_conn.categorical) \
+        else create_hub_schema(hub_conn.tasks, cache_dir=hub_conn.cache_dir, categorical=categorical)
+    return pa.schema(_col_name_to_pa_type_for_target_data(hub_schema, target_data,
+                                                          target_type == TargetType.TIME_SERIES))
 
 
 def _target_data_json(hub_conn: HubConnection) -> dict | None:
@@ -70,10 +80,7 @@ def _col_name_to_pa_type_for_target_data(hub_schema: pa.Schema, target_data: dic
 
     # top-level property: `observable_unit` (required): task ID column names. get types from regular schema
     # (tasks.json). can be overridden by target-type specific configuration
-    ts_observable_unit = target_data[property_name]['observable_unit'] \
-        if (property_name in target_data) and ('observable_unit' in target_data[property_name]) \
-        else target_data['observable_unit']
-    for column_name in ts_observable_unit:
+    for column_name in _observable_unit(target_data, property_name):
         col_name_to_pa_type[column_name] = hub_schema.field(column_name).type
 
     # top-level property: `date_col` (required): date column name. a Date. may or may not be in `observable_unit`
@@ -103,10 +110,7 @@ def _col_name_to_pa_type_for_target_data(hub_schema: pa.Schema, target_data: dic
     else:  # oracle-output specific
         # target-type specific configuration: `oracle-output` > `has_output_type_ids` (optional): Indicates whether the
         # oracle-output data have an `output_type` and `output_type_id` column.
-        has_output_type_ids = target_data[property_name]['has_output_type_ids'] \
-            if (property_name in target_data) and ('has_output_type_ids' in target_data[property_name]) \
-            else False
-        if has_output_type_ids:
+        if _has_output_type_ids(target_data):
             col_name_to_pa_type['output_type'] = hub_schema.field('output_type').type
             col_name_to_pa_type['output_type_id'] = hub_schema.field('output_type_id').type
 
@@ -115,3 +119,39 @@ def _col_name_to_pa_type_for_target_data(hub_schema: pa.Schema, target_data: dic
 
     # done
     return col_name_to_pa_type
+
+
+def _target_data_key_columns(target_data: dict, is_time_series: bool) -> list[str]:
+    """
+    Helper that returns the names of the columns that identify a single target data observation, i.e., that a versioned
+    dataset has one row per `as_of` date for: `observable_unit`, `date_col`, and, for oracle-output target data that
+    has them, `output_type` and `output_type_id`.
+
+    :param target_data: as returned by `_target_data_json()`
+    :param is_time_series: True if output is for time-series target data, and False if for oracle-output target data
+    :return: list of column names
+    """
+    key_columns = _observable_unit(target_data, 'time-series' if is_time_series else 'oracle-output') \
+                  + [target_data['date_col']]
+    if not is_time_series and _has_output_type_ids(target_data):
+        key_columns.extend(['output_type', 'output_type_id'])
+    return list(dict.fromkeys(key_columns))
+
+
+def _observable_unit(target_data: dict, property_name: str) -> list[str]:
+    """
+    :return: the `observable_unit` for `property_name` ('time-series' or 'oracle-output'). the target-type specific
+        one overrides the top-level one
+    """
+    return target_data[property_name]['observable_unit'] \
+        if (property_name in target_data) and ('observable_unit' in target_data[property_name]) \
+        else target_data['observable_unit']
+
+
+def _has_output_type_ids(target_data: dict) -> bool:
+    """
+    :return: `oracle-output` > `has_output_type_ids`, defaulting to False
+    """
+    return target_data['oracle-output']['has_output_type_ids'] \
+        if ('oracle-output' in target_data) and ('has_output_type_ids' in target_data['oracle-output']) \
+        else False
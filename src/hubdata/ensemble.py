@@ -0,0 +1,204 @@
+"""hubdata ensembles: streamed mean, weighted mean, and median ensembles of model output, and writing them to a hub."""
+
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from hubdata.connect_hub import HubConnection, _round_ids
+from hubdata.profiling import timed
+from hubdata.sql import _scan_declarations
+
+ENSEMBLE_FUNCTIONS = ('mean', 'median')  # valid `agg` args to `build_ensemble()`
+
+DEFAULT_ENSEMBLE_MODEL_ID = 'hub-ensemble'
+
+# model output columns that are not combined across models. the rest (task IDs, output_type, and output_type_id)
+# identify the values that are
+NON_ENSEMBLE_KEY_COLUMNS = ('value', 'model_id')
+
+
+def build_ensemble(hub_conn: HubConnection, agg: str = 'mean', weights: dict[str, float] | None = None,
+                   model_id: str = DEFAULT_ENSEMBLE_MODEL_ID, filter: ds.Expression | None = None) -> pa.Table:
+    """
+    Builds an ensemble of `hub_conn`'s models by combining their values for each combination of task IDs, output_type,
+    and output_type_id, like hubEnsembles' `simple_ensemble()`. Model output is read one round at a time (as determined
+    by model output file names or partitions), each through a multi-threaded Acero plan that reads only the needed
+    columns, so that memory is bounded by one round's ensemble:
+
+    - mean: a streamed hash aggregation
+    - weighted mean (`agg='mean'` with `weights`): each value is weighted by its model's weight via a hash join with
+      the weights, followed by a streamed hash aggregation of `sum(weight * value) / sum(weight)`. models without a
+      weight are excluded. weights need not sum to one, and are renormalized for combinations that some models lack
+    - median: the exact median, computed from the round's values sorted within each combination
+
+    Null values are ignored. 'sample' output type rows are excluded because samples from different models are not
+    comparable by output_type_id.
+
+    :param hub_conn: the hub's HubConnection
+    :param agg: one of ENSEMBLE_FUNCTIONS
+    :param weights: optional dict that maps model_ids to non-negative weights. only valid with `agg='mean'`
+    :param model_id: the ensemble's model_id
+    :param filter: optional `ds.Expression` used to filter model output rows, e.g., to select models or rounds. it's
+        pushed down so that files and row groups that cannot match are skipped
+    :return: a pa.Table with `hub_conn.schema`'s columns (and types, except that `value` is float64), with `model_id`
+        set to `model_id`, sorted by task IDs, output_type, and output_type_id within each round. pass it to
+        `write_model_output()` to add it to a hub
+    :raise: ValueError if `agg` or `weights` is invalid
+    """
+    if agg not in ENSEMBLE_FUNCTIONS:
+        raise ValueError(f'invalid {agg=}. must be one of {ENSEMBLE_FUNCTIONS}')
+
+    if (weights is not None) and ((agg != 'mean') or not weights or any(weight < 0 for weight in weights.values())):
+        raise ValueError(f"invalid {weights=}. weights must be non-negative, non-empty, and used with agg='mean'")
+
+    key_columns = [col_name for col_name in hub_conn.schema.names if col_name not in NON_ENSEMBLE_KEY_COLUMNS]
+    ensemble_filter = (ds.field('output_type') != 'sample') & ds.field('value').is_valid()
+    if filter is not None:
+        ensemble_filter = ensemble_filter & filter
+    dataset = hub_conn.get_dataset()
+    round_col_name = hub_conn._round_id_col_name
+    round_tables = []
+    for round_id in _round_ids(dataset, round_col_name):
+        round_filter = ensemble_filter if round_id is None \
+            else (ds.field(round_col_name) == round_id) & ensemble_filter
+        with timed('ensemble', agg=agg, round_id=round_id) as event_fields:
+            if agg == 'median':
+                round_table = _median_ensemble(dataset, key_columns, round_filter)
+            else:
+                round_table = _mean_ensemble(dataset, key_columns, weights, round_filter)
+            event_fields['num_rows'] = round_table.num_rows
+        round_tables.append(round_table.sort_by([(col_name, 'ascending') for col_name in key_columns]))
+
+    ensemble_schema = pa.schema([field.with_type(pa.float64()) if field.name == 'value' else field
+                                 for field in hub_conn.schema])
+    if not round_tables:
+        return ensemble_schema.empty_table()
+
+    table = pa.concat_tables(round_tables)
+    return table \
+        .append_column('model_id', pa.array([model_id] * table.num_rows, pa.string())) \
+        .select(ensemble_schema.names) \
+        .cast(ensemble_schema) \
+        .unify_dictionaries()
+
+
+def _mean_ensemble(dataset: ds.Dataset, key_columns: list[str], weights: dict[str, float] | None,
+                   filter: ds.Expression) -> pa.Table:
+    """
+    `build_ensemble()` helper that runs a mean or weighted mean Acero plan for one round.
+
+    :return: a pa.Table with `key_columns` (decoded if dictionaries) plus `value`
+    """
+    if weights is None:
+        declarations, _ = _scan_declarations(dataset, key_columns + ['value'], filter)
+        declarations.append(acero.Declaration('aggregate', acero.AggregateNodeOptions(
+            [('value', 'hash_mean', None, 'value')], keys=key_columns)))
+        return acero.Declaration.from_sequence(declarations).to_table(use_threads=True)
+
+    weights_table = pa.table({'model_id': pa.array(list(weights.keys()), pa.string()),
+                              '__weight': pa.array(list(weights.values()), pa.float64())})
+    declarations, _ = _scan_declarations(dataset, key_columns + ['value', 'model_id'],
+                                         filter & ds.field('model_id').isin(weights_table['model_id']))
+    join_declaration = acero.Declaration('hashjoin', acero.HashJoinNodeOptions(
+        'inner', left_keys=['model_id'], right_keys=['model_id'], left_output=key_columns + ['value'],
+        right_output=['__weight']),
+        inputs=[acero.Declaration.from_sequence(declarations),
+                acero.Declaration('table_source', acero.TableSourceNodeOptions(weights_table))])
+    table = acero.Declaration.from_sequence([
+        join_declaration,
+        acero.Declaration('project', acero.ProjectNodeOptions(
+            [ds.field(col_name) for col_name in key_columns]
+            + [pc.multiply(pc.field('__weight'), pc.field('value').cast(pa.float64())), pc.field('__weight')],
+            key_columns + ['__weighted_value', '__weight'])),
+        acero.Declaration('aggregate', acero.AggregateNodeOptions(
+            [('__weighted_value', 'hash_sum', None, '__weighted_value'), ('__weight', 'hash_sum', None, '__weight')],
+            keys=key_columns)),
+    ]).to_table(use_threads=True)
+    return table.select(key_columns).append_column('value', pc.divide(table['__weighted_value'], table['__weight']))
+
+
+def _median_ensemble(dataset: ds.Dataset, key_columns: list[str], filter: ds.Expression) -> pa.Table:
+    """
+    `build_ensemble()` helper that computes one round's exact medians. Acero's hash aggregations only have approximate
+    medians, so we read the round's values and sort them within each combination of `key_columns`, after which a
+    combination's median is at (or, for an even count, is the mean of the two values at) the middle of its run of rows.
+
+    :return: a pa.Table with `key_columns` (decoded if dictionaries) plus `value`
+    """
+    declarations, _ = _scan_declarations(dataset, key_columns + ['value'], filter)
+    table = acero.Declaration.from_sequence(declarations).to_table(use_threads=True)
+    table = table.set_column(table.schema.get_field_index('value'), 'value', pc.cast(table['value'], pa.float64()))
+    table = table.take(pc.sort_indices(table, [(col_name, 'ascending') for col_name in key_columns + ['value']]))
+    row_index = pc.subtract(pc.cumulative_sum(pa.repeat(pa.scalar(1, pa.int64()), table.num_rows)), 1)  # 0-based
+    groups = table.select(key_columns).append_column('__row_index', row_index) \
+        .group_by(key_columns, use_threads=False) \
+        .aggregate([('__row_index', 'min'), ('__row_index', 'count')])
+    first_row, num_values = groups['__row_index_min'], groups['__row_index_count']
+    lower_value = table['value'].take(pc.add(first_row, pc.divide(pc.subtract(num_values, 1), 2)))  # integer division
+    upper_value = table['value'].take(pc.add(first_row, pc.divide(num_values, 2)))
+    return groups.select(key_columns).append_column('value', pc.divide(pc.add(lower_value, upper_value), 2))
+
+
+def write_model_output(hub_conn: HubConnection, table: pa.Table, file_format: str | None = None,
+                       model_output_dir: str | None = None) -> list[str]:
+    """
+    Writes `table` (e.g., as returned by `build_ensemble()`) to a hub's model output directory following hubverse
+    conventions: one `<model_output_dir>/<model_id>/<round_id>-<model_id>.<file_format>` file per model and round,
+    whose columns are `hub_conn.schema`'s (except `model_id`, which is the directory) cast to its types. Existing files
+    are overwritten. NB: the hub's `model-metadata/` file for a new model_id is not written.
+
+    :param hub_conn: the hub's HubConnection
+    :param table: a pa.Table with at least `hub_conn.schema`'s columns
+    :param file_format: 'csv', 'parquet', or 'arrow'. defaults to the first of the hub's `admin.json` file formats
+    :param model_output_dir: the directory to write to, in `hub_conn`'s file system. defaults to the hub's
+    :return: the paths of the written files, sorted
+    :raise: ValueError if `file_format` is invalid, if the hub has no single round ID column, or if `table`'s values
+        cannot be cast to the hub's types, e.g., non-integer values of an integer `value` column
+    """
+    file_format = file_format or hub_conn.admin['file_format'][0]
+    if file_format not in ('csv', 'parquet', 'arrow'):
+        raise ValueError(f"invalid {file_format=}. must be one of 'csv', 'parquet', or 'arrow'")
+
+    round_col_name = hub_conn._round_id_col_name
+    if round_col_name is None:
+        raise ValueError('cannot name model output files: hub rounds do not all get their round ID from the same task '
+                         'ID variable')
+
+    file_schema = pa.schema([field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                             for field in hub_conn.schema if field.name != 'model_id'])
+    try:
+        model_ids, file_table = table['model_id'].cast(pa.string()), table.select(file_schema.names).cast(file_schema)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as ex:
+        raise ValueError(f'cannot cast table to the hub schema: {ex}')
+
+    filesystem = hub_conn._filesystem
+    model_output_dir = model_output_dir or hub_conn.model_output_dir
+    written_paths = []
+    for model_id in pc.unique(model_ids).to_pylist():
+        filesystem.create_dir(f'{model_output_dir}/{model_id}', recursive=True)
+        model_table = file_table.filter(pc.equal(model_ids, model_id))
+        for round_id in pc.unique(model_table[round_col_name]).to_pylist():
+            file_path = f'{model_output_dir}/{model_id}/{round_id}-{model_id}.{file_format}'
+            _write_table(model_table.filter(pc.equal(model_table[round_col_name], round_id)), filesystem, file_path,
+                         file_format)
+            written_paths.append(file_path)
+    return sorted(written_paths)
+
+
+def _write_table(table: pa.Table, filesystem, file_path: str, file_format: str):
+    """
+    `write_model_output()` helper that writes `table` to `file_path` in `file_format`.
+    """
+    if file_format == 'parquet':
+        pq.write_table(table, file_path, filesystem=filesystem)
+        return
+
+    with filesystem.open_output_stream(file_path) as output_stream:
+        if file_format == 'csv':
+            csv.write_csv(table, output_stream)
+        else:  # 'arrow'
+            with pa.ipc.new_file(output_stream, table.schema) as writer:
+                writer.write_table(table)
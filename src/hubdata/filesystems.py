@@ -0,0 +1,96 @@
+"""hubdata FileSystem reuse: a process-wide registry of object store FileSystems keyed by URI scheme and bucket."""
+
+import os
+import threading
+import urllib.parse
+from pathlib import Path
+
+from pyarrow import fs
+
+# URI schemes whose FileSystems are registered. their URIs' netloc is a bucket, and their FileSystem paths start with it
+REGISTRY_SCHEMES = ('s3', 'gs', 'gcs')
+
+_filesystems: dict[tuple[str, str, str], fs.FileSystem] = {}  # see `_registry_key()`
+_filesystems_lock = threading.Lock()
+
+
+def filesystem_from_uri(uri: str | Path) -> tuple[fs.FileSystem, str]:
+    """
+    A drop-in replacement for `pyarrow.fs.FileSystem.from_uri()` that reuses FileSystems across calls. For S3 and GCS
+    URIs, the FileSystem for the URI's scheme, bucket, and query parameters (e.g., `?region=us-east-1`) is created on
+    first use and then shared process-wide, so that later connections to any hub in the same bucket skip
+    re-resolving credentials and regions, and reuse the FileSystem's open HTTP connections. Other URIs (e.g., local
+    paths) are passed to `from_uri()`. Thread-safe.
+
+    :param uri: str or Path as documented for `connect_hub()`'s `hub_path`
+    :return: a 2-tuple: (FileSystem, path within it), as `from_uri()` returns
+    :raise: whatever `from_uri()` raises for an invalid `uri`
+    """
+    registry_key = _registry_key(uri)
+    if registry_key is None:
+        return fs.FileSystem.from_uri(uri)
+
+    with _filesystems_lock:
+        filesystem = _filesystems.get(registry_key)
+    if filesystem is None:
+        filesystem, _ = fs.FileSystem.from_uri(uri)  # NB: outside the lock because it can take a network round trip
+        with _filesystems_lock:
+            filesystem = _filesystems.setdefault(registry_key, filesystem)  # keep the first if another thread raced us
+    return filesystem, filesystem_path(uri)
+
+
+def register_filesystem(uri: str, filesystem: fs.FileSystem):
+    """
+    Registers `filesystem` as the one that `filesystem_from_uri()` (and therefore `connect_hub()` and
+    `connect_target_data()`) uses for `uri`'s scheme, bucket, and query parameters, e.g., an `S3FileSystem` configured
+    with a service's credentials and retry strategy. Replaces any registered one.
+
+    :param uri: a str URI whose scheme is one of REGISTRY_SCHEMES, e.g., 's3://my-bucket'. any path is ignored
+    :param filesystem: the FileSystem to use
+    :raise: ValueError if `uri`'s scheme is not one of REGISTRY_SCHEMES
+    """
+    registry_key = _registry_key(uri)
+    if registry_key is None:
+        raise ValueError(f'invalid uri: {uri!r}. the scheme must be one of {REGISTRY_SCHEMES}')
+
+    with _filesystems_lock:
+        _filesystems[registry_key] = filesystem
+
+
+def clear_filesystems():
+    """
+    Empties the registry, e.g., after credentials change. FileSystems already passed out keep working.
+    """
+    with _filesystems_lock:
+        _filesystems.clear()
+
+
+def filesystem_path(uri: str | Path) -> str:
+    """
+    :return: the path within its FileSystem that `uri` refers to, without creating the FileSystem. the same as
+        `from_uri(uri)[1]` for local paths and for REGISTRY_SCHEMES URIs (e.g., 'bucket/hub' for 's3://bucket/hub/')
+    """
+    if isinstance(uri, Path):
+        return os.path.abspath(uri)
+
+    parsed_uri = urllib.parse.urlparse(uri)
+    if parsed_uri.scheme in REGISTRY_SCHEMES:
+        return urllib.parse.unquote(f'{parsed_uri.netloc}{parsed_uri.path}').rstrip('/')
+    elif parsed_uri.scheme == 'file':
+        return os.path.normpath(urllib.parse.unquote(parsed_uri.path))
+    elif not parsed_uri.scheme:
+        return uri.rstrip('/') or uri
+    else:
+        return urllib.parse.unquote(parsed_uri.path)
+
+
+def _registry_key(uri: str | Path) -> tuple[str, str, str] | None:
+    """
+    :return: a 3-tuple that identifies `uri`'s registered FileSystem: (scheme, bucket, query string), or None if `uri`
+        is not a REGISTRY_SCHEMES URI
+    """
+    if isinstance(uri, Path):
+        return None
+
+    parsed_uri = urllib.parse.urlparse(uri)
+    return (parsed_uri.scheme, parsed_uri.netloc, parsed_uri.query) if parsed_uri.scheme in REGISTRY_SCHEMES else None
@@ -0,0 +1,176 @@
+"""hubdata local read-through cache of model output files, stored as uncompressed Arrow IPC ("fragments")."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import structlog
+from pyarrow import fs
+
+from hubdata.profiling import timed
+
+logger = structlog.get_logger()
+
+DEFAULT_CACHE_MAX_BYTES = 10 * 1024 ** 3  # 10 GiB
+FRAGMENTS_DIR_NAME = 'fragments'  # under the cache dir, next to the listing manifests and schemas
+
+
+class FragmentCache:
+    """
+    A size-capped local cache of model output files, each converted to the hub's schema and stored as an uncompressed
+    Arrow IPC file that can be memory-mapped without copying or parsing. Entries are keyed by the source file's URI,
+    size, and mtime (pyarrow does not expose ETags), plus the hub schema and CSV null handling, so a modified file or
+    a changed schema is simply a miss. Least recently used entries are evicted once the cache exceeds `max_bytes`. Safe
+    to share between threads and processes: entries are written atomically.
+
+    Instance variables:
+    - cache_dir: the local directory passed to the constructor
+    - fragments_dir: the Path of the directory holding the cached IPC files
+    - max_bytes: the size cap passed to the constructor
+    """
+
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        :param cache_dir: local directory in which to store fragments (under FRAGMENTS_DIR_NAME). created if necessary
+        :param max_bytes: the total size above which `prune()` evicts least recently used fragments
+        """
+        self.cache_dir = cache_dir
+        self.fragments_dir = Path(cache_dir) / FRAGMENTS_DIR_NAME
+        self.max_bytes = max_bytes
+        self._prune_lock = threading.Lock()
+
+
+    def fetch(self, filesystem: fs.FileSystem, file_info: fs.FileInfo, format_obj: ds.FileFormat,
+              schema: pa.Schema) -> str:
+        """
+        Returns the local path of `file_info`'s cached fragment, reading the source file and caching it on a miss.
+        The fragment has `schema`'s fields that are physically present in the source file (i.e., not partition columns
+        like `model_id`), in `schema` order and cast to `schema`'s types.
+
+        :param filesystem: the source file's fs.FileSystem
+        :param file_info: the source file's fs.FileInfo, e.g., from a listing. its size and mtime are part of the key,
+            so a file whose listing is current is a miss if it was modified. NB: the file is not stat'ed, which would be
+            a round trip per file on S3 and GCS
+        :param format_obj: the ds.FileFormat to read the source file with
+        :param schema: the hub schema to cast to
+        :return: the fragment's local path
+        """
+        fragment_path = self.fragments_dir / f'{_fragment_key(filesystem, file_info, format_obj, schema)}.arrow'
+        try:
+            os.utime(fragment_path)  # hit: mark as recently used
+            return str(fragment_path)
+        except FileNotFoundError:
+            pass
+
+        with timed('fetch_fragment', path=file_info.path, num_bytes=file_info.size) as event_fields:
+            source_fragment = format_obj.make_fragment(file_info.path, filesystem=filesystem)
+            physical_names = source_fragment.physical_schema.names
+            fragment_schema = pa.schema([field for field in schema if field.name in physical_names])
+            if isinstance(format_obj, ds.CsvFileFormat):  # NB: CSV is parsed directly into the schema's types
+                table, cast_duration = source_fragment.to_table(schema=fragment_schema), 0.0
+            else:
+                table = source_fragment.to_table(columns=fragment_schema.names)
+                cast_start_time = time.perf_counter()
+                table = table.cast(fragment_schema)
+                cast_duration = time.perf_counter() - cast_start_time
+            event_fields.update(cast_duration=cast_duration, num_rows=table.num_rows)
+        self.fragments_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = fragment_path.with_name(f'{fragment_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, fragment_path)
+        return str(fragment_path)
+
+
+    def stats(self) -> dict:
+        """
+        :return: a dict with these keys: 'cache_dir', 'num_fragments', 'num_bytes', and 'max_bytes'
+        """
+        fragment_infos = self._fragment_infos()
+        return {'cache_dir': str(self.cache_dir), 'num_fragments': len(fragment_infos),
+                'num_bytes': sum(size for _, size, _ in fragment_infos), 'max_bytes': self.max_bytes}
+
+
+    def prune(self, max_bytes: int | None = None, keep: set[str] | None = None) -> int:
+        """
+        Evicts least recently used fragments until the cache's total size is at most `max_bytes`.
+
+        :param max_bytes: the size to prune to. defaults to self.max_bytes
+        :param keep: optional set of fragment paths not to evict, e.g., those of a dataset that is about to be scanned.
+            the cache can exceed `max_bytes` if they alone do
+        :return: the number of fragments evicted
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        keep = keep or set()
+        with self._prune_lock:
+            fragment_infos = sorted(self._fragment_infos(), key=lambda fragment_info: fragment_info[2])  # oldest first
+            num_bytes = sum(size for _, size, _ in fragment_infos)
+            num_evicted = 0
+            for path, size, _ in fragment_infos:
+                if num_bytes <= max_bytes:
+                    break
+                elif path in keep:
+                    continue
+
+                try:
+                    os.remove(path)
+                except FileNotFoundError:  # evicted by another process
+                    pass
+                num_bytes -= size
+                num_evicted += 1
+        if num_evicted:
+            logger.info(f'evicted {num_evicted} cached fragments: {str(self.fragments_dir)!r}')
+        return num_evicted
+
+
+    def clear(self) -> int:
+        """
+        Deletes all fragments.
+
+        :return: the number of fragments deleted
+        """
+        return self.prune(max_bytes=0)
+
+
+    def _fragment_infos(self) -> list[tuple[str, int, int]]:
+        """
+        :return: a list of 3-tuples, one per cached fragment: (path, size, mtime_ns). mtime is the last use time
+        """
+        try:
+            dir_entries = list(os.scandir(self.fragments_dir))
+        except FileNotFoundError:
+            return []
+
+        fragment_infos = []
+        for dir_entry in dir_entries:
+            if not dir_entry.name.endswith('.arrow'):
+                continue
+
+            try:
+                stat_result = dir_entry.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            fragment_infos.append((dir_entry.path, stat_result.st_size, stat_result.st_mtime_ns))
+        return fragment_infos
+
+
+def _fragment_key(filesystem: fs.FileSystem, file_info: fs.FileInfo, format_obj: ds.FileFormat,
+                  schema: pa.Schema) -> str:
+    """
+    :return: a str that identifies the fragment for `file_info` as read with `format_obj` and `schema`: a sha256 hash
+        of them. only CSV formats' null handling options affect the key because the other options do not change the
+        data, e.g., block sizes
+    """
+    key_obj = [f'{filesystem.type_name}://{file_info.path}', file_info.size, file_info.mtime_ns,
+               [[field.name, str(field.type)] for field in schema]]
+    if isinstance(format_obj, ds.CsvFileFormat):
+        convert_options = format_obj.default_fragment_scan_options.convert_options
+        key_obj.append([convert_options.null_values, convert_options.strings_can_be_null,
+                        convert_options.quoted_strings_can_be_null])
+    return hashlib.sha256(json.dumps(key_obj).encode()).hexdigest()
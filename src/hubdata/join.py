@@ -0,0 +1,131 @@
+"""hubdata oracle joins: model output joined with oracle-output target data, via streamed Acero hash joins."""
+
+import datetime
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from hubdata.connect_hub import HubConnection, _round_ids
+from hubdata.connect_target_data import TargetDataConnection
+from hubdata.create_target_data_schema import TargetType, _has_output_type_ids, _observable_unit, _target_data_json
+from hubdata.profiling import timed
+from hubdata.sql import _encode_dictionaries, _scan_declarations
+
+# the name of the join key column that both sides get when oracle output has output type IDs. see `join_oracle()`
+ORACLE_OUTPUT_TYPE_ID_KEY = '__oracle_output_type_id'
+
+
+def join_oracle(hub_conn: HubConnection, td_conn: TargetDataConnection, filter: ds.Expression | None = None,
+                as_of: datetime.date | str | None = None) -> Iterator[pa.Table]:
+    """
+    Joins `hub_conn`'s model output with `td_conn`'s oracle-output target data, adding each model output row's
+    `oracle_value`, e.g., for scoring. Rows are matched on the oracle's `observable_unit` columns (from
+    `hub-config/target-data.json`), and, if it `has_output_type_ids`, on `output_type` and `output_type_id`. Following
+    hubverse conventions, output types whose oracle rows have no `output_type_id` (e.g., mean, median, quantile, and
+    sample, for which there is one observed value) match any model output `output_type_id`, while the others (e.g., pmf
+    and cdf) must match it exactly.
+
+    The join is an Acero hash join whose build side is the oracle-output table (read once and held in memory, which is
+    small compared to model output) and whose probe side streams model output. It is run once per round (as determined
+    by model output file names or partitions - see `HubConnection._partition_expression()`) so that only one round's
+    joined rows are in memory at a time. Hubs without a single round ID column are joined in one pass. Records a
+    'join_oracle' event per round if profiling.
+
+    :param hub_conn: the hub's HubConnection
+    :param td_conn: a TargetDataConnection for oracle-output target data, e.g., `connect_target_data(hub_conn,
+        TargetType.ORACLE_OUTPUT)`
+    :param filter: optional `ds.Expression` used to filter model output rows, e.g., `pc.field('output_type') ==
+        'quantile'`. it's pushed down so that files and row groups that cannot match are skipped
+    :param as_of: for versioned oracle output, the date of the oracle-output snapshot to join as passed to
+        `TargetDataConnection.as_of()`. None (the default) uses the newest version of each observation
+    :return: an iterator of pa.Tables, one per round having matching rows, with the model output columns (in
+        `hub_conn.schema` order, and in no particular row order) plus `oracle_value`. model output rows with no oracle
+        value are excluded
+    :raise: ValueError if `td_conn` is not for oracle-output target data, if the hub has no `target-data.json`, or if
+        the model output lacks an `observable_unit` column
+    """
+    if td_conn.target_type != TargetType.ORACLE_OUTPUT:
+        raise ValueError(f'td_conn must be for oracle-output target data, not {td_conn.target_type}')
+
+    target_data = _target_data_json(td_conn.hub_conn)
+    if target_data is None:
+        raise ValueError('cannot determine join keys: the hub has no hub-config/target-data.json')
+
+    key_columns = list(_observable_unit(target_data, 'oracle-output'))
+    missing_columns = [col_name for col_name in key_columns if col_name not in hub_conn.schema.names]
+    if missing_columns:
+        raise ValueError(f'model output has no observable_unit column(s): {missing_columns}')
+
+    oracle_table = _oracle_table(td_conn, as_of)
+    key_expressions = {}  # model output's computed key columns
+    if _has_output_type_ids(target_data):
+        key_columns.append('output_type')
+        key_columns.append(ORACLE_OUTPUT_TYPE_ID_KEY)
+        oracle_type_ids = oracle_table['output_type_id'].cast(pa.string())
+        oracle_type_ids = pc.if_else(pc.equal(oracle_type_ids, ''), None, oracle_type_ids)  # NB: CSV reads NA as ''
+        id_output_types = pc.unique(oracle_table['output_type'].filter(pc.is_valid(oracle_type_ids)))
+        oracle_table = oracle_table.append_column(ORACLE_OUTPUT_TYPE_ID_KEY, pc.coalesce(oracle_type_ids, ''))
+        key_expressions[ORACLE_OUTPUT_TYPE_ID_KEY] = pc.coalesce(
+            pc.if_else(pc.field('output_type').isin(id_output_types), pc.field('output_type_id').cast(pa.string()),
+                       pa.scalar(None, pa.string())),
+            '')
+    oracle_table = oracle_table.select(key_columns + ['oracle_value'])
+
+    return _iter_round_joins(hub_conn, oracle_table, key_columns, key_expressions, filter)
+
+
+def _iter_round_joins(hub_conn: HubConnection, oracle_table: pa.Table, key_columns: list[str],
+                      key_expressions: dict[str, ds.Expression], filter: ds.Expression | None) -> Iterator[pa.Table]:
+    """
+    `join_oracle()` helper that yields its per-round joins. NB: a separate generator so that `join_oracle()` validates
+    its args when called rather than when first iterated
+    """
+    dataset = hub_conn.get_dataset()
+    round_col_name = hub_conn._round_id_col_name
+    for round_id in _round_ids(dataset, round_col_name):
+        round_filter = None if round_id is None else ds.field(round_col_name) == round_id
+        if filter is not None:
+            round_filter = filter if round_filter is None else round_filter & filter
+        with timed('join_oracle', round_id=round_id) as event_fields:
+            table = _join_round(dataset, oracle_table, key_columns, key_expressions, round_filter)
+            event_fields['num_rows'] = table.num_rows
+        if table.num_rows:
+            yield table
+
+
+def _oracle_table(td_conn: TargetDataConnection, as_of: datetime.date | str | None) -> pa.Table:
+    """
+    `join_oracle()` helper that reads `td_conn`'s oracle output, decoding any dictionary columns so that they can be
+    join keys.
+
+    :return: a pa.Table. for versioned oracle output it's the `as_of` snapshot
+    :raise: ValueError if `as_of` is passed but the oracle output is not versioned
+    """
+    is_versioned = (td_conn.schema is not None) and ('as_of' in td_conn.schema.names)
+    oracle_table = td_conn.as_of(as_of) if is_versioned or (as_of is not None) else td_conn.to_table()
+    return oracle_table.cast(pa.schema([field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type)
+                                        else field for field in oracle_table.schema]))
+
+
+def _join_round(dataset: ds.Dataset, oracle_table: pa.Table, key_columns: list[str],
+                key_expressions: dict[str, ds.Expression], filter: ds.Expression | None) -> pa.Table:
+    """
+    `join_oracle()` helper that runs one Acero plan: scan `dataset` -> filter -> decode dictionaries -> add
+    `key_expressions` columns -> hash join with `oracle_table` (the build side).
+
+    :return: the joined pa.Table with `dataset`'s columns, re-encoded, plus `oracle_value`
+    """
+    declarations, dict_fields = _scan_declarations(dataset, dataset.schema.names, filter)
+    if key_expressions:
+        declarations.append(acero.Declaration('project', acero.ProjectNodeOptions(
+            [ds.field(col_name) for col_name in dataset.schema.names] + list(key_expressions.values()),
+            dataset.schema.names + list(key_expressions.keys()))))
+    join_declaration = acero.Declaration('hashjoin', acero.HashJoinNodeOptions(
+        'inner', left_keys=key_columns, right_keys=key_columns, left_output=dataset.schema.names,
+        right_output=['oracle_value']),
+        inputs=[acero.Declaration.from_sequence(declarations),
+                acero.Declaration('table_source', acero.TableSourceNodeOptions(oracle_table))])
+    return _encode_dictionaries(join_declaration.to_table(use_threads=True), dict_fields).unify_dictionaries()
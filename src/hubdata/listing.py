@@ -0,0 +1,51 @@
+"""hubdata file listing helpers."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pyarrow import fs
+
+
+def list_files(filesystem: fs.FileSystem, dir_path: str, concurrency: int | None = None) -> list[fs.FileInfo]:
+    """
+    Recursively lists all files (not directories) under `dir_path`.
+
+    :param filesystem: the fs.FileSystem to list
+    :param dir_path: the directory to list
+    :param concurrency: None or 1 to issue one recursive listing. otherwise we first list `dir_path`'s immediate
+        children, and then recursively list each child directory concurrently using up to `concurrency` threads. the
+        latter helps on object stores like S3 and GCS, where a single recursive listing is paginated and serial
+    :return: a list of fs.FileInfo. the same files are returned regardless of `concurrency`
+    :raise: FileNotFoundError if `dir_path` does not exist
+    """
+    if (concurrency is None) or (concurrency <= 1):
+        return [file_info for file_info in filesystem.get_file_info(fs.FileSelector(dir_path, recursive=True))
+                if file_info.type == fs.FileType.File]
+
+    top_file_infos = filesystem.get_file_info(fs.FileSelector(dir_path, recursive=False))
+    dir_paths = [file_info.path for file_info in top_file_infos if file_info.type == fs.FileType.Directory]
+    return [file_info for file_info in top_file_infos if file_info.type == fs.FileType.File] \
+        + [file_info for dir_files in list_dirs_files(filesystem, dir_paths, concurrency) for file_info in dir_files]
+
+
+def list_dirs_files(filesystem: fs.FileSystem, dir_paths: list[str],
+                    concurrency: int | None = None) -> list[list[fs.FileInfo]]:
+    """
+    Recursively lists all files (not directories) under each of `dir_paths`.
+
+    :param filesystem: the fs.FileSystem to list
+    :param dir_paths: the directories to list
+    :param concurrency: maximum number of directories to list at once. None or 1 lists them one at a time
+    :return: a list with one list of fs.FileInfo per `dir_paths` item, in the same order
+    """
+
+
+    def list_dir_files(dir_path):
+        return [file_info for file_info in filesystem.get_file_info(fs.FileSelector(dir_path, recursive=True))
+                if file_info.type == fs.FileType.File]
+
+
+    if (concurrency is None) or (concurrency <= 1) or (len(dir_paths) <= 1):
+        return [list_dir_files(dir_path) for dir_path in dir_paths]
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(dir_paths))) as executor:
+        return list(executor.map(list_dir_files, dir_paths))
@@ -0,0 +1,127 @@
+"""hubdata on-disk cache of model output file listings ("manifests")."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import structlog
+from pyarrow import fs
+
+from hubdata.listing import list_dirs_files
+
+logger = structlog.get_logger()
+
+MANIFEST_VERSION = 3  # bump when the manifest json layout changes. mismatched manifests are ignored and rebuilt
+
+DEFAULT_LISTING_TTL = 300  # seconds
+
+
+def list_files_with_manifest(filesystem: fs.FileSystem, model_output_dir: str, cache_dir: str | Path,
+                             hub_key: str, concurrency: int | None = None,
+                             ttl: float = DEFAULT_LISTING_TTL) -> list[fs.FileInfo]:
+    """
+    Returns the same list of files as `HubConnection._list_model_out_files()`, but uses (and then updates) a manifest
+    stored under `cache_dir` to avoid re-walking model directories that were listed recently. Refreshing is
+    incremental: we always do one non-recursive listing of `model_output_dir`, which finds new model directories (which
+    are walked) and removed ones (which are dropped from the manifest). A model directory that is in the manifest is
+    only re-walked if it was last walked more than `ttl` seconds ago, or if its mtime changed, i.e., entries were added,
+    removed, or renamed directly inside it. NB: the latter check only helps on local file systems, because object
+    stores like S3 and GCS do not report directory mtimes.
+
+    Thus for up to `ttl` seconds, files that were modified in place or added to a model directory on an object store
+    are not seen, and the returned sizes and mtimes (which the fragment cache and stats index use) might be stale.
+
+    :param filesystem: the hub's fs.FileSystem
+    :param model_output_dir: the hub's model output directory path in `filesystem`
+    :param cache_dir: local directory where manifests are stored. created if necessary
+    :param hub_key: str that uniquely identifies the hub, e.g., its URI. used to name the manifest file
+    :param concurrency: maximum number of model directories to re-walk at once - see `list_dirs_files()`
+    :param ttl: the number of seconds for which a model directory's listing is reused. 0 re-walks every directory
+    :return: a list of fs.FileInfo, one for each file (not directory) under `model_output_dir`
+    """
+    manifest_path = _manifest_path(cache_dir, hub_key)
+    manifest = _read_manifest(manifest_path, hub_key)
+    old_dirs: dict[str, dict] = manifest['dirs'] if manifest else {}
+
+    top_file_infos = filesystem.get_file_info(fs.FileSelector(model_output_dir, recursive=False,
+                                                              allow_not_found=True))
+    now = time.time()
+    new_dirs: dict[str, dict] = {}
+    root_files: list[fs.FileInfo] = []
+    stale_dir_infos: list[fs.FileInfo] = []
+    for top_file_info in top_file_infos:
+        if top_file_info.type == fs.FileType.File:
+            root_files.append(top_file_info)
+            continue
+        elif top_file_info.type != fs.FileType.Directory:
+            continue
+
+        old_dir = old_dirs.get(top_file_info.base_name)
+        if (old_dir is not None) and (now - old_dir['listed_at'] < ttl) \
+                and (old_dir['mtime_ns'] == top_file_info.mtime_ns):
+            new_dirs[top_file_info.base_name] = old_dir
+        else:
+            stale_dir_infos.append(top_file_info)
+
+    stale_dirs_files = list_dirs_files(filesystem, [dir_info.path for dir_info in stale_dir_infos], concurrency)
+    for dir_info, dir_files in zip(stale_dir_infos, stale_dirs_files):
+        new_dirs[dir_info.base_name] = {'mtime_ns': dir_info.mtime_ns, 'listed_at': now,
+                                        'files': [_file_info_to_json(file_info) for file_info in dir_files]}
+
+    if new_dirs != old_dirs:
+        _write_manifest(manifest_path, {'version': MANIFEST_VERSION, 'hub': hub_key, 'dirs': new_dirs})
+
+    return root_files + [_file_info_from_json(file_json)
+                         for dir_name in sorted(new_dirs)
+                         for file_json in new_dirs[dir_name]['files']]
+
+
+def _manifest_path(cache_dir: str | Path, hub_key: str) -> Path:
+    """
+    :return: the Path of the manifest file for `hub_key` under `cache_dir`. the file is named using a hash of `hub_key`
+        so that any URI can be used safely
+    """
+    return Path(cache_dir) / 'manifests' / f'{hashlib.sha256(hub_key.encode()).hexdigest()}.json'
+
+
+def _read_manifest(manifest_path: Path, hub_key: str) -> dict | None:
+    """
+    :return: the manifest at `manifest_path` as a dict, or None if it does not exist, cannot be read, or is for a
+        different manifest version or hub
+    """
+    try:
+        with open(manifest_path) as manifest_fp:
+            manifest = json.load(manifest_fp)
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.warn(f'ignoring unreadable manifest: {manifest_path!r}: {ex!r}')
+        return None
+
+    if (manifest.get('version') != MANIFEST_VERSION) or (manifest.get('hub') != hub_key):
+        return None
+
+    return manifest
+
+
+def _write_manifest(manifest_path: Path, manifest: dict):
+    """
+    Writes `manifest` to `manifest_path` atomically so that concurrent readers never see a partial file.
+    """
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(f'{manifest_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_path, 'w') as manifest_fp:
+        json.dump(manifest, manifest_fp)
+    os.replace(tmp_path, manifest_path)
+
+
+def _file_info_to_json(file_info: fs.FileInfo) -> list:
+    return [file_info.path, file_info.size, file_info.mtime_ns]
+
+
+def _file_info_from_json(file_json: list) -> fs.FileInfo:
+    path, size, mtime_ns = file_json
+    return fs.FileInfo(path, type=fs.FileType.File, size=size, mtime_ns=mtime_ns)
@@ -0,0 +1,93 @@
+"""hubdata process-pool scanning: reads a dataset's files in worker processes, returning results via Arrow IPC files."""
+
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from hubdata.profiling import timed
+
+PARALLEL_CHOICES = ('processes',)  # valid `parallel` args to `HubConnection.to_table()`. None means serial
+
+SHARDS_PER_WORKER = 4  # shards are smaller than one per worker so that workers that finish early can take another
+
+
+def scan_to_table_processes(dataset: ds.Dataset, workers: int | None, *args, **kwargs) -> pa.Table:
+    """
+    Returns the same table as `dataset.to_table(*args, **kwargs)` (with unified dictionaries, like `scan_to_table()`)
+    but reads `dataset`'s files in a pool of `workers` processes. The files are split in order into contiguous shards,
+    each of which a worker scans (applying the passed args, e.g., `columns` and `filter`) and writes to a temporary
+    Arrow IPC file that we memory-map, so that results are never pickled. Concatenating the shards in order gives the
+    serial result's rows in the serial order. Records a 'scan_processes' event if profiling.
+
+    :param dataset: a ds.FileSystemDataset, or a ds.UnionDataset of them as returned by `HubConnection.get_dataset()`
+    :param workers: the number of worker processes. None means `os.cpu_count()`
+    :param args: passed to `ds.Dataset.to_table()`. must be picklable, which `ds.Expression`s are
+    :param kwargs: ""
+    :return: a pa.Table
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = _dataset_shards(dataset, workers * SHARDS_PER_WORKER)
+    if len(shards) <= 1:
+        return dataset.to_table(*args, **kwargs).unify_dictionaries()
+
+    with timed('scan_processes', workers=workers, num_shards=len(shards)) as event_fields, \
+            tempfile.TemporaryDirectory(prefix='hubdata-', ignore_cleanup_errors=True) as tmp_dir:
+        # NB: 'spawn' because forking a process whose pyarrow thread pools are running is unsafe
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            ipc_paths = list(executor.map(_scan_shard_to_ipc, shards,
+                                          [str(Path(tmp_dir) / f'{shard_idx}.arrow')
+                                           for shard_idx in range(len(shards))],
+                                          [args] * len(shards), [kwargs] * len(shards)))
+        table = pa.concat_tables([pa.ipc.open_file(pa.memory_map(ipc_path)).read_all() for ipc_path in ipc_paths]) \
+            .unify_dictionaries()
+        event_fields['num_rows'] = table.num_rows
+    return table
+
+
+def _dataset_shards(dataset: ds.Dataset, max_shards: int) -> list[ds.FileSystemDataset]:
+    """
+    :return: a list of ds.FileSystemDatasets that together have `dataset`'s files in order, split into contiguous
+        shards of about equal numbers of files, and at most about `max_shards` of them. each shard has one format
+    """
+    children = dataset.children if isinstance(dataset, ds.UnionDataset) else [dataset]
+    child_fragments = [list(child.get_fragments()) for child in children]
+    num_fragments = sum(len(fragments) for fragments in child_fragments)
+    if not num_fragments:
+        return []
+
+    shard_size = math.ceil(num_fragments / max_shards)
+    return [ds.FileSystemDataset(fragments[start_idx:start_idx + shard_size], dataset.schema, child.format,
+                                 child.filesystem)
+            for child, fragments in zip(children, child_fragments)
+            for start_idx in range(0, len(fragments), shard_size)]
+
+
+def _init_worker():
+    pa.set_cpu_count(1)  # NB: the pool provides the parallelism, so avoid oversubscribing cores with pyarrow threads
+
+
+def _scan_shard_to_ipc(shard: ds.FileSystemDataset, ipc_path: str, args: tuple, kwargs: dict) -> str:
+    """
+    Worker function that scans `shard` and writes the result to `ipc_path` in Arrow IPC file format.
+
+    :return: `ipc_path`
+    """
+    table = shard.to_table(*args, **kwargs).unify_dictionaries()  # NB: IPC files allow one dictionary per column
+    with pa.OSFile(ipc_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        if not table.num_columns:
+            writer.write_table(table)
+            return ipc_path
+
+        # NB: we write every batch, including empty ones, rather than via `write_table()`, which skips them. the serial
+        # path keeps them, and their dictionaries (e.g., of filtered-out model_ids) are part of its result
+        for chunk_idx in range(table.column(0).num_chunks):
+            writer.write_batch(pa.RecordBatch.from_arrays([column.chunk(chunk_idx) for column in table.columns],
+                                                          schema=table.schema))
+    return ipc_path
@@ -0,0 +1,258 @@
+"""hubdata opt-in instrumentation: structured timing events for listing and scanning, and the `profile()` context."""
+
+import contextlib
+import threading
+import time
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import structlog
+from pyarrow import fs
+
+logger = structlog.get_logger()
+
+_active_summaries: list['ProfileSummary'] = []  # those of currently-open `profile()` blocks
+_active_summaries_lock = threading.Lock()
+
+
+class ProfileSummary:
+    """
+    Collects the instrumentation events recorded while a `profile()` block is open. Each event is also logged via
+    structlog as it is recorded. Events are:
+    - 'create_hub_schema': creating a hub schema that was not memoized (see `create_hub_schema()`). fields: `duration`
+    - 'list_files': listing the model output directory. fields: `duration`, `num_files`
+    - 'group_files': splitting the listed files by format. fields: `files_per_format` (a dict mapping format to count)
+    - 'fetch_fragment': reading one file into the fragment cache (see `FragmentCache`). fields: `path`, `duration`,
+      `cast_duration`, `num_bytes`, `num_rows`. `cast_duration` is the part of `duration` spent casting to the hub
+      schema
+    - 'scan_fragment': scanning one file. fields: `path`, `duration`, `num_bytes`, `num_rows`, `num_batches`,
+      `cast_columns`. `duration` is the time spent waiting for the file's batches, which includes reading, parsing,
+      filtering, and casting to the dataset schema, all of which pyarrow does together. `num_bytes` is the file's size
+      as listed (see `record_file_sizes()`), or 0 if it's unknown, e.g., for remote files that pyarrow discovered.
+      `cast_columns` lists the columns whose file types differ from the dataset's, i.e., those that were cast
+    - 'scan': a whole scan. fields: `duration`, `num_fragments`, `num_bytes`, `num_rows`, `num_batches`
+    - 'scan_processes': a whole `HubConnection.to_table(parallel='processes')` scan. fields: `duration`, `workers`,
+      `num_shards`, `num_rows`. the workers' per-file events are not recorded
+    - 'join_oracle': joining one round of model output with oracle output (see `join_oracle()`). fields: `duration`,
+      `round_id`, `num_rows`
+    - 'ensemble': building one round of an ensemble (see `build_ensemble()`). fields: `duration`, `agg`, `round_id`,
+      `num_rows`
+    - 'compact_samples': collecting one round's samples into lists (see `compact_samples()`). fields: `duration`,
+      `round_id`, `num_rows`
+
+    Durations are in seconds.
+
+    Instance variables:
+    - events: a list of dicts, one per event, in the order they were recorded. each has an 'event' key with the event's
+      name plus the event's fields
+    """
+
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self._file_sizes: dict[str, int] = {}  # set by `record_file_sizes()`
+        self._lock = threading.Lock()
+
+
+    def add(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+
+
+    def totals(self) -> dict:
+        """
+        :return: a dict that sums my events: 'durations' (a dict mapping event name to total duration), 'counts' (a
+            dict mapping event name to number of events), 'files_per_format', 'num_bytes', 'num_rows', 'num_batches',
+            and 'cast_duration'. the last four sum 'scan_fragment' and 'fetch_fragment' events
+        """
+        totals = {'durations': {}, 'counts': {}, 'files_per_format': {}, 'num_bytes': 0, 'num_rows': 0,
+                  'num_batches': 0, 'cast_duration': 0.0}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            event_name = event['event']
+            totals['counts'][event_name] = totals['counts'].get(event_name, 0) + 1
+            if 'duration' in event:
+                totals['durations'][event_name] = totals['durations'].get(event_name, 0.0) + event['duration']
+            if event_name == 'group_files':
+                for file_format, num_files in event['files_per_format'].items():
+                    totals['files_per_format'][file_format] = \
+                        totals['files_per_format'].get(file_format, 0) + num_files
+            elif event_name in ['scan_fragment', 'fetch_fragment']:
+                for key in ['num_bytes', 'num_rows', 'num_batches', 'cast_duration']:
+                    totals[key] += event.get(key, 0)
+        return totals
+
+
+@contextlib.contextmanager
+def profile() -> Iterator[ProfileSummary]:
+    """
+    A context manager that turns on instrumentation for its block and yields a `ProfileSummary` that collects the
+    block's events, e.g.,
+
+        with hubdata.profile() as profile_summary:
+            hub_connection.to_table(filter=pc.field('location') == 'US')
+        print(profile_summary.totals())
+
+    Instrumentation is off (and costs nothing) outside of `profile()` blocks. Blocks can be nested and used from
+    multiple threads, in which case each open block receives every event. Note that per-fragment scan events are only
+    recorded by `HubConnection.to_table()` and `iter_batches()` (and their `TargetDataConnection` equivalents), and that
+    their batches must be consumed inside the block.
+
+    :return: a ProfileSummary
+    """
+    profile_summary = ProfileSummary()
+    with _active_summaries_lock:
+        _active_summaries.append(profile_summary)
+    try:
+        yield profile_summary
+    finally:
+        with _active_summaries_lock:
+            _active_summaries.remove(profile_summary)
+
+
+def is_profiling() -> bool:
+    """
+    :return: True if any `profile()` block is open
+    """
+    return bool(_active_summaries)
+
+
+def record(event_name: str, **fields):
+    """
+    Records an event in every open `profile()` block and logs it. Does nothing if no block is open.
+
+    :param event_name: the event's name, e.g., 'list_files'
+    :param fields: the event's fields
+    """
+    with _active_summaries_lock:
+        summaries = list(_active_summaries)
+    if not summaries:
+        return
+
+    event = {'event': event_name, **fields}
+    for profile_summary in summaries:
+        profile_summary.add(event)
+    logger.info(event_name, **{key: round(value, 6) if isinstance(value, float) else value
+                               for key, value in fields.items()})
+
+
+def record_file_sizes(file_infos: Iterable[fs.FileInfo]):
+    """
+    Remembers the sizes of listed files in every open `profile()` block so that 'scan_fragment' events can report them
+    without stat'ing each file again, which would add a round trip per file on object stores. Does nothing if no block
+    is open.
+
+    :param file_infos: listed files, e.g., as returned by `HubConnection._list_model_out_files()`
+    """
+    with _active_summaries_lock:
+        summaries = list(_active_summaries)
+    if not summaries:
+        return
+
+    file_sizes = {file_info.path: file_info.size for file_info in file_infos if file_info.size is not None}
+    for profile_summary in summaries:
+        with profile_summary._lock:
+            profile_summary._file_sizes.update(file_sizes)
+
+
+@contextlib.contextmanager
+def timed(event_name: str, **fields) -> Iterator[dict]:
+    """
+    A context manager that records an `event_name` event with a `duration` field that times its block. Yields a dict
+    to which the block can add fields, e.g., counts that are known only at its end. Does nothing if not profiling.
+    """
+    start_time = time.perf_counter()
+    yield fields
+    if is_profiling():
+        record(event_name, duration=time.perf_counter() - start_time, **fields)
+
+
+def scan_to_table(dataset: ds.Dataset, *args, **kwargs) -> pa.Table:
+    """
+    Returns `dataset.to_table(*args, **kwargs)`, recording 'scan_fragment' and 'scan' events if profiling. Dictionary
+    (categorical) columns are unified so that every chunk shares one dictionary, which compute functions such as
+    `Table.group_by()` require.
+    """
+    if not is_profiling():
+        return dataset.to_table(*args, **kwargs).unify_dictionaries()
+
+    scanner = dataset.scanner(*args, **kwargs)
+    return pa.Table.from_batches(list(profile_batches(scanner, dataset.schema)), schema=scanner.projected_schema) \
+        .unify_dictionaries()
+
+
+def profile_batches(scanner: ds.Scanner, dataset_schema: pa.Schema) -> Iterator[pa.RecordBatch]:
+    """
+    Yields `scanner`'s record batches, recording a 'scan_fragment' event for each file scanned and a 'scan' event at
+    the end. NB: `Scanner.scan_batches()` yields each fragment's batches in turn, so we attribute the time spent
+    waiting for a batch to the batch's fragment
+
+    :param scanner: the ds.Scanner to consume
+    :param dataset_schema: the scanned dataset's schema, which is compared to each file's to find `cast_columns`
+    """
+    scan_start_time = time.perf_counter()
+    scan_totals = {'num_fragments': 0, 'num_bytes': 0, 'num_rows': 0, 'num_batches': 0}
+    fragment, fragment_fields = None, None
+
+
+    def record_fragment():
+        record('scan_fragment', **fragment_fields)
+        scan_totals['num_fragments'] += 1
+        for key in ['num_bytes', 'num_rows', 'num_batches']:
+            scan_totals[key] += fragment_fields[key]
+
+
+    batch_start_time = time.perf_counter()
+    for tagged_batch in scanner.scan_batches():
+        duration = time.perf_counter() - batch_start_time
+        if (fragment is None) or (tagged_batch.fragment.path != fragment.path):
+            if fragment is not None:
+                record_fragment()
+            fragment = tagged_batch.fragment
+            fragment_fields = {'path': fragment.path, 'duration': 0.0, 'num_bytes': _fragment_num_bytes(fragment),
+                               'num_rows': 0, 'num_batches': 0,
+                               'cast_columns': _cast_columns(fragment, dataset_schema)}
+        fragment_fields['duration'] += duration
+        fragment_fields['num_rows'] += tagged_batch.record_batch.num_rows
+        fragment_fields['num_batches'] += 1
+        yield tagged_batch.record_batch
+        batch_start_time = time.perf_counter()  # NB: excludes the time the caller spent on the batch
+    if fragment is not None:
+        record_fragment()
+    record('scan', duration=time.perf_counter() - scan_start_time, **scan_totals)
+
+
+def _fragment_num_bytes(fragment: ds.Fragment) -> int:
+    """
+    :return: the size of `fragment`'s file as recorded by `record_file_sizes()`. local files that were not recorded
+        (e.g., cached fragments) are stat'ed, which costs no round trip. otherwise 0, e.g., if it's not a file fragment
+    """
+    if not isinstance(fragment, ds.FileFragment):
+        return 0
+
+    with _active_summaries_lock:
+        summaries = list(_active_summaries)
+    for profile_summary in summaries:
+        with profile_summary._lock:
+            num_bytes = profile_summary._file_sizes.get(fragment.path)
+        if num_bytes is not None:
+            return num_bytes
+
+    if isinstance(fragment.filesystem, fs.LocalFileSystem):
+        return fragment.filesystem.get_file_info(fragment.path).size or 0
+
+    return 0
+
+
+def _cast_columns(fragment: ds.Fragment, dataset_schema: pa.Schema) -> list[str]:
+    """
+    :return: the names of `fragment`'s columns whose types differ from `dataset_schema`'s. NB: CSV files are parsed
+        directly into the dataset's types, so none of their columns are cast
+    """
+    if isinstance(fragment.format, ds.CsvFileFormat):
+        return []
+
+    return [field.name for field in fragment.physical_schema
+            if (field.name in dataset_schema.names) and (field.type != dataset_schema.field(field.name).type)]
@@ -0,0 +1,75 @@
+"""hubdata helpers for building typed filter expressions from keyword arguments - see `HubConnection.query()`."""
+
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+
+def query_expression(schema: pa.Schema, filters: dict[str, Any]) -> ds.Expression | None:
+    """
+    Compiles `filters` into a single `ds.Expression` that ANDs one condition per column. Values are validated against
+    and converted to `schema`'s column types so that the expression compares like types, which lets pyarrow use
+    partition expressions and statistics to skip files. For example, the str '2022-10-22' is converted to a date32 for a
+    `reference_date` column.
+
+    :param schema: the pa.Schema to validate against, e.g., `HubConnection.schema`
+    :param filters: a dict that maps column names to values. a value can be:
+        - a scalar (e.g., 'quantile' or 1): the column equals the value. None matches nulls
+        - a list, tuple, set, or frozenset: the column is one of the values
+        - a range: the column is one of the range's values. a `step` of one is compiled to `>= start` and `< stop`
+        - a slice (without a `step`): `>= start` and `< stop`, where None means unbounded. works with any ordered type,
+          e.g., dates
+    :return: a ds.Expression, or None if `filters` is empty
+    :raise: ValueError if a column is not in `schema`, or if a value cannot be converted to the column's type
+    """
+    expression = None
+    for col_name, value in filters.items():
+        if col_name not in schema.names:
+            raise ValueError(f'unknown column: {col_name!r}. valid columns: {schema.names}')
+
+        pa_type = schema.field(col_name).type
+        if pa.types.is_dictionary(pa_type):  # NB: categorical columns compare (and `isin()`) against their values
+            pa_type = pa_type.value_type
+        col_expression = _column_expression(col_name, pa_type, value)
+        expression = col_expression if expression is None else expression & col_expression
+    return expression
+
+
+def _column_expression(col_name: str, pa_type: pa.DataType, value: Any) -> ds.Expression:
+    """
+    query_expression() helper that returns the condition for one column. args are as documented there.
+    """
+    field = pc.field(col_name)
+    if isinstance(value, slice) or (isinstance(value, range) and (value.step == 1) and (len(value) > 0)):
+        if isinstance(value, slice) and (value.step is not None):
+            raise ValueError(f'slices cannot have a step: {col_name}={value!r}')
+
+        expression = None
+        for bound, compare in [(value.start, pc.greater_equal), (value.stop, pc.less)]:
+            if bound is not None:
+                bound_expression = compare(field, _coerce_value(col_name, pa_type, bound))
+                expression = bound_expression if expression is None else expression & bound_expression
+        return expression if expression is not None else pc.scalar(True)
+    elif isinstance(value, (list, tuple, set, frozenset, range)):
+        values = sorted(value) if isinstance(value, (set, frozenset)) else list(value)
+        if len(values) == 1:
+            return _column_expression(col_name, pa_type, values[0])
+
+        return field.isin(pa.array([_coerce_value(col_name, pa_type, item) for item in values], type=pa_type))
+    elif value is None:
+        return field.is_null()
+    else:
+        return field == _coerce_value(col_name, pa_type, value)
+
+
+def _coerce_value(col_name: str, pa_type: pa.DataType, value: Any) -> pa.Scalar:
+    """
+    :return: `value` converted to a pa.Scalar of `pa_type`
+    :raise: ValueError if `value` cannot be converted, e.g., 'US' for an int32 column or 1.5 for an int32 one
+    """
+    try:
+        return pa.scalar(value).cast(pa_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as ex:
+        raise ValueError(f'cannot convert {col_name} value {value!r} to {pa_type}: {ex}')
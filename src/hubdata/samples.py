@@ -0,0 +1,155 @@
+"""hubdata compact samples: one row per forecast with its samples in list columns, and the reverse transform."""
+
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from hubdata.connect_hub import HubConnection, _round_ids
+from hubdata.profiling import timed
+from hubdata.sql import _encode_dictionaries, _scan_declarations
+
+# model output columns that vary within a sample forecast. the rest (task IDs and model_id) identify it
+SAMPLE_COLUMNS = ('output_type', 'output_type_id', 'value')
+
+
+def compact_samples(hub_conn: HubConnection, filter: ds.Expression | None = None,
+                    fixed_size: bool = False) -> pa.Table:
+    """
+    Reads `hub_conn`'s 'sample' output type rows into a compact layout that doesn't repeat task ID values for every
+    sample: one row per forecast (model_id and combination of task ID values), with its samples in two list columns:
+    `output_type_id` (the sample IDs, sorted) and `value` (the sampled values in the same order). For hubs whose samples
+    are shared across task IDs (i.e., whose `output_type_id_params` have a `compound_taskid_set`), the rows of forecasts
+    having the same model_id and compound task ID values are adjacent, and because their sample IDs are sorted, item
+    `i` of each of their `value` lists belongs to the same joint sample (e.g., the same trajectory across horizons).
+    `expand_samples()` reverses the transform.
+
+    Model output is streamed one round at a time (as determined by model output file names or partitions) through an
+    Acero plan that reads only sample rows and collects each forecast's samples via a hash 'list' aggregation, so only
+    one round's samples are in memory in the long layout.
+
+    :param hub_conn: the hub's HubConnection
+    :param filter: optional `ds.Expression` used to filter model output rows, e.g., to select models or rounds. it's
+        pushed down so that files and row groups that cannot match are skipped
+    :param fixed_size: True to return fixed-size list columns, which are smaller and faster to process, e.g., via
+        `FixedSizeListArray.flatten()` and reshaping. requires every forecast to have the same number of samples
+    :return: a pa.Table with `hub_conn.schema`'s columns except `output_type`, and with `output_type_id` and `value`
+        as list columns (`value` items are float64). rows are sorted by model_id, compound task IDs, and then the other
+        task IDs
+    :raise: ValueError if `fixed_size` is True and forecasts have different numbers of samples
+    """
+    schema = hub_conn.schema
+    key_columns = [col_name for col_name in schema.names if col_name not in SAMPLE_COLUMNS]
+    id_type = schema.field('output_type_id').type
+    id_type = id_type.value_type if pa.types.is_dictionary(id_type) else id_type
+    compact_schema = pa.schema([field.with_type(pa.list_(id_type)) if field.name == 'output_type_id'
+                                else field.with_type(pa.list_(pa.float64())) if field.name == 'value'
+                                else field for field in schema if field.name != 'output_type'])
+    sample_filter = ds.field('output_type') == 'sample'
+    if filter is not None:
+        sample_filter = sample_filter & filter
+    dataset = hub_conn.get_dataset()
+    round_col_name = hub_conn._round_id_col_name
+    round_tables = []
+    dict_fields = []
+    for round_id in _round_ids(dataset, round_col_name):
+        round_filter = sample_filter if round_id is None else (ds.field(round_col_name) == round_id) & sample_filter
+        with timed('compact_samples', round_id=round_id) as event_fields:
+            declarations, dict_fields = _scan_declarations(dataset, key_columns + ['output_type_id', 'value'],
+                                                           round_filter)
+            declarations.append(acero.Declaration('aggregate', acero.AggregateNodeOptions(
+                [('output_type_id', 'hash_list', None, 'output_type_id'), ('value', 'hash_list', None, 'value')],
+                keys=key_columns)))
+            round_table = acero.Declaration.from_sequence(declarations).to_table(use_threads=True)
+            event_fields['num_rows'] = round_table.num_rows
+        if round_table.num_rows:
+            round_tables.append(round_table)
+    if not round_tables:
+        return compact_schema.empty_table()
+
+    table = pa.concat_tables(round_tables).combine_chunks()
+    sample_ids, values = _sort_lists(table['output_type_id'].chunk(0),
+                                     pc.cast(table['value'].chunk(0), pa.list_(pa.float64())))
+    if fixed_size:
+        sample_ids, values = _fixed_size_lists(sample_ids), _fixed_size_lists(values)
+    table = table \
+        .set_column(table.schema.get_field_index('output_type_id'), 'output_type_id', sample_ids) \
+        .set_column(table.schema.get_field_index('value'), 'value', values)
+
+    compound_columns = _compound_taskid_set(hub_conn.tasks)
+    sort_columns = ['model_id'] + [col_name for col_name in key_columns if col_name in compound_columns] \
+        + [col_name for col_name in key_columns if (col_name != 'model_id') and (col_name not in compound_columns)]
+    table = table.take(pc.sort_indices(table.select(sort_columns),
+                                       [(col_name, 'ascending') for col_name in sort_columns]))
+    return _encode_dictionaries(table.select(compact_schema.names), dict_fields).unify_dictionaries()
+
+
+def expand_samples(table: pa.Table, schema: pa.Schema | None = None) -> pa.Table:
+    """
+    The reverse of `compact_samples()`: expands `table`'s `output_type_id` and `value` list columns into one row per
+    sample, repeating the other columns' values, and adds an `output_type` column of 'sample'.
+
+    :param table: a pa.Table as returned by `compact_samples()`
+    :param schema: optional pa.Schema to select and cast the result's columns to, e.g., `HubConnection.schema` to get
+        rows as `HubConnection.get_dataset()` has them. if None then the result has `table`'s columns in order, with
+        `output_type` before `output_type_id`
+    :return: a pa.Table with one row per sample, in `table`'s row and list order
+    """
+    table = table.combine_chunks()
+    sample_ids, values = (table[col_name].chunk(0) if table[col_name].num_chunks
+                          else pa.array([], table[col_name].type) for col_name in ['output_type_id', 'value'])
+    row_indices = pc.list_parent_indices(values)
+    columns = {}
+    for col_name in table.column_names:
+        if col_name == 'output_type_id':
+            columns['output_type'] = pa.array(['sample'] * len(row_indices), pa.string())
+            columns[col_name] = sample_ids.flatten()
+        elif col_name == 'value':
+            columns[col_name] = values.flatten()
+        else:
+            columns[col_name] = table[col_name].take(row_indices)
+    expanded_table = pa.table(columns)
+    return expanded_table if schema is None else expanded_table.select(schema.names).cast(schema)
+
+
+def _sort_lists(sample_ids: pa.ListArray, values: pa.ListArray) -> tuple[pa.ListArray, pa.ListArray]:
+    """
+    `compact_samples()` helper that sorts each list of `sample_ids` and reorders the parallel list of `values` to
+    match. Vectorized: sorts all items at once by (list index, sample ID), which keeps each list's items in place.
+
+    :return: a 2-tuple: (sample_ids, values) with the same list lengths as the args
+    """
+    list_indices = pc.list_parent_indices(sample_ids)
+    item_indices = pc.sort_indices(pa.table({'list_index': list_indices, 'sample_id': sample_ids.flatten()}),
+                                   [('list_index', 'ascending'), ('sample_id', 'ascending')])
+    offsets = pc.subtract(sample_ids.offsets, sample_ids.offsets[0])  # NB: flatten() drops items before a slice
+    return pa.ListArray.from_arrays(offsets, sample_ids.flatten().take(item_indices)), \
+        pa.ListArray.from_arrays(offsets, values.flatten().take(item_indices))
+
+
+def _fixed_size_lists(list_array: pa.ListArray) -> pa.FixedSizeListArray:
+    """
+    `compact_samples()` helper that converts `list_array` to a FixedSizeListArray.
+
+    :raise: ValueError if its lists have different lengths
+    """
+    lengths = pc.unique(pc.list_value_length(list_array)).to_pylist()
+    if len(lengths) != 1:
+        raise ValueError(f'cannot use fixed-size lists: forecasts have different numbers of samples: {sorted(lengths)}')
+
+    return pa.FixedSizeListArray.from_arrays(list_array.flatten(), lengths[0])
+
+
+def _compound_taskid_set(tasks: dict) -> list[str]:
+    """
+    :return: the task IDs in any sample output type's `output_type_id_params` > `compound_taskid_set`, in the order
+        found
+    """
+    compound_columns = []
+    for the_round in tasks['rounds']:
+        for model_task in the_round['model_tasks']:
+            sample_params = model_task['output_type'].get('sample', {}).get('output_type_id_params', {})
+            for task_id_name in sample_params.get('compound_taskid_set') or []:
+                if task_id_name not in compound_columns:
+                    compound_columns.append(task_id_name)
+    return compound_columns
@@ -0,0 +1,200 @@
+"""hubdata scoring: vectorized pinball loss, WIS, interval coverage, and sample CRPS of model vs. oracle output."""
+
+import datetime
+from typing import Iterable
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from hubdata.connect_hub import HubConnection
+from hubdata.connect_target_data import TargetDataConnection
+from hubdata.join import join_oracle
+
+# columns of `join_oracle()` output that vary within a forecast. the others (model_id, task IDs, and output_type)
+# identify it
+NON_FORECAST_COLUMNS = ('output_type_id', 'value', 'oracle_value')
+
+DEFAULT_INTERVAL_LEVELS = (50, 90)  # central prediction interval levels (percents) for `score_quantiles()` coverage
+
+_QUANTILE_LEVEL_TOLERANCE = 1e-9  # for matching quantile levels parsed from `output_type_id` to interval bounds
+
+
+def pinball_loss(value: pa.Array | pa.ChunkedArray, oracle_value: pa.Array | pa.ChunkedArray,
+                 quantile_level: pa.Array | pa.ChunkedArray) -> pa.Array | pa.ChunkedArray:
+    """
+    The elementwise pinball (quantile) loss of predicted quantiles: `(y - q) * (tau - 1{y < q})`, where `q` is
+    `value`, `y` is `oracle_value`, and `tau` is `quantile_level`. Args are equal-length numeric arrays.
+
+    :return: a float64 array. null where any input is null
+    """
+    value, oracle_value, quantile_level = (pc.cast(array, pa.float64()) for array in (value, oracle_value,
+                                                                                       quantile_level))
+    is_under = pc.cast(pc.less(oracle_value, value), pa.float64())
+    return pc.multiply(pc.subtract(oracle_value, value), pc.subtract(quantile_level, is_under))
+
+
+def score_quantiles(table: pa.Table, interval_levels: Iterable[int] = DEFAULT_INTERVAL_LEVELS) -> pa.Table:
+    """
+    Scores each quantile forecast in `table` (i.e., its 'quantile' output type rows for each combination of model_id and
+    task IDs) using grouped Arrow aggregations. Scores are:
+
+    - wis: the weighted interval score, computed as the mean over the forecast's quantile levels of twice their pinball
+      loss, which equals the interval-based definition for symmetric quantile levels that include the median
+    - ae_median: the absolute error of the median (the 0.5 quantile). null if the forecast has no median
+    - interval_coverage_<level> for each of `interval_levels`: whether the oracle value is within the central
+      `<level>`% prediction interval. null if the forecast lacks either of the interval's quantile levels
+
+    :param table: a pa.Table with `join_oracle()`'s columns, e.g., one of the tables that it yields. rows of other
+        output types are ignored. `output_type_id`s must be numeric quantile levels
+    :param interval_levels: central prediction interval levels, as percents between 0 and 100
+    :return: a pa.Table with one row per forecast: the forecast's identifying columns followed by the scores
+    """
+    table = _decode_dictionaries(table)
+    table = table.filter(pc.equal(table['output_type'], 'quantile'))
+    forecast_columns = _forecast_columns(table)
+    quantile_level = pc.cast(table['output_type_id'], pa.float64())
+    value, oracle_value = pc.cast(table['value'], pa.float64()), pc.cast(table['oracle_value'], pa.float64())
+    null_double = pa.scalar(None, pa.float64())
+    score_columns = {
+        '__wis': pc.multiply(pinball_loss(value, oracle_value, quantile_level), 2),
+        '__ae_median': pc.if_else(_is_level(quantile_level, 0.5), pc.abs(pc.subtract(value, oracle_value)),
+                                  null_double),
+    }
+    aggregations = [('__wis', 'mean'), ('__ae_median', 'max')]
+    for interval_level in interval_levels:
+        lower_level = (1 - interval_level / 100) / 2
+        score_columns[f'__lower_{interval_level}'] = pc.if_else(
+            _is_level(quantile_level, lower_level), pc.less_equal(value, oracle_value), pa.scalar(None, pa.bool_()))
+        score_columns[f'__upper_{interval_level}'] = pc.if_else(
+            _is_level(quantile_level, 1 - lower_level), pc.less_equal(oracle_value, value), pa.scalar(None, pa.bool_()))
+        aggregations.extend([(f'__lower_{interval_level}', 'min'), (f'__upper_{interval_level}', 'min')])
+
+    scores = pa.table(score_columns | {col_name: table[col_name] for col_name in forecast_columns}) \
+        .group_by(forecast_columns, use_threads=False) \
+        .aggregate(aggregations)
+    result_columns = {col_name: scores[col_name] for col_name in forecast_columns}
+    result_columns['wis'] = scores['__wis_mean']
+    result_columns['ae_median'] = scores['__ae_median_max']
+    for interval_level in interval_levels:
+        result_columns[f'interval_coverage_{interval_level}'] = pc.and_kleene(scores[f'__lower_{interval_level}_min'],
+                                                                              scores[f'__upper_{interval_level}_min'])
+    return pa.table(result_columns)
+
+
+def score_samples(table: pa.Table) -> pa.Table:
+    """
+    Scores each sample forecast in `table` (i.e., its 'sample' output type rows for each combination of model_id and
+    task IDs) by its continuous ranked probability score (CRPS), using the empirical distribution of its samples `x`
+    and the oracle value `y`: `mean(|x_i - y|) - mean(|x_i - x_j|) / 2` over all `i` and `j`. The second term is
+    computed in O(m log m) rather than O(m^2) time per forecast of `m` samples, using `sum(|x_i - x_j|) = 2 *
+    sum((2i - m - 1) * x_(i))` over the sorted samples `x_(1)` to `x_(m)`. The sort and the sums are vectorized over all
+    forecasts at once.
+
+    :param table: a pa.Table with `join_oracle()`'s columns, e.g., one of the tables that it yields. rows of other
+        output types are ignored
+    :return: a pa.Table with one row per forecast: the forecast's identifying columns followed by 'crps'
+    """
+    table = _decode_dictionaries(table)
+    table = table.filter(pc.equal(table['output_type'], 'sample'))
+    forecast_columns = _forecast_columns(table)
+    value, oracle_value = pc.cast(table['value'], pa.float64()), pc.cast(table['oracle_value'], pa.float64())
+
+    # sort samples within each forecast. NB: forecasts are then contiguous, so a sample's rank within its forecast is
+    # its row number minus that of its forecast's first row, which we get from the 'min' aggregation below
+    sort_indices = pc.sort_indices(table.select(forecast_columns).append_column('__value', value),
+                                   [(col_name, 'ascending') for col_name in forecast_columns + ['__value']])
+    value = value.take(sort_indices)
+    row_number = pc.cumulative_sum(pa.repeat(pa.scalar(1, pa.int64()), len(value)))  # 1-based
+    scores = pa.table({col_name: table[col_name].take(sort_indices) for col_name in forecast_columns}
+                      | {'__abs_error': pc.abs(pc.subtract(value, oracle_value.take(sort_indices))),
+                         '__value': value,
+                         '__row_value': pc.multiply(pc.cast(row_number, pa.float64()), value),
+                         '__row_number': row_number}) \
+        .group_by(forecast_columns, use_threads=False) \
+        .aggregate([('__abs_error', 'mean'), ('__value', 'sum'), ('__row_value', 'sum'), ('__row_number', 'min'),
+                    ('__value', 'count')])
+
+    num_samples = pc.cast(scores['__value_count'], pa.float64())
+    first_row = pc.cast(scores['__row_number_min'], pa.float64())
+    rank_value_sum = pc.subtract(scores['__row_value_sum'],  # sum(i * x_(i)) with i the 1-based rank in the forecast
+                                 pc.multiply(pc.subtract(first_row, 1), scores['__value_sum']))
+    spread = pc.divide(pc.subtract(pc.multiply(rank_value_sum, 2),
+                                   pc.multiply(pc.add(num_samples, 1), scores['__value_sum'])),
+                       pc.multiply(num_samples, num_samples))  # mean(|x_i - x_j|) / 2
+    return pa.table({col_name: scores[col_name] for col_name in forecast_columns}
+                    | {'crps': pc.subtract(scores['__abs_error_mean'], spread)})
+
+
+def score_model_output(hub_conn: HubConnection, td_conn: TargetDataConnection, by: Iterable[str] = ('model_id',),
+                       filter: ds.Expression | None = None, as_of: datetime.date | str | None = None,
+                       interval_levels: Iterable[int] = DEFAULT_INTERVAL_LEVELS) -> pa.Table:
+    """
+    Scores a hub's quantile and sample forecasts against its oracle output, summarizing them by `by`. Model output is
+    joined with oracle output via `join_oracle()` and scored one round at a time via `score_quantiles()` and
+    `score_samples()`, so only one round's rows plus the per-forecast scores are in memory at a time.
+
+    :param hub_conn: the hub's HubConnection
+    :param td_conn: a TargetDataConnection for oracle-output target data
+    :param by: names of the forecast columns (model_id and task IDs) to summarize by, e.g., `['model_id', 'horizon']`
+    :param filter: optional `ds.Expression` used to filter model output rows as passed to `join_oracle()`
+    :param as_of: for versioned oracle output, the snapshot date as passed to `join_oracle()`
+    :param interval_levels: as passed to `score_quantiles()`
+    :return: a pa.Table with one row per `by` combination, sorted by them, with the mean of each score: wis, ae_median,
+        interval_coverage_<level> (the fraction of forecasts covered), and crps. a score is null for combinations having
+        no forecasts of its output type
+    :raise: ValueError as raised by `join_oracle()`
+    """
+    by, interval_levels = list(by), list(interval_levels)
+    quantile_scores, sample_scores = [], []
+    for round_table in join_oracle(hub_conn, td_conn, filter=filter, as_of=as_of):
+        quantile_scores.append(score_quantiles(round_table, interval_levels))
+        sample_scores.append(score_samples(round_table))
+
+    score_columns = ['wis', 'ae_median'] + [f'interval_coverage_{interval_level}' for interval_level in interval_levels]
+    summary = None
+    for scores, col_names in [(quantile_scores, score_columns), (sample_scores, ['crps'])]:
+        scores = _summarize(scores, by, col_names)
+        summary = scores if summary is None \
+            else summary.join(scores, keys=by, join_type='full outer', coalesce_keys=True)
+    return summary.sort_by([(col_name, 'ascending') for col_name in by])
+
+
+def _summarize(scores: list[pa.Table], by: list[str], col_names: list[str]) -> pa.Table:
+    """
+    `score_model_output()` helper that concatenates per-round `scores` and averages `col_names` by `by`.
+    """
+    if not scores:  # no rounds. NB: we don't know `by`'s types, so they are null
+        return pa.table({col_name: pa.array([], pa.null()) for col_name in by}
+                        | {col_name: pa.array([], pa.float64()) for col_name in col_names})
+
+    scores = pa.concat_tables(scores)
+    scores = pa.table({col_name: scores[col_name] for col_name in by}
+                      | {col_name: pc.cast(scores[col_name], pa.float64()) for col_name in col_names})
+    summary = scores.group_by(by).aggregate([(col_name, 'mean') for col_name in col_names])
+    return summary.rename_columns([col_name.removesuffix('_mean') if col_name in [f'{score_col}_mean'
+                                                                                    for score_col in col_names]
+                                   else col_name for col_name in summary.column_names])
+
+
+def _forecast_columns(table: pa.Table) -> list[str]:
+    """
+    :return: the names of `table`'s columns that identify a forecast: all but NON_FORECAST_COLUMNS
+    """
+    return [col_name for col_name in table.column_names if col_name not in NON_FORECAST_COLUMNS]
+
+
+def _decode_dictionaries(table: pa.Table) -> pa.Table:
+    """
+    :return: `table` with any dictionary (categorical) columns cast to their value types, which compute functions like
+        `pc.equal()` and `pc.sort_indices()` on multiple columns require
+    """
+    return table.cast(pa.schema([field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type)
+                                 else field for field in table.schema]))
+
+
+def _is_level(quantile_level: pa.Array | pa.ChunkedArray, level: float) -> pa.Array | pa.ChunkedArray:
+    """
+    :return: a boolean array that's true where `quantile_level` equals `level`, allowing for float parsing error
+    """
+    return pc.less(pc.abs(pc.subtract(quantile_level, level)), _QUANTILE_LEVEL_TOLERANCE)
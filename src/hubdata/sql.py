@@ -0,0 +1,160 @@
+"""hubdata query engines: SQL via the optional DuckDB package, and pyarrow Acero-based aggregation."""
+
+import re
+from typing import Callable, Iterable
+
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+try:
+    import duckdb
+except ImportError:  # optional dependency: `pip install 'hubdata[sql]'`
+    duckdb = None
+
+# the prefix of the helper join key columns that `latest_versions()` adds for key columns having nulls
+NULL_SAFE_KEY_PREFIX = '__null_safe_key_'
+
+
+def sql_query(relations: dict[str, Callable[[], ds.Dataset]], query: str) -> pa.Table:
+    """
+    Runs `query` using an embedded DuckDB database in which each of `relations` that `query` mentions is registered as
+    a view over a pyarrow dataset. DuckDB scans the datasets lazily, pushing down projections and filters, and runs
+    the query streaming and multi-threaded.
+
+    :param relations: a dict that maps relation (table) names to functions that return the relation's dataset. a
+        function is only called if its name appears in `query`
+    :param query: a DuckDB SQL query
+    :return: the query result as a pa.Table
+    :raise: ImportError if DuckDB is not installed
+    """
+    if duckdb is None:
+        raise ImportError("SQL queries require the duckdb package. install it via `pip install 'hubdata[sql]'`, or "
+                          "use HubConnection.aggregate() instead")
+
+    with duckdb.connect() as connection:
+        for relation_name, dataset_fcn in relations.items():
+            if re.search(rf'\b{relation_name}\b', query, flags=re.IGNORECASE):
+                connection.register(relation_name, dataset_fcn())
+        result = connection.execute(query).arrow()  # NB: a RecordBatchReader as of duckdb 1.4, and a Table before
+        return result.read_all() if isinstance(result, pa.RecordBatchReader) else result
+
+
+def aggregate_dataset(dataset: ds.Dataset, aggregations: list[tuple[str, str]], group_by: Iterable[str] = (),
+                      filter: ds.Expression | None = None) -> pa.Table:
+    """
+    Aggregates `dataset` with an Acero scan -> filter -> aggregate plan, i.e., without materializing the dataset.
+    Only the columns used by `aggregations` and `group_by` are read, and `filter` is also pushed down to the scan.
+    Dictionary (categorical) columns are decoded before aggregating because each file's batches have their own
+    dictionaries, which Acero cannot group by. `group_by` columns are re-encoded in the result.
+
+    :param dataset: the ds.Dataset to aggregate
+    :param aggregations: a list of 2-tuples (column_name, function_name) as passed to
+        `pyarrow.TableGroupBy.aggregate()`, e.g., `[('value', 'count'), ('value', 'mean')]`. output columns are named
+        `<column_name>_<function_name>` like that function's
+    :param group_by: column names to group by. defaults to no grouping, which returns one row
+    :param filter: optional ds.Expression used to filter rows before aggregating
+    :return: a pa.Table with one column per `group_by` item followed by one per `aggregations` item
+    """
+    group_by = list(group_by)
+    columns = list(dict.fromkeys(group_by + [col_name for col_name, _ in aggregations]))
+    declarations, dict_fields = _scan_declarations(dataset, columns, filter)
+    declarations.append(acero.Declaration('aggregate', acero.AggregateNodeOptions(
+        [(col_name, f'hash_{function_name}' if group_by else function_name, None, f'{col_name}_{function_name}')
+         for col_name, function_name in aggregations],
+        keys=group_by)))
+    table = acero.Declaration.from_sequence(declarations).to_table(use_threads=True)
+    return _encode_dictionaries(table, [field for field in dict_fields if field.name in group_by])
+
+
+def latest_versions(dataset: ds.Dataset, key_columns: list[str], version_column: str,
+                    filter: ds.Expression | None = None) -> pa.Table:
+    """
+    Returns the rows of `dataset` that have the newest `version_column` value of their `key_columns` values, e.g., the
+    latest `as_of` version of each target data observation, without materializing the dataset. Uses two Acero plans:
+    - scan (only `key_columns` and `version_column`) -> filter -> aggregate: the newest version per key
+    - scan -> filter -> join with the above: the rows having those newest versions. `filter` is extended to only the
+      newest versions that were found, so that files (e.g., hive partitions of `version_column`) and Parquet row groups
+      with no newest rows are skipped
+
+    Both plans stream `dataset`, so memory is bounded by the size of the result. Dictionary (categorical) columns are
+    decoded while scanning and re-encoded in the result, as in `aggregate_dataset()`.
+
+    :param dataset: the ds.Dataset to read
+    :param key_columns: names of the columns that identify a versioned item. nulls in them are key values like any
+        other, i.e., they match each other (e.g., oracle output's null `output_type_id`s). rows whose `version_column`
+        is null are excluded
+    :param version_column: the name of an orderable column whose largest value marks the newest version
+    :param filter: optional ds.Expression used to filter rows before finding the newest versions, e.g., to exclude
+        versions after a date
+    :return: a pa.Table with `dataset`'s schema, sorted by `key_columns`. rows with equal key and version values are
+        all returned
+    """
+    max_column = f'{version_column}_max'
+    newest_versions = aggregate_dataset(dataset, [(version_column, 'max')], key_columns, filter)
+    newest_versions = newest_versions \
+        .cast(pa.schema([field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                         for field in newest_versions.schema])) \
+        .rename_columns([version_column if col_name == max_column else col_name
+                         for col_name in newest_versions.column_names])
+    newest_filter = ds.field(version_column).isin(pc.unique(newest_versions[version_column]))
+    declarations, dict_fields = _scan_declarations(dataset, dataset.schema.names,
+                                                   newest_filter if filter is None else filter & newest_filter)
+
+    # NB: a hash join never matches null keys, so key columns having nulls are joined on two helper columns instead,
+    # computed the same way on both sides: the value as a string with nulls coalesced to '', and a null flag that tells
+    # nulls apart from actual '' values
+    join_keys = key_columns + [version_column]
+    key_expressions = {}
+    for col_name in key_columns:
+        if newest_versions[col_name].null_count:
+            join_keys.remove(col_name)
+            key_expressions[f'{NULL_SAFE_KEY_PREFIX}{col_name}'] = \
+                pc.coalesce(ds.field(col_name).cast(pa.string()), pa.scalar('', pa.string()))
+            key_expressions[f'{NULL_SAFE_KEY_PREFIX}{col_name}_is_null'] = ds.field(col_name).is_null()
+    join_keys.extend(key_expressions)
+    newest_declarations = [acero.Declaration('table_source', acero.TableSourceNodeOptions(newest_versions))]
+    if key_expressions:
+        for column_names, the_declarations in [(dataset.schema.names, declarations),
+                                               (newest_versions.column_names, newest_declarations)]:
+            the_declarations.append(acero.Declaration('project', acero.ProjectNodeOptions(
+                [ds.field(col_name) for col_name in column_names] + list(key_expressions.values()),
+                column_names + list(key_expressions))))
+    join_declaration = acero.Declaration('hashjoin', acero.HashJoinNodeOptions(
+        'inner', left_keys=join_keys, right_keys=join_keys, left_output=dataset.schema.names, right_output=[]),
+        inputs=[acero.Declaration.from_sequence(declarations), acero.Declaration.from_sequence(newest_declarations)])
+    table = join_declaration.to_table(use_threads=True)
+    # NB: sorted before re-encoding because dictionary columns cannot be sorted
+    return _encode_dictionaries(table.sort_by([(col_name, 'ascending') for col_name in key_columns]), dict_fields)
+
+
+def _scan_declarations(dataset: ds.Dataset, columns: list[str], filter: ds.Expression | None) \
+        -> tuple[list[acero.Declaration], list[pa.Field]]:
+    """
+    Helper that returns Acero declarations that scan `columns` of `dataset`, filter them by `filter`, and decode any
+    dictionary columns, which Acero cannot group or join by because each file's batches have their own dictionaries.
+
+    :return: a 2-tuple: (declarations, dict_fields). the latter are the decoded columns' fields in `dataset.schema`
+    """
+    declarations = [acero.Declaration('scan', acero.ScanNodeOptions(dataset, columns=columns, filter=filter))]
+    if filter is not None:  # NB: a scan node's filter is only used for pushdown, so we must filter again
+        declarations.append(acero.Declaration('filter', acero.FilterNodeOptions(filter)))
+    dict_fields = [dataset.schema.field(col_name) for col_name in columns
+                   if pa.types.is_dictionary(dataset.schema.field(col_name).type)]
+    if dict_fields:
+        dict_value_types = {field.name: field.type.value_type for field in dict_fields}
+        declarations.append(acero.Declaration('project', acero.ProjectNodeOptions(
+            [ds.field(col_name).cast(dict_value_types[col_name]) if col_name in dict_value_types
+             else ds.field(col_name) for col_name in columns],
+            columns)))
+    return declarations, dict_fields
+
+
+def _encode_dictionaries(table: pa.Table, dict_fields: list[pa.Field]) -> pa.Table:
+    """
+    :return: `table` with the columns named by `dict_fields` (as returned by `_scan_declarations()`) re-encoded
+    """
+    for field in dict_fields:
+        table = table.set_column(table.schema.get_field_index(field.name), field, table[field.name].cast(field.type))
+    return table
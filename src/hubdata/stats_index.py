@@ -0,0 +1,134 @@
+import json
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import structlog
+from pyarrow import fs
+
+from hubdata.connect_hub import (
+    STATS_INDEX_METADATA_KEY,
+    HubConnection,
+    _read_stats_index,
+    _schema_to_json,
+    _stats_index_columns,
+    connect_hub,
+)
+
+logger = structlog.get_logger()
+
+STATS_INDEX_VERSION = 1
+
+
+def build_stats_index(hub_path: str | Path, full: bool = False) -> str:
+    """
+    Writes a small Parquet "statistics index" of a hub's model output files to `HubConnection.stats_index_path`. The
+    index has one row per file, recording the file's path, size, and mtime, and for each task ID column (plus
+    `output_type`) its min and max values and null count. When the index exists, `HubConnection.get_dataset()` attaches
+    those ranges to each file so that pyarrow skips files whose ranges cannot match a filter, e.g., a `location` or
+    `horizon` filter, without opening them. This gives CSV files the file skipping that Parquet statistics give Parquet
+    files. Note that a file whose range is a single value (e.g., one `reference_date` or `target`) is skipped by any
+    filter that excludes that value.
+
+    Building is incremental: files whose path, size, and mtime match their existing index row are not re-read. The
+    index is rebuilt in full if `full` is True or if it was built for a different schema. Files that were added or
+    changed after the index was built are simply not skipped. Floating point columns are not indexed because NaNs
+    do not take part in min and max.
+
+    :param hub_path: str or Path pointing to a hub's root directory as passed to `connect_hub()`
+    :param full: True to re-read every file regardless of what changed
+    :return: the path of the index in the hub's file system
+    :raise: RuntimeError if `hub_path` is invalid
+    """
+    hub_conn = connect_hub(hub_path)  # NB: no cache_dir, so that listed sizes and mtimes are current
+    columns = _stats_index_columns(hub_conn.schema, hub_conn.tasks)
+    file_format_to_files, _ = hub_conn._group_files_by_format(hub_conn._list_model_out_files(),
+                                                              hub_conn._file_formats(), ('README', '.DS_Store'))
+
+    # reuse the rows of unchanged files. NB: _read_stats_index() returns None if the index is for a different schema
+    old_index = None if full else _read_stats_index(hub_conn._filesystem, hub_conn.stats_index_path, hub_conn.schema)
+    old_rows = {row['path']: row for row in old_index.to_pylist()} if old_index is not None else {}
+    kept_rows, changed_file_format_to_files = [], {}
+    for file_format, format_files in file_format_to_files.items():
+        for file_info in format_files:
+            rel_path = _rel_path(hub_conn, file_info)
+            old_row = old_rows.get(rel_path)
+            if (old_row is not None) and (old_row['size'] == file_info.size) \
+                    and (old_row['mtime_ns'] == file_info.mtime_ns):
+                kept_rows.append(old_row)
+            else:
+                changed_file_format_to_files.setdefault(file_format, []).append(file_info)
+    num_changed = sum(len(format_files) for format_files in changed_file_format_to_files.values())
+    logger.info(f'building stats index: {hub_conn.stats_index_path!r}. reading {num_changed} of '
+                f'{num_changed + len(kept_rows)} files')
+
+    index_schema = _stats_index_schema(hub_conn.schema, columns)
+    index_table = pa.concat_tables([pa.Table.from_pylist(kept_rows, schema=index_schema),
+                                    _stats_for_files(hub_conn, changed_file_format_to_files, columns,
+                                                     index_schema)]) \
+        .sort_by('path') \
+        .replace_schema_metadata({STATS_INDEX_METADATA_KEY: json.dumps({'version': STATS_INDEX_VERSION,
+                                                                        'schema': _schema_to_json(hub_conn.schema),
+                                                                        'columns': columns})})
+    hub_conn._filesystem.create_dir(hub_conn.stats_index_path.rsplit('/', 1)[0], recursive=True)
+    pq.write_table(index_table, hub_conn.stats_index_path, filesystem=hub_conn._filesystem)
+    return hub_conn.stats_index_path
+
+
+def _stats_for_files(hub_conn: HubConnection, file_format_to_files: dict[str, list[fs.FileInfo]],
+                     columns: list[str], index_schema: pa.Schema) -> pa.Table:
+    """
+    build_stats_index() helper that reads `file_format_to_files` in one scan and returns their index rows. NB: we
+    compute stats per batch as the scan yields them and then combine each file's batch stats with a group by
+    """
+    file_infos = [file_info for format_files in file_format_to_files.values() for file_info in format_files]
+    if not file_infos:
+        return index_schema.empty_table()
+
+    batch_rows = []
+    scanner = hub_conn._dataset_from_file_groups(file_format_to_files, False).scanner(columns=columns)
+    for tagged_batch in scanner.scan_batches():
+        batch_row = {'path': tagged_batch.fragment.path}
+        for col_name in columns:
+            min_max = pc.min_max(tagged_batch.record_batch[col_name])
+            batch_row.update({f'{col_name}.min': min_max['min'], f'{col_name}.max': min_max['max'],
+                              f'{col_name}.null_count': tagged_batch.record_batch[col_name].null_count})
+        batch_rows.append(batch_row)
+
+    batch_table = pa.Table.from_pylist(batch_rows, schema=pa.schema([index_schema.field(col_name)
+                                                                     for col_name in index_schema.names
+                                                                     if col_name not in ['size', 'mtime_ns']]))
+    aggregations = [aggregation for col_name in columns
+                    for aggregation in [(f'{col_name}.min', 'min'), (f'{col_name}.max', 'max'),
+                                        (f'{col_name}.null_count', 'sum')]]
+    file_stats = {row['path']: row for row in batch_table.group_by('path').aggregate(aggregations).to_pylist()}
+
+    # rename the aggregated columns back (e.g., 'location.min_min' -> 'location.min') and add files without rows
+    rows = []
+    for file_info in file_infos:
+        stats = file_stats.get(file_info.path, {})
+        row = {'path': _rel_path(hub_conn, file_info), 'size': file_info.size, 'mtime_ns': file_info.mtime_ns}
+        for col_name, aggregation in aggregations:
+            row[col_name] = stats.get(f'{col_name}_{aggregation}', 0 if aggregation == 'sum' else None)
+        rows.append(row)
+    return pa.Table.from_pylist(rows, schema=index_schema)
+
+
+def _stats_index_schema(hub_schema: pa.Schema, columns: list[str]) -> pa.Schema:
+    """
+    :return: the schema of a stats index for `columns`: `path`, `size`, and `mtime_ns`, followed by `<col>.min`,
+        `<col>.max` (both `hub_schema`'s type), and `<col>.null_count` for each column
+    """
+    return pa.schema([('path', pa.string()), ('size', pa.int64()), ('mtime_ns', pa.int64())]
+                     + [field for col_name in columns
+                        for field in [(f'{col_name}.min', hub_schema.field(col_name).type),
+                                      (f'{col_name}.max', hub_schema.field(col_name).type),
+                                      (f'{col_name}.null_count', pa.int64())]])
+
+
+def _rel_path(hub_conn: HubConnection, file_info: fs.FileInfo) -> str:
+    """
+    :return: `file_info`'s path relative to `hub_conn.model_output_dir`, which is how index rows are keyed
+    """
+    return file_info.path[len(hub_conn.model_output_dir):].strip('/')
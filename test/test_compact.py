@@ -0,0 +1,159 @@
+import json
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from hubdata import compact_hub, connect_hub
+from hubdata.connect_hub import COMPACTION_METADATA_FILE_NAME
+
+
+def _sorted_table(table: pa.Table) -> pa.Table:
+    return table.sort_by([(col_name, 'ascending') for col_name in table.column_names])
+
+
+@pytest.mark.parametrize('partition_by_round,exp_partition_names',
+                         [(False, ['model_id']),
+                          (True, ['model_id', 'forecast_date'])])
+def test_compact_hub(tmp_path, partition_by_round, exp_partition_names):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)  # mix of csv, parquet, and arrow files
+    compacted_dir = compact_hub(tmp_path, partition_by_round=partition_by_round, row_group_size=100)
+    assert Path(compacted_dir) == (tmp_path / '.hubdata' / 'compacted-model-output').absolute()
+    with open(Path(compacted_dir) / COMPACTION_METADATA_FILE_NAME) as metadata_fp:
+        assert json.load(metadata_fp)['partition_cols'] == exp_partition_names
+
+    # the mirror has the exact hub schema and the same data as the model output dir
+    hub_connection = connect_hub(tmp_path, prefer_compacted=True)
+    compacted_ds = hub_connection.get_dataset()
+    assert isinstance(compacted_ds, pa.dataset.FileSystemDataset)
+    assert compacted_ds.format.default_extname == 'parquet'
+    assert compacted_ds.partitioning.schema.names == exp_partition_names
+    assert compacted_ds.schema == hub_connection.schema
+    assert _sorted_table(compacted_ds.to_table()) == _sorted_table(connect_hub(tmp_path).to_table())
+
+    # row groups respect row_group_size and have statistics
+    parquet_file = pq.ParquetFile(compacted_ds.files[0])
+    assert all([parquet_file.metadata.row_group(idx).num_rows <= 100
+                for idx in range(parquet_file.metadata.num_row_groups)])
+    assert parquet_file.metadata.row_group(0).column(0).statistics.has_min_max
+
+
+def test_compact_hub_replaces_mirror(tmp_path):
+    shutil.copytree('test/hubs/simple', tmp_path, dirs_exist_ok=True)
+    compact_hub(tmp_path)
+    shutil.rmtree(tmp_path / 'model-output' / 'team1-goodmodel')
+    compact_hub(tmp_path)
+    compacted_ds = connect_hub(tmp_path, prefer_compacted=True).get_dataset()
+    assert sorted(Path(file).parent.name for file in compacted_ds.files) == ['model_id=hub-baseline']
+
+
+def test_compact_hub_no_round_column(tmp_path):
+    shutil.copytree('test/hubs/simple', tmp_path, dirs_exist_ok=True)
+    tasks_json_path = tmp_path / 'hub-config' / 'tasks.json'
+    with open(tasks_json_path) as tasks_fp:
+        tasks = json.load(tasks_fp)
+    tasks['rounds'][0]['round_id_from_variable'] = False
+    with open(tasks_json_path, 'w') as tasks_fp:
+        json.dump(tasks, tasks_fp)
+
+    with pytest.raises(ValueError, match='cannot partition by round'):
+        compact_hub(tmp_path, partition_by_round=True)
+
+
+def test_prefer_compacted_fallback(tmp_path):
+    shutil.copytree('test/hubs/simple', tmp_path, dirs_exist_ok=True)
+
+    # case: no mirror -> model output dir
+    hub_ds = connect_hub(tmp_path, prefer_compacted=True).get_dataset()
+    assert isinstance(hub_ds, pa.dataset.UnionDataset)
+
+    # case: mirror written for a different schema -> model output dir
+    compacted_dir = compact_hub(tmp_path)
+    metadata_path = Path(compacted_dir) / COMPACTION_METADATA_FILE_NAME
+    with open(metadata_path) as metadata_fp:
+        metadata = json.load(metadata_fp)
+    metadata['schema'][0][1] = 'string'
+    with open(metadata_path, 'w') as metadata_fp:
+        json.dump(metadata, metadata_fp)
+    hub_ds = connect_hub(tmp_path, prefer_compacted=True).get_dataset()
+    assert isinstance(hub_ds, pa.dataset.UnionDataset)
+
+    # case: prefer_compacted=False ignores the mirror
+    compact_hub(tmp_path)
+    assert isinstance(connect_hub(tmp_path).get_dataset(), pa.dataset.UnionDataset)
+    assert isinstance(connect_hub(tmp_path, prefer_compacted=True).get_dataset(), pa.dataset.FileSystemDataset)
+
+    # case: stale mirror (a file was added or modified after compaction) -> model output dir
+    model_dir = tmp_path / 'model-output' / 'hub-baseline'
+    shutil.copy(model_dir / '2022-10-08-hub-baseline.csv', model_dir / '2022-10-29-hub-baseline.csv')
+    hub_ds = connect_hub(tmp_path, prefer_compacted=True).get_dataset()
+    assert isinstance(hub_ds, pa.dataset.UnionDataset)
+    assert hub_ds.count_rows() == connect_hub(tmp_path).get_dataset().count_rows()
+
+    compact_hub(tmp_path)
+    assert isinstance(connect_hub(tmp_path, prefer_compacted=True).get_dataset(), pa.dataset.FileSystemDataset)
+    with open(model_dir / '2022-10-29-hub-baseline.csv', 'a') as csv_fp:
+        csv_fp.write((model_dir / '2022-10-08-hub-baseline.csv').read_text().splitlines(keepends=True)[-1])
+    hub_ds = connect_hub(tmp_path, prefer_compacted=True).get_dataset()
+    assert isinstance(hub_ds, pa.dataset.UnionDataset)
+    assert hub_ds.count_rows() == connect_hub(tmp_path).get_dataset().count_rows()
+
+
+def test_compact_hub_incremental(tmp_path):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)
+    compacted_dir = Path(compact_hub(tmp_path, partition_by_round=True))
+    with open(compacted_dir / COMPACTION_METADATA_FILE_NAME) as metadata_fp:
+        metadata = json.load(metadata_fp)
+    assert sorted(metadata['models']) == ['hub-baseline', 'hub-ensemble', 'umass-ens']
+    assert [Path(source[0]).name for source in metadata['models']['umass-ens']['sources']] == [
+        '2023-05-01-umass-ens.csv', '2023-05-08-umass-ens.csv']
+    assert metadata['models']['umass-ens']['files'] == ['model_id=umass-ens/forecast_date=2023-05-01/part-0.parquet',
+                                                        'model_id=umass-ens/forecast_date=2023-05-08/part-0.parquet']
+
+
+    def compacted_file_to_mtime_ns():
+        return {str(path.relative_to(compacted_dir)): path.stat().st_mtime_ns
+                for path in compacted_dir.rglob('*.parquet')}
+
+
+    # case: nothing changed -> nothing rewritten
+    old_file_to_mtime_ns = compacted_file_to_mtime_ns()
+    compact_hub(tmp_path, partition_by_round=True)
+    assert compacted_file_to_mtime_ns() == old_file_to_mtime_ns
+
+    # case: one model gains a file, another loses one -> only those are rewritten
+    forecasts_dir = tmp_path / 'forecasts'
+    shutil.copy(forecasts_dir / 'umass-ens' / '2023-05-08-umass-ens.csv',
+                forecasts_dir / 'umass-ens' / '2023-05-08-umass-ens-copy.csv')  # same forecast_date
+    (forecasts_dir / 'hub-ensemble' / '2023-05-01-hub-ensemble.arrow').unlink()
+    compact_hub(tmp_path, partition_by_round=True)
+    new_file_to_mtime_ns = compacted_file_to_mtime_ns()
+    assert {file: mtime_ns for file, mtime_ns in new_file_to_mtime_ns.items() if 'hub-baseline' in file} == \
+           {file: mtime_ns for file, mtime_ns in old_file_to_mtime_ns.items() if 'hub-baseline' in file}
+    assert new_file_to_mtime_ns['model_id=umass-ens/forecast_date=2023-05-08/part-0.parquet'] != \
+           old_file_to_mtime_ns['model_id=umass-ens/forecast_date=2023-05-08/part-0.parquet']
+    assert 'model_id=hub-ensemble/forecast_date=2023-05-01/part-0.parquet' not in new_file_to_mtime_ns
+    assert _sorted_table(connect_hub(tmp_path, prefer_compacted=True).to_table()) == \
+           _sorted_table(connect_hub(tmp_path).to_table())
+
+    # case: a modified file and a removed model directory
+    old_file_to_mtime_ns = new_file_to_mtime_ns
+    with open(forecasts_dir / 'hub-baseline' / '2023-04-24-hub-baseline.csv', 'a') as csv_fp:
+        csv_fp.write('2023-04-24,1,wk ahead inc flu hosp,2023-05-01,US,mean,NA,42\n')
+    shutil.rmtree(forecasts_dir / 'umass-ens')
+    compact_hub(tmp_path, partition_by_round=True)
+    new_file_to_mtime_ns = compacted_file_to_mtime_ns()
+    assert not any('umass-ens' in file for file in new_file_to_mtime_ns)
+    assert new_file_to_mtime_ns['model_id=hub-ensemble/forecast_date=2023-05-08/part-0.parquet'] == \
+           old_file_to_mtime_ns['model_id=hub-ensemble/forecast_date=2023-05-08/part-0.parquet']
+    assert _sorted_table(connect_hub(tmp_path, prefer_compacted=True).to_table()) == \
+           _sorted_table(connect_hub(tmp_path).to_table())
+
+    # case: different options -> full rewrite
+    compact_hub(tmp_path)
+    with open(compacted_dir / COMPACTION_METADATA_FILE_NAME) as metadata_fp:
+        assert json.load(metadata_fp)['options']['partition_cols'] == ['model_id']
+    assert sorted(compacted_file_to_mtime_ns()) == ['model_id=hub-baseline/part-0.parquet',
+                                                    'model_id=hub-ensemble/part-0.parquet']
@@ -2,13 +2,17 @@ import datetime
 import json
 import os
 import shutil
+import time
 from pathlib import Path
 
 import pyarrow as pa
 import pyarrow.compute as pc
 import pytest
 
-from hubdata import connect_hub, create_hub_schema
+from hubdata import compact_hub, connect_hub, create_hub_schema, manifest_cache
+from hubdata.connect_hub import _round_id_scalar, _round_ids
+from hubdata.manifest_cache import DEFAULT_LISTING_TTL
+from hubdata.query import query_expression
 
 
 def test_hub_path_existence():
@@ -174,6 +178,48 @@ def test_to_table():
     assert table1 == table2
 
 
+def test_iter_batches():
+    hub_connection = connect_hub(Path('test/hubs/flu-metrocast'))
+    batches = list(hub_connection.iter_batches(batch_size=500, readahead=2))
+    assert all(batch.schema == hub_connection.schema for batch in batches)
+    assert max(len(batch) for batch in batches) <= 500
+    assert pa.Table.from_batches(batches).sort_by('value') == hub_connection.to_table().sort_by('value')
+
+    # case: columns and filter
+    batches = list(hub_connection.iter_batches(columns=['horizon', 'value'], filter=pc.field('horizon') == 1))
+    assert all(batch.schema == pa.schema([('horizon', pa.int32()), ('value', pa.float64())]) for batch in batches)
+    assert sum(len(batch) for batch in batches) \
+           == hub_connection.to_table(filter=pc.field('horizon') == 1).num_rows
+
+    # case: invalid args
+    with pytest.raises(ValueError, match='must be positive'):
+        hub_connection.iter_batches(batch_size=0)
+
+
+def test_query():
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'))
+    scanner = hub_connection.query(columns=['model_id', 'horizon', 'value'], model_id=['hub-ensemble', 'UMass-gbq'],
+                                   output_type='quantile', forecast_date='2023-05-08', horizon=range(1, 3))
+    assert isinstance(scanner, pa.dataset.Scanner)
+    exp_table = hub_connection.to_table(columns=['model_id', 'horizon', 'value'],
+                                        filter=(pc.field('model_id').isin(['hub-ensemble', 'UMass-gbq'])
+                                                & (pc.field('output_type') == 'quantile')
+                                                & (pc.field('forecast_date') == datetime.date(2023, 5, 8))
+                                                & pc.field('horizon').isin([1, 2])))
+    act_table = scanner.to_table()
+    assert act_table.num_rows == exp_table.num_rows > 0
+    assert act_table.sort_by('value') == exp_table.sort_by('value')
+
+    # the compiled expression prunes by model_id and forecast_date (from file names) without opening files
+    filter_expr = query_expression(hub_connection.schema,
+                                   {'model_id': ['hub-ensemble', 'UMass-gbq'], 'forecast_date': '2023-05-08'})
+    assert [Path(fragment.path).name for fragment in hub_connection.get_dataset().get_fragments(filter=filter_expr)] \
+           == ['2023-05-08-hub-ensemble.parquet']
+
+    with pytest.raises(ValueError, match='cannot convert forecast_date value'):
+        hub_connection.query(forecast_date='not a date')
+
+
 def test_get_dataset_returned_class():
     hub_connection = connect_hub(Path('test/hubs/flu-metrocast'))  # only .csv -> a FileSystemDataset
     hub_ds = hub_connection.get_dataset()
@@ -198,16 +244,267 @@ def test__list_model_out_files():
              '2023-05-08-hub-baseline.parquet', '2023-05-08-hub-ensemble.parquet', '2023-05-08-umass-ens.csv',
              'README.md', 'invalid.txt'])
 
-    for file_format, exp_invalid in (
-            ('csv', ['2023-05-01-hub-ensemble.arrow', '2023-05-08-hub-baseline.parquet',
-                     '2023-05-08-hub-ensemble.parquet', 'README.md', 'invalid.txt']),
-            ('parquet', ['2023-04-24-hub-baseline.csv', '2023-04-24-hub-ensemble.csv', '2023-05-01-hub-baseline.csv',
-                         '2023-05-01-hub-ensemble.arrow', '2023-05-01-umass-ens.csv', '2023-05-08-umass-ens.csv',
-                         'README.md', 'invalid.txt']),
-            ('arrow', ['2023-04-24-hub-baseline.csv', '2023-04-24-hub-ensemble.csv', '2023-05-01-hub-baseline.csv',
-                       '2023-05-01-umass-ens.csv', '2023-05-08-hub-baseline.parquet', '2023-05-08-hub-ensemble.parquet',
-                       '2023-05-08-umass-ens.csv', 'README.md', 'invalid.txt'])):
-        invalid_format_files = hub_connection._list_invalid_format_files(model_out_files, file_format,
-                                                                         ['README', '.DS_Store'])
-        invalid_format_files_clean = [_ for _ in invalid_format_files if not _.base_name.startswith('.DS_Store')]
-        assert sorted([_.base_name for _ in invalid_format_files_clean]) == exp_invalid
+    file_format_to_files, unopened_files = hub_connection._group_files_by_format(model_out_files,
+                                                                                 ['csv', 'parquet', 'arrow'],
+                                                                                 ['README', '.DS_Store'])
+    assert {file_format: [_.base_name for _ in format_files]
+            for file_format, format_files in file_format_to_files.items()} == {
+        'csv': ['2023-04-24-hub-baseline.csv', '2023-05-01-hub-baseline.csv', '2023-04-24-hub-ensemble.csv',
+                '2023-05-01-umass-ens.csv', '2023-05-08-umass-ens.csv'],
+        'parquet': ['2023-05-08-hub-baseline.parquet', '2023-05-08-hub-ensemble.parquet'],
+        'arrow': ['2023-05-01-hub-ensemble.arrow']}
+    assert [_.base_name for _ in unopened_files] == ['invalid.txt']
+
+    # case: file_formats not including all present extensions
+    file_format_to_files, unopened_files = hub_connection._group_files_by_format(model_out_files, ['parquet'],
+                                                                                 ['README', '.DS_Store'])
+    assert list(file_format_to_files.keys()) == ['parquet']
+    assert len(file_format_to_files['parquet']) == 2
+    assert sorted([_.base_name for _ in unopened_files]) == [
+        '2023-04-24-hub-baseline.csv', '2023-04-24-hub-ensemble.csv', '2023-05-01-hub-baseline.csv',
+        '2023-05-01-hub-ensemble.arrow', '2023-05-01-umass-ens.csv', '2023-05-08-umass-ens.csv', 'invalid.txt']
+
+
+def test_get_dataset_cache_dir(tmp_path):
+    hub_path = tmp_path / 'hub'
+    cache_dir = tmp_path / 'cache'
+    shutil.copytree('test/hubs/v4_flusight', hub_path)
+
+    # case: cached dataset has the same files and data as the uncached one, and a manifest was written
+    uncached_ds = connect_hub(hub_path).get_dataset()
+    hub_connection = connect_hub(hub_path, cache_dir=cache_dir)
+    cached_ds = hub_connection.get_dataset()
+    assert isinstance(cached_ds, pa.dataset.UnionDataset)
+    assert (sorted([file for child in cached_ds.children for file in child.files]) ==
+            sorted([file for child in uncached_ds.children for file in child.files]))
+    sort_keys = [(col_name, 'ascending') for col_name in hub_connection.schema.names]
+    assert cached_ds.to_table().sort_by(sort_keys) == uncached_ds.to_table().sort_by(sort_keys)
+    manifest_files = list((cache_dir / 'manifests').iterdir())
+    assert len(manifest_files) == 1
+    with open(manifest_files[0]) as manifest_fp:
+        manifest = json.load(manifest_fp)
+    assert sorted(manifest['dirs'].keys()) == ['hub-baseline', 'hub-ensemble', 'umass-ens']
+
+    # case: a new file is picked up via the refreshed model directory, while unchanged directories are reused as-is
+    umass_ens_dir = hub_path / 'forecasts' / 'umass-ens'
+    shutil.copy(umass_ens_dir / '2023-05-08-umass-ens.csv', umass_ens_dir / '2023-05-15-umass-ens.csv')
+    os.utime(umass_ens_dir, ns=(0, manifest['dirs']['umass-ens']['mtime_ns'] + 1))  # in case of coarse mtimes
+    cached_ds = connect_hub(hub_path, cache_dir=cache_dir).get_dataset()
+    assert cached_ds.count_rows() == uncached_ds.count_rows() + 5
+    with open(manifest_files[0]) as manifest_fp:
+        new_manifest = json.load(manifest_fp)
+    assert new_manifest['dirs']['hub-baseline'] == manifest['dirs']['hub-baseline']
+    assert len(new_manifest['dirs']['umass-ens']['files']) == len(manifest['dirs']['umass-ens']['files']) + 1
+
+    # case: a removed model directory is dropped
+    shutil.rmtree(umass_ens_dir)
+    cached_ds = connect_hub(hub_path, cache_dir=cache_dir).get_dataset()
+    assert pc.unique(cached_ds.to_table()['model_id']).to_pylist() == ['hub-baseline', 'hub-ensemble']
+
+
+def test_get_dataset_cache_dir_listing_ttl(tmp_path, monkeypatch):
+    hub_path = tmp_path / 'hub'
+    shutil.copytree('test/hubs/v4_flusight', hub_path)
+    walked_dirs = []
+    orig_list_dirs_files = manifest_cache.list_dirs_files
+
+
+    def list_dirs_files(filesystem, dir_paths, concurrency=None):
+        walked_dirs.extend(Path(dir_path).name for dir_path in dir_paths)
+        return orig_list_dirs_files(filesystem, dir_paths, concurrency)
+
+
+    def listed_sizes(listing_ttl=DEFAULT_LISTING_TTL):
+        walked_dirs.clear()
+        return {Path(file_info.path).name: file_info.size for file_info in
+                connect_hub(hub_path, cache_dir=tmp_path / 'cache', listing_ttl=listing_ttl)._list_model_out_files()}
+
+
+    monkeypatch.setattr(manifest_cache, 'list_dirs_files', list_dirs_files)
+
+    # case: the first listing walks every model directory, and later ones within the ttl walk none of them
+    exp_sizes = listed_sizes()
+    assert sorted(walked_dirs) == ['hub-baseline', 'hub-ensemble', 'umass-ens']
+    assert listed_sizes() == exp_sizes
+    assert walked_dirs == []
+
+    # case: a file modified in place (which does not change its model directory's mtime) has its old size until the
+    # ttl expires, or with a ttl of 0
+    umass_ens_dir = hub_path / 'forecasts' / 'umass-ens'
+    csv_file = umass_ens_dir / '2023-05-08-umass-ens.csv'
+    umass_ens_mtime_ns = umass_ens_dir.stat().st_mtime_ns
+    with open(csv_file, 'a') as csv_fp:
+        csv_fp.write(csv_file.read_text().splitlines(keepends=True)[-1])  # duplicate the last row
+    assert umass_ens_dir.stat().st_mtime_ns == umass_ens_mtime_ns
+    assert listed_sizes()[csv_file.name] == exp_sizes[csv_file.name] < csv_file.stat().st_size
+    assert walked_dirs == []
+    assert listed_sizes(listing_ttl=0)[csv_file.name] == csv_file.stat().st_size
+    assert sorted(walked_dirs) == ['hub-baseline', 'hub-ensemble', 'umass-ens']
+
+    # case: a file added to a model directory changes its mtime on a local file system, so only it is re-walked
+    shutil.copy(csv_file, umass_ens_dir / '2023-05-15-umass-ens.csv')
+    os.utime(umass_ens_dir, ns=(0, umass_ens_mtime_ns + 1))  # in case of coarse mtimes
+    assert '2023-05-15-umass-ens.csv' in listed_sizes()
+    assert walked_dirs == ['umass-ens']
+
+    # case: the ttl expired
+    now = time.time()
+    monkeypatch.setattr(manifest_cache.time, 'time', lambda: now + DEFAULT_LISTING_TTL)
+    listed_sizes()
+    assert sorted(walked_dirs) == ['hub-baseline', 'hub-ensemble', 'umass-ens']
+
+
+def test_get_dataset_exclude_invalid_files(tmp_path):
+    shutil.copytree('test/hubs/simple', tmp_path, dirs_exist_ok=True)
+    with open(tmp_path / 'model-output' / 'hub-baseline' / '2022-10-22-hub-baseline.parquet', 'w') as fp:
+        fp.write('not a parquet file')
+
+    hub_connection = connect_hub(tmp_path)
+    assert len(hub_connection.get_dataset().children[1].files) == 2  # included by default, failing at scan time
+    hub_ds = hub_connection.get_dataset(exclude_invalid_files=True)
+    assert [Path(file).name for child in hub_ds.children for file in child.files] == [
+        '2022-10-01-hub-baseline.csv', '2022-10-08-hub-baseline.csv', '2022-10-08-team1-goodmodel.csv',
+        '2022-10-15-hub-baseline.parquet']
+
+
+def test_get_dataset_round_partition_pruning(tmp_path):
+    shutil.copytree('test/hubs/v6_target_file', tmp_path, dirs_exist_ok=True)  # round ID column: reference_date
+    hub_ds = connect_hub(tmp_path).get_dataset()
+    assert ({str(fragment.partition_expression) for fragment in hub_ds.get_fragments()
+             if Path(fragment.path).name == '2022-10-22-PSI-DICE.csv'} ==
+            {'((model_id == "PSI-DICE") and (reference_date == 2022-10-22))'})
+
+    # corrupt all 2022-10-22 files. filtering on the other round still works because those files are never opened
+    for csv_file in (tmp_path / 'model-output').glob('*/2022-10-22-*.csv'):
+        csv_file.write_text('not,a\nvalid,"csv')
+    round_filter = pc.field('reference_date') == datetime.date(2022, 11, 19)
+    assert len(list(hub_ds.get_fragments(filter=round_filter))) == 3
+    table = hub_ds.to_table(filter=round_filter)
+    assert pc.unique(table['reference_date']).to_pylist() == [datetime.date(2022, 11, 19)]
+    assert sorted(pc.unique(table['model_id']).to_pylist()) == ['Flusight-baseline', 'MOBS-GLEAM_FLUH', 'PSI-DICE']
+
+    # case: file not following the naming convention -> only the model_id partition
+    model_dir = tmp_path / 'model-output' / 'PSI-DICE'
+    shutil.move(model_dir / '2022-11-19-PSI-DICE.csv', model_dir / 'forecast.csv')
+    hub_ds = connect_hub(tmp_path).get_dataset()
+    assert ({str(fragment.partition_expression) for fragment in hub_ds.get_fragments()
+             if Path(fragment.path).name == 'forecast.csv'} == {'(model_id == "PSI-DICE")'})
+
+
+def test__round_id_scalar_memoized():
+    # `_round_id_scalar()` is called once per file by `_partition_expression()`, so it must be memoized, and
+    # `_round_ids()` must not be, lest it keep datasets (and their fragments) alive
+    _round_id_scalar.cache_clear()
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'))  # 6 files in 2 rounds
+    hub_connection.get_dataset()
+    cache_info = _round_id_scalar.cache_info()
+    assert (cache_info.misses, cache_info.hits) == (2, 4)
+    assert not hasattr(_round_ids, 'cache_info')
+    assert _round_ids(hub_connection.get_dataset(), 'reference_date') \
+           == [datetime.date(2022, 10, 22), datetime.date(2022, 11, 19)]
+
+
+@pytest.mark.parametrize('list_concurrency', [None, 1, 4])
+def test__list_model_out_files_concurrency(tmp_path, list_concurrency):
+    exp_paths = sorted([file_info.path for file_info in connect_hub(Path('test/hubs/v4_flusight'))
+                       ._list_model_out_files()])
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'), list_concurrency=list_concurrency)
+    assert sorted([file_info.path for file_info in hub_connection._list_model_out_files()]) == exp_paths
+    assert hub_connection.get_dataset().count_rows() == 292
+
+    # also via the manifest cache
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'), cache_dir=tmp_path,
+                                 list_concurrency=list_concurrency)
+    assert sorted([file_info.path for file_info in hub_connection._list_model_out_files()]) == exp_paths
+
+
+def test_lazy_connection():
+    # case: invalid hub -> no error until first use
+    hub_connection = connect_hub(Path('test/hubs/example-complex-forecast-hub') / 'nonexistent-dir', lazy=True)
+    with pytest.raises(RuntimeError, match='admin.json or tasks.json not found'):
+        _ = hub_connection.tasks
+
+    # case: valid hub -> nothing read until first use, then everything matches an eager connection
+    hub_path = Path('test/hubs/example-complex-scenario-hub')
+    hub_connection = connect_hub(hub_path, lazy=True)
+    assert hub_connection._hub_config is None
+    assert 'schema' not in vars(hub_connection)
+    eager_connection = connect_hub(hub_path)
+    assert hub_connection.admin == eager_connection.admin
+    assert hub_connection._hub_config is not None
+    assert hub_connection.tasks == eager_connection.tasks
+    assert hub_connection.model_metadata_schema == eager_connection.model_metadata_schema
+    assert hub_connection.schema == eager_connection.schema
+    assert hub_connection.model_output_dir == eager_connection.model_output_dir
+    assert hub_connection.schema is hub_connection.schema  # cached
+
+
+def test_csv_file_format(tmp_path):
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'), csv_block_size=4096, csv_use_threads=False)
+    hub_ds = hub_connection.get_dataset()
+    scan_options = [child_ds.format for child_ds in hub_ds.children
+                    if child_ds.format.default_extname == 'csv'][0].default_fragment_scan_options
+    assert scan_options.convert_options.column_types == {field.name: field.type for field in hub_connection.schema}
+    assert (scan_options.read_options.block_size, scan_options.read_options.use_threads) == (4096, False)
+
+    # by default, CSV string columns keep "NA", while the hub's parquet files have nulls
+    table = hub_ds.to_table(columns=['output_type', 'output_type_id'], filter=pc.field('output_type') == 'mean')
+    assert table.num_rows == 6
+    assert table['output_type_id'].null_count == 2
+    assert table['output_type_id'].drop_null().to_pylist() == ['NA'] * 4
+
+    # with csv_na_as_null, "NA" and "" are null in CSV files, as they are in the hub's parquet and arrow ones
+    hub_ds = connect_hub(Path('test/hubs/v4_flusight'), csv_na_as_null=True).get_dataset()
+    table = hub_ds.to_table(columns=['output_type', 'output_type_id'], filter=pc.field('output_type') == 'mean')
+    assert table.num_rows == 6
+    assert table['output_type_id'].null_count == 6
+
+    # dictionary columns are parsed directly into dictionaries
+    shutil.copytree('test/hubs/flu-metrocast', tmp_path, dirs_exist_ok=True)
+    hub_connection = connect_hub(tmp_path)
+    dict_schema = pa.schema([field.with_type(pa.dictionary(pa.int32(), pa.string()))
+                             if field.name in ['target', 'location', 'output_type'] else field
+                             for field in hub_connection.schema])
+    hub_connection.__dict__['schema'] = dict_schema  # NB: overrides the cached_property
+    table = hub_connection.to_table()
+    assert table.schema == dict_schema
+    sort_keys = [(col_name, 'ascending') for col_name in table.column_names]
+    assert table.cast(connect_hub(tmp_path).schema).sort_by(sort_keys) \
+           == connect_hub(tmp_path).to_table().sort_by(sort_keys)
+
+
+def test_categorical(tmp_path):
+    # v4_flusight has csv, parquet, and arrow files, each of which is read into the same dictionary columns
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'), categorical='auto')
+    dict_col_names = [field.name for field in hub_connection.schema if pa.types.is_dictionary(field.type)]
+    assert dict_col_names == ['target', 'location', 'output_type', 'model_id']
+    table = hub_connection.to_table()
+    assert table.schema == hub_connection.schema
+    for col_name in dict_col_names:  # one dictionary per column
+        assert len({tuple(chunk.dictionary.to_pylist()) for chunk in table[col_name].chunks}) == 1
+    sort_keys = [(col_name, 'ascending') for col_name in table.column_names]
+    exp_table = connect_hub(Path('test/hubs/v4_flusight')).to_table()
+    assert table.cast(exp_table.schema).sort_by(sort_keys) == exp_table.sort_by(sort_keys)
+
+    # group-bys, aggregations, queries, and partition pruning work as with plain strings
+    act_counts = table.group_by(['model_id', 'output_type']).aggregate([('value', 'count')]).to_pylist()
+    exp_counts = exp_table.group_by(['model_id', 'output_type']).aggregate([('value', 'count')]).to_pylist()
+    assert sorted(act_counts, key=str) == sorted(exp_counts, key=str)
+    act_table = hub_connection.aggregate([('value', 'count')], group_by=['model_id'],
+                                         filter=pc.field('output_type') == 'quantile')
+    assert act_table.schema.field('model_id').type == hub_connection.schema.field('model_id').type
+    assert dict(zip(act_table['model_id'].to_pylist(), act_table['value_count'].to_pylist())) \
+           == {'hub-baseline': 138, 'hub-ensemble': 138}
+    assert hub_connection.query(model_id=['hub-ensemble', 'umass-ens'], location='US').to_table().num_rows \
+           == exp_table.filter(pc.field('model_id').isin(['hub-ensemble', 'umass-ens'])
+                               & (pc.field('location') == 'US')).num_rows > 0
+    filter_expr = query_expression(hub_connection.schema, {'model_id': 'hub-ensemble', 'forecast_date': '2023-05-08'})
+    assert [Path(fragment.path).name for fragment in hub_connection.get_dataset().get_fragments(filter=filter_expr)] \
+           == ['2023-05-08-hub-ensemble.parquet']
+
+    # compacted mirrors are read into the same dictionary columns (schemas compare equal regardless of categorical)
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)
+    compact_hub(tmp_path, partition_by_round=True)
+    hub_connection = connect_hub(tmp_path, prefer_compacted=True, categorical='auto')
+    assert hub_connection.get_dataset().files[0].startswith(hub_connection.compacted_dir)
+    assert hub_connection.to_table().cast(exp_table.schema).sort_by(sort_keys) == exp_table.sort_by(sort_keys)
@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 from pathlib import Path
@@ -106,6 +107,12 @@ def test_v6_target_dir():
                                                                  'wk flu hosp rate category']
     assert ts_ds.schema == create_target_data_schema(hub_path, TargetType.ORACLE_OUTPUT)
 
+    # test iter_batches()
+    batches = list(td_conn.iter_batches(batch_size=100))
+    assert max(len(batch) for batch in batches) <= 100
+    assert sum(len(batch) for batch in batches) == 627
+    assert all(batch.schema == ts_ds.schema for batch in batches)
+
 
 def test_v6_target_file_hub():
     hub_path = Path('test/hubs/v6_target_file')  # target-data/oracle-output.csv
@@ -135,3 +142,57 @@ def test_v6_target_file_parquet(tmp_path):
     assert ts_ds.count_rows() == 627
     assert pc.unique(ts_ds.to_table()['target']).to_pylist() == ['wk flu hosp rate', 'wk flu hosp rate category',
                                                                  'wk inc flu hosp']
+
+
+@pytest.mark.parametrize('hub_dir', ['v6_target_dir', 'v6_target_file'])
+def test_categorical(hub_dir):
+    # v6_target_dir's oracle output is partitioned by `output_type`, and v6_target_file's is one csv file
+    hub_path = Path('test/hubs') / hub_dir
+    hub_connection = HubConnection(hub_path, categorical='auto')
+    target_data_conn = connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT)  # inherits `categorical`
+    assert target_data_conn.schema == create_target_data_schema(hub_path, TargetType.ORACLE_OUTPUT, categorical='auto')
+    assert [field.name for field in target_data_conn.schema if pa.types.is_dictionary(field.type)] \
+           == ['target', 'location', 'output_type']
+    assert create_target_data_schema(hub_connection, TargetType.ORACLE_OUTPUT, categorical='none') \
+           == create_target_data_schema(hub_path, TargetType.ORACLE_OUTPUT)
+
+    table = target_data_conn.to_table()
+    assert table.schema == target_data_conn.schema
+    exp_table = connect_target_data(hub_path, TargetType.ORACLE_OUTPUT).to_table()
+    sort_keys = [(col_name, 'ascending') for col_name in table.column_names]
+    assert table.cast(exp_table.schema).sort_by(sort_keys) == exp_table.sort_by(sort_keys)
+    assert target_data_conn.to_table(filter=pc.field('output_type') == 'quantile').num_rows \
+           == exp_table.filter(pc.field('output_type') == 'quantile').num_rows > 0
+
+
+def test_as_of_null_output_type_ids(tmp_path):
+    # versioned parquet oracle output whose mean, median, quantile, and sample rows have null `output_type_id`s: an
+    # older wrong version and a newer correct one
+    shutil.copytree('test/hubs/v6_target_file', tmp_path, dirs_exist_ok=True)
+    oracle_table = csv.read_csv(tmp_path / 'target-data/oracle-output.csv')
+    type_id_index = oracle_table.schema.get_field_index('output_type_id')
+    oracle_table = oracle_table.set_column(type_id_index, 'output_type_id',
+                                           pc.if_else(pc.equal(oracle_table['output_type_id'], ''), None,
+                                                      oracle_table['output_type_id']))
+    assert oracle_table['output_type_id'].null_count == 99
+    old_table = oracle_table.set_column(oracle_table.schema.get_field_index('oracle_value'), 'oracle_value',
+                                        pc.add(oracle_table['oracle_value'], 1000))
+    parquet.write_table(pa.concat_tables([
+        table.append_column('as_of', pc.cast(pa.array([as_of] * len(oracle_table)), pa.date32()))
+        for table, as_of in [(old_table, '2022-12-01'), (oracle_table, '2022-12-08')]]),
+        tmp_path / 'target-data/oracle-output.parquet')
+    os.remove(tmp_path / 'target-data/oracle-output.csv')
+    with open(tmp_path / 'hub-config/target-data.json') as fp:
+        target_data = json.load(fp)
+    with open(tmp_path / 'hub-config/target-data.json', 'w') as fp:
+        json.dump(target_data | {'versioned': True}, fp)
+
+    target_data_conn = connect_target_data(tmp_path, TargetType.ORACLE_OUTPUT)
+    assert target_data_conn.to_table().num_rows == 1254
+    for date, offset in [(None, 0), ('2022-12-08', 0), ('2022-12-01', 1000)]:
+        as_of_table = target_data_conn.as_of(date)
+        assert as_of_table.num_rows == 627  # null `output_type_id`s match each other
+        assert as_of_table['output_type_id'].null_count == 99
+        assert pc.count(as_of_table.filter(pc.field('output_type') == 'mean')['oracle_value']).as_py() > 0
+        assert sorted(as_of_table['oracle_value'].to_pylist()) \
+               == sorted(value + offset for value in oracle_table['oracle_value'].to_pylist())
@@ -1,10 +1,13 @@
+import datetime
 import os
 import shutil
+import sys
 from pathlib import Path
 
 import pyarrow as pa
 import pyarrow.compute as pc
 import pyarrow.csv as csv
+import pyarrow.dataset as ds
 import pyarrow.parquet as parquet
 import pytest
 
@@ -123,3 +126,56 @@ def test_v6_target_file_parquet(tmp_path):
     assert ts_ds.to_table().column_names == ['target_end_date', 'target', 'location', 'observation']
     assert ts_ds.count_rows() == 66
     assert pc.unique(ts_ds.to_table()['target']).to_pylist() == ['wk inc flu hosp', 'wk flu hosp rate']
+
+
+def test_connect_target_data_reuses_hub_connection(monkeypatch):
+    def connect_hub_fails(*args, **kwargs):
+        raise AssertionError('connect_hub() should not be called')
+
+
+    # NB: `hubdata.create_target_data_schema` is shadowed by the function of the same name, so get the module directly
+    monkeypatch.setattr(sys.modules['hubdata.create_target_data_schema'], 'connect_hub', connect_hub_fails)
+    hub_path = Path('test/hubs/v6_target_file')
+    td_conn = connect_target_data(hub_path, TargetType.TIME_SERIES)
+    assert td_conn.schema == create_target_data_schema(td_conn.hub_conn, TargetType.TIME_SERIES)
+
+
+def test_as_of(tmp_path):
+    # flu-metrocast's time-series.csv is versioned, with as_of dates 2025-02-03 through 2025-02-25
+    def exp_as_of_rows(date):  # the newest row per observation in the full table
+        key_to_row = {}
+        for row in ts_table.to_pylist():
+            key = (row['target'], row['target_end_date'], row['location'])
+            if ((date is None) or (row['as_of'] <= date)) and \
+                    ((key not in key_to_row) or (row['as_of'] > key_to_row[key]['as_of'])):
+                key_to_row[key] = row
+        return [key_to_row[key] for key in sorted(key_to_row)]
+
+
+    target_data_conn = connect_target_data(Path('test/hubs/flu-metrocast'), TargetType.TIME_SERIES)
+    ts_table = target_data_conn.to_table()
+    for date, exp_num_rows in [(None, 43), ('2025-02-12', 19), (datetime.date(2025, 2, 3), 7), ('2025-01-01', 0)]:
+        as_of_table = target_data_conn.as_of(date)
+        assert as_of_table.schema == target_data_conn.schema
+        assert as_of_table.num_rows == exp_num_rows
+        assert as_of_table.to_pylist() == exp_as_of_rows(datetime.date.fromisoformat(date) if isinstance(date, str)
+                                                         else date)
+
+    # case: partitioned by as_of. versions after `date` are never read: corrupt the newest one to show it
+    shutil.copytree('test/hubs/flu-metrocast', tmp_path, dirs_exist_ok=True)
+    os.remove(tmp_path / 'target-data/time-series.csv')
+    ds.write_dataset(ts_table, tmp_path / 'target-data/time-series', format='parquet',
+                     partitioning=ds.partitioning(pa.schema([('as_of', pa.date32())]), flavor='hive'))
+    target_data_conn = connect_target_data(tmp_path, TargetType.TIME_SERIES)
+    assert target_data_conn.as_of().to_pylist() == exp_as_of_rows(None)
+    for parquet_file in (tmp_path / 'target-data/time-series/as_of=2025-02-25').glob('*.parquet'):
+        parquet_file.write_text('not parquet')
+    assert target_data_conn.as_of('2025-02-18').to_pylist() == exp_as_of_rows(datetime.date(2025, 2, 18))
+
+    # case: not versioned
+    with pytest.raises(ValueError, match='time-series target data is not versioned'):
+        connect_target_data(Path('test/hubs/v6_target_file'), TargetType.TIME_SERIES).as_of()
+
+    # case: invalid date
+    with pytest.raises(ValueError, match='cannot convert as_of value'):
+        target_data_conn.as_of('last week')
@@ -1,11 +1,19 @@
 import json
+import sys
 from pathlib import Path
 
 import pyarrow as pa
 import pytest
 
 from hubdata import connect_hub, create_hub_schema
-from hubdata.create_hub_schema import _pa_type_for_req_and_opt_vals, _pa_type_simplest_for_pa_types
+from hubdata.create_hub_schema import (
+    CATEGORICAL_PA_TYPE,
+    _clear_schema_cache,
+    _pa_type_for_req_and_opt_vals,
+    _pa_type_for_vals_per_value,
+    _pa_type_simplest_for_pa_types,
+    _schema_key,
+)
 
 
 @pytest.mark.parametrize('required,optional,exp_pa_type',
@@ -20,6 +28,42 @@ def tests__pa_type_for_req_and_opt_vals(required, optional, exp_pa_type):
     assert _pa_type_for_req_and_opt_vals(required, optional) == exp_pa_type
 
 
+@pytest.mark.parametrize('values',
+                         [['2024-11-16', 'NA', '2024-11-23'],  # NA ignored
+                          ['2023-02-29'], ['2024-02-29'], ['2023-13-01'], ['0000-01-01'], ['0001-01-01'],  # bad dates
+                          ['20230101', '2023-W01', '2023W011', '2023-W01-1'], ['2023-1-1'], ['2023-01-01 '],  # ISO
+                          ['00001', '01', 'US'],  # location codes
+                          ['1', '1.5'], [1, 2.5], [1.5, True], [True, False], [1, True],  # numbers, bools
+                          [1, 'NA'], [1, None], [None], ['NA', None], [2 ** 70], [[1], [2]], [{'a': 1}]])  # misc
+def test__pa_type_for_req_and_opt_vals_batched(values, monkeypatch):
+    # the batched (Arrow) path must give exactly the per-value result
+    monkeypatch.setattr(sys.modules['hubdata.create_hub_schema'], 'BATCH_INFERENCE_MIN_VALUES', 0)
+    assert _pa_type_for_req_and_opt_vals(values, None) == _pa_type_for_vals_per_value(values)
+
+
+def test__pa_type_for_req_and_opt_vals_test_hubs(monkeypatch):
+    # differential test: the batched and per-value paths agree on every value list in every test hub's tasks.json
+    monkeypatch.setattr(sys.modules['hubdata.create_hub_schema'], 'BATCH_INFERENCE_MIN_VALUES', 0)
+    tasks_files = sorted(Path('test/hubs').glob('*/hub-config/tasks.json')) \
+        + sorted(Path('test/configs').glob('*.json'))
+    num_value_lists = 0
+    for tasks_file in tasks_files:
+        with open(tasks_file) as fp:
+            tasks = json.load(fp)
+        for the_round in tasks['rounds']:
+            for model_task in the_round['model_tasks']:
+                req_opt_dicts = list(model_task['task_ids'].values()) \
+                    + [output_type_value['output_type_id'] for output_type_value in model_task['output_type'].values()
+                       if 'output_type_id' in output_type_value]
+                for req_opt_dict in req_opt_dicts:
+                    required, optional = req_opt_dict.get('required'), req_opt_dict.get('optional')
+                    values = (required if required else []) + (optional if optional else [])
+                    exp_pa_type = _pa_type_for_vals_per_value(values) if values else None
+                    assert _pa_type_for_req_and_opt_vals(required, optional) == exp_pa_type, (tasks_file, values)
+                    num_value_lists += 1
+    assert num_value_lists > 300  # sanity check that we found the hubs
+
+
 @pytest.mark.parametrize('pa_types,exp_pa_type',
                          [([pa.float64(), pa.string()], pa.string()),  # string overrides float -> string
                           ([pa.float64(), pa.string(), None], pa.string()),  # "", None no influence -> string
@@ -171,6 +215,81 @@ def test_output_type_id_datatype(hub_datatype, exp_pa_type):
     assert act_schema.field('output_type_id').type == exp_pa_type
 
 
+def test_categorical(monkeypatch):
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'))
+    act_schema = create_hub_schema(hub_connection.tasks, categorical='auto')
+    exp_schema = pa.schema([('forecast_date', pa.date32()),
+                            ('target', CATEGORICAL_PA_TYPE),
+                            ('horizon', pa.int32()),
+                            ('target_date', pa.date32()),
+                            ('location', CATEGORICAL_PA_TYPE),
+                            ('output_type', CATEGORICAL_PA_TYPE),
+                            ('output_type_id', pa.string()),  # NB: not a task ID
+                            ('value', pa.float64()),
+                            ('model_id', CATEGORICAL_PA_TYPE)])
+    assert act_schema == exp_schema
+    assert create_hub_schema(hub_connection.tasks) == connect_hub(Path('test/hubs/v4_flusight')).schema  # 'none'
+
+    # case: a task ID that's open (no required or optional values) in any model task is not categorical
+    tasks = json.loads(json.dumps(hub_connection.tasks))
+    tasks['rounds'][0]['model_tasks'][0]['task_ids']['target'] = {'required': None, 'optional': None}
+    assert create_hub_schema(tasks, categorical='auto').field('target').type == pa.string()
+
+    # case: too many values
+    monkeypatch.setattr(sys.modules['hubdata.create_hub_schema'], 'CATEGORICAL_MAX_VALUES', 2)
+    act_schema = create_hub_schema(hub_connection.tasks, categorical='auto', partitions=None)
+    assert act_schema.field('target').type == CATEGORICAL_PA_TYPE  # 1 value
+    assert act_schema.field('location').type == pa.string()  # 54 values
+    assert 'model_id' not in act_schema.names
+
+    with pytest.raises(ValueError, match="invalid categorical='yes'"):
+        create_hub_schema(hub_connection.tasks, categorical='yes')
+    with pytest.raises(ValueError, match="invalid categorical='yes'"):
+        connect_hub(Path('test/hubs/v4_flusight'), categorical='yes')
+
+
+def test_schema_cache(tmp_path, monkeypatch):
+    with open('test/hubs/flu-metrocast/hub-config/tasks.json') as fp:
+        tasks = json.load(fp)
+
+    # case: identical contents -> same (memoized) schema, even for a different dict
+    _clear_schema_cache()
+    schema = create_hub_schema(tasks)
+    assert create_hub_schema(json.loads(json.dumps(tasks))) is schema
+
+    # case: different args or contents -> different keys
+    assert _schema_key(tasks, 'from_config', None) != _schema_key(tasks, 'character', None)
+    assert _schema_key(tasks, 'from_config', None) != _schema_key(tasks, 'from_config', (('model_id', pa.string()),))
+    assert _schema_key(tasks, 'from_config', None) != _schema_key(tasks, 'from_config', None, 'auto')
+    assert create_hub_schema(tasks, output_type_id_datatype='character').field('output_type_id').type == pa.string()
+    tasks['output_type_id_datatype'] = 'integer'
+    assert create_hub_schema(tasks).field('output_type_id').type == pa.int32()
+    del tasks['output_type_id_datatype']
+
+    # case: cache_dir -> schema is stored and then read back in a "new process" without being re-created
+    _clear_schema_cache()
+    schema = create_hub_schema(tasks, cache_dir=tmp_path)
+    assert len(list((tmp_path / 'schemas').glob('*.arrow'))) == 1
+    _clear_schema_cache()
+    monkeypatch.setattr(sys.modules['hubdata.create_hub_schema'], '_create_hub_schema', None)  # would fail if called
+    assert create_hub_schema(tasks, cache_dir=tmp_path) == schema
+
+
+def test_schema_cache_eviction(monkeypatch):
+    monkeypatch.setattr(sys.modules['hubdata.create_hub_schema'], 'SCHEMA_CACHE_SIZE', 2)
+    _clear_schema_cache()
+    with open('test/hubs/flu-metrocast/hub-config/tasks.json') as fp:
+        tasks = json.load(fp)
+    schema_character = create_hub_schema(tasks, output_type_id_datatype='character')
+    create_hub_schema(tasks, output_type_id_datatype='double')
+    assert create_hub_schema(tasks, output_type_id_datatype='character') is schema_character  # now most recent
+    create_hub_schema(tasks, output_type_id_datatype='integer')  # evicts 'double'
+
+    from hubdata.create_hub_schema import _schema_cache
+    assert list(_schema_cache) == [_schema_key(tasks, 'character', (('model_id', pa.string()),)),
+                                   _schema_key(tasks, 'integer', (('model_id', pa.string()),))]
+
+
 # test_that("create_hub_schema works correctly", { .. }) from hubData/tests/testthat/test-create_hub_schema.R
 def test_r_test_1():
     hub_connection = connect_hub(Path('test/hubs/simple'))
@@ -0,0 +1,103 @@
+import shutil
+import statistics
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+from hubdata import build_ensemble, connect_hub, profile, write_model_output
+
+
+def exp_ensemble_values(hub_connection, combine) -> dict[tuple, float]:
+    """
+    A reference implementation: groups all rows in Python and combines each group's (model_id, value) pairs.
+    """
+    key_to_values = {}
+    for row in hub_connection.to_table().to_pylist():
+        if (row['output_type'] != 'sample') and (row['value'] is not None):
+            key = tuple(value for col_name, value in row.items() if col_name not in ['model_id', 'value'])
+            key_to_values.setdefault(key, []).append((row['model_id'], row['value']))
+    return {key: combine(values) for key, values in key_to_values.items()}
+
+
+def act_ensemble_values(table: pa.Table) -> dict[tuple, float]:
+    return {tuple(value for col_name, value in row.items() if col_name not in ['model_id', 'value']): row['value']
+            for row in table.to_pylist()}
+
+
+@pytest.mark.parametrize('agg,weights,combine', [
+    ('mean', None, lambda values: statistics.mean(value for _, value in values)),
+    ('median', None, lambda values: statistics.median(value for _, value in values)),
+    ('mean', {'PSI-DICE': 1, 'MOBS-GLEAM_FLUH': 3},
+     lambda values: (sum({'PSI-DICE': 1, 'MOBS-GLEAM_FLUH': 3}.get(model_id, 0) * value for model_id, value in values)
+                     / sum({'PSI-DICE': 1, 'MOBS-GLEAM_FLUH': 3}.get(model_id, 0) for model_id, _ in values))),
+])
+def test_build_ensemble(agg, weights, combine):
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'))
+    with profile() as profile_summary:
+        ensemble_table = build_ensemble(hub_connection, agg=agg, weights=weights)
+    assert [event['round_id'].isoformat() for event in profile_summary.events if event['event'] == 'ensemble'] \
+           == ['2022-10-22', '2022-11-19']  # one pass per round
+    assert ensemble_table.schema == hub_connection.schema
+    assert pc.unique(ensemble_table['model_id']).to_pylist() == ['hub-ensemble']
+    assert 'sample' not in pc.unique(ensemble_table['output_type']).to_pylist()
+
+    exp_values = exp_ensemble_values(hub_connection, combine)
+    act_values = act_ensemble_values(ensemble_table)
+    assert act_values.keys() == exp_values.keys()
+    assert all(act_values[key] == pytest.approx(exp_value) for key, exp_value in exp_values.items())
+
+
+def test_build_ensemble_categorical_and_filter():
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'), categorical='auto')
+    ensemble_table = build_ensemble(hub_connection, agg='median', model_id='my-ensemble',
+                                    filter=pc.field('model_id') != 'PSI-DICE')
+    assert ensemble_table.schema == hub_connection.schema
+    assert ensemble_table['model_id'].to_pylist() == ['my-ensemble'] * ensemble_table.num_rows
+
+    exp_table = build_ensemble(connect_hub(Path('test/hubs/v6_target_file')), agg='median', model_id='my-ensemble',
+                               filter=pc.field('model_id') != 'PSI-DICE')
+    assert ensemble_table.cast(exp_table.schema).equals(exp_table)
+
+
+def test_build_ensemble_errors():
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'))
+    with pytest.raises(ValueError, match="invalid agg='max'"):
+        build_ensemble(hub_connection, agg='max')
+
+    for agg, weights in [('median', {'PSI-DICE': 1}), ('mean', {}), ('mean', {'PSI-DICE': -1})]:
+        with pytest.raises(ValueError, match='invalid weights'):
+            build_ensemble(hub_connection, agg=agg, weights=weights)
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet', 'arrow'])
+def test_write_model_output(tmp_path, file_format):
+    shutil.copytree('test/hubs/v6_target_file', tmp_path, dirs_exist_ok=True)
+    hub_connection = connect_hub(tmp_path)
+    ensemble_table = build_ensemble(hub_connection)
+    written_paths = write_model_output(hub_connection, ensemble_table, file_format=file_format)
+    assert [Path(written_path).relative_to(tmp_path / 'model-output') for written_path in written_paths] \
+           == [Path(f'hub-ensemble/2022-10-22-hub-ensemble.{file_format}'),
+               Path(f'hub-ensemble/2022-11-19-hub-ensemble.{file_format}')]
+
+    # read it back as part of the hub. NB: v6_target_file's admin.json only lists csv
+    hub_connection.admin['file_format'] = ['csv', 'parquet', 'arrow']
+    act_table = hub_connection.to_table(filter=pc.field('model_id') == 'hub-ensemble')
+    assert act_table.sort_by([(col_name, 'ascending') for col_name in ensemble_table.column_names]) \
+        .equals(ensemble_table.sort_by([(col_name, 'ascending') for col_name in ensemble_table.column_names]))
+
+    with pytest.raises(ValueError, match="invalid file_format='json'"):
+        write_model_output(hub_connection, ensemble_table, file_format='json')
+
+
+def test_write_model_output_cast_error(tmp_path):
+    shutil.copytree('test/hubs/simple', tmp_path, dirs_exist_ok=True)
+    hub_connection = connect_hub(tmp_path)  # its `value` column is int32
+    ensemble_table = build_ensemble(hub_connection)
+    assert write_model_output(hub_connection, ensemble_table)  # integer means can be cast
+
+    ensemble_table = ensemble_table.set_column(ensemble_table.schema.get_field_index('value'), 'value',
+                                               pc.add(ensemble_table['value'], 0.5))
+    with pytest.raises(ValueError, match='cannot cast table to the hub schema'):
+        write_model_output(hub_connection, ensemble_table)
@@ -0,0 +1,73 @@
+import shutil
+from pathlib import Path
+
+import pyarrow.csv as csv
+import pyarrow.parquet as parquet
+import pytest
+from pyarrow import fs
+
+from hubdata import connect_hub, connect_target_data, register_filesystem
+from hubdata.create_target_data_schema import TargetType
+from hubdata.filesystems import clear_filesystems, filesystem_from_uri, filesystem_path
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    clear_filesystems()
+    yield
+    clear_filesystems()
+
+
+def copy_parquet_hub(hub_dir: Path):
+    """
+    Copies v6_target_file to `hub_dir`, converting its model output to parquet, the only format read from non-local
+    FileSystems.
+    """
+    shutil.copytree('test/hubs/v6_target_file', hub_dir, dirs_exist_ok=True)
+    for csv_file in (hub_dir / 'model-output').glob('*/*.csv'):
+        parquet.write_table(csv.read_csv(csv_file), csv_file.with_suffix('.parquet'))
+        csv_file.unlink()
+
+
+def test_filesystem_from_uri():
+    # case: same scheme, bucket, and query -> same instance. NB: passing the region avoids a network lookup
+    filesystem, path = filesystem_from_uri('s3://hub-bucket/hub-a/?region=us-east-1')
+    assert isinstance(filesystem, fs.S3FileSystem)
+    assert path == 'hub-bucket/hub-a'
+    assert filesystem_from_uri('s3://hub-bucket/hub-b?region=us-east-1') == (filesystem, 'hub-bucket/hub-b')
+    assert filesystem_from_uri('s3://other-bucket/hub-a?region=us-east-1')[0] is not filesystem
+    assert filesystem_from_uri('s3://hub-bucket/hub-a?region=us-west-2')[0] is not filesystem
+
+    # case: paths are the same as from_uri()'s
+    for uri in ['s3://hub-bucket/hub%20a/?region=us-east-1', 's3://hub-bucket?region=us-east-1',
+                Path('test/../test/hubs/simple'), str(Path('test/hubs/simple/').absolute()), 'file:///tmp/hub/']:
+        assert filesystem_path(uri) == fs.FileSystem.from_uri(uri)[1]
+
+    # case: local paths are not registered
+    assert isinstance(filesystem_from_uri(Path('test/hubs/simple'))[0], fs.LocalFileSystem)
+
+
+def test_register_filesystem(tmp_path):
+    # serve "s3://my-bucket/" from a local directory
+    copy_parquet_hub(tmp_path / 'my-bucket' / 'hub')
+    register_filesystem('s3://my-bucket', fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem()))
+    hub_connection = connect_hub('s3://my-bucket/hub')
+    assert hub_connection.to_table().num_rows == 1098
+    assert connect_target_data('s3://my-bucket/hub', TargetType.TIME_SERIES).hub_conn._filesystem \
+           is hub_connection._filesystem
+
+    with pytest.raises(ValueError, match='invalid uri'):
+        register_filesystem('/my-bucket', fs.LocalFileSystem())
+
+
+def test_filesystem_arg(tmp_path):
+    copy_parquet_hub(tmp_path / 'hub')
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    for hub_path in ['hub', 's3://hub']:  # NB: the scheme only determines how the path is parsed
+        hub_connection = connect_hub(hub_path, filesystem=filesystem)
+        assert hub_connection._filesystem is filesystem
+        assert hub_connection.to_table().num_rows == 1098
+
+    target_data_conn = connect_target_data('hub', TargetType.ORACLE_OUTPUT, filesystem=filesystem)
+    assert target_data_conn.hub_conn._filesystem is filesystem
+    assert target_data_conn.to_table().num_rows == 627
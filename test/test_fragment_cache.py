@@ -0,0 +1,125 @@
+import os
+import re
+import shutil
+from pathlib import Path
+
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pytest
+
+from hubdata import connect_hub, profile
+from hubdata.fragment_cache import FragmentCache
+
+
+def _sorted_table(hub_connection):
+    hub_ds = hub_connection.get_dataset()
+    return hub_ds.to_table().sort_by([(col_name, 'ascending') for col_name in hub_ds.schema.names])
+
+
+@pytest.mark.parametrize('hub_dir', ['test/hubs/v4_flusight', 'test/hubs/flu-metrocast'])
+def test_cached_dataset_equals_uncached(tmp_path, hub_dir):
+    hub_connection = connect_hub(Path(hub_dir), cache_dir=tmp_path, cache_fragments=True)
+    hub_ds = hub_connection.get_dataset()
+    assert all(fragment.path.startswith(str(tmp_path / 'fragments')) and fragment.path.endswith('.arrow')
+               for fragment in hub_ds.get_fragments())
+    assert hub_ds.schema == hub_connection.schema
+    assert _sorted_table(hub_connection) == _sorted_table(connect_hub(Path(hub_dir)))
+
+
+def test_cache_hit_and_invalidation(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('test/hubs/v4_flusight', hub_dir)
+    hub_connection = connect_hub(hub_dir, cache_fragments=True, cache_dir=tmp_path / 'cache')
+    num_rows = hub_connection.get_dataset().count_rows()
+    fragment_cache = hub_connection.fragment_cache
+    assert fragment_cache.stats()['num_fragments'] == 8
+
+    # a hit does not rewrite the fragment
+    inodes = {dir_entry.name: dir_entry.inode() for dir_entry in os.scandir(fragment_cache.fragments_dir)}
+    assert connect_hub(hub_dir, cache_fragments=True, cache_dir=tmp_path / 'cache').get_dataset().count_rows() \
+           == num_rows
+    assert {dir_entry.name: dir_entry.inode() for dir_entry in os.scandir(fragment_cache.fragments_dir)} == inodes
+
+    # a modified file is a miss once it's re-listed. NB: in-place edits do not change the model dir's mtime, so the
+    # listing manifest is only refreshed after `listing_ttl`
+    csv_file = hub_dir / 'forecasts' / 'umass-ens' / '2023-05-01-umass-ens.csv'
+    csv_lines = csv_file.read_text().splitlines(keepends=True)
+    csv_file.write_text(''.join(csv_lines[:-1]))  # drop the last row
+    assert connect_hub(hub_dir, cache_fragments=True, cache_dir=tmp_path / 'cache', listing_ttl=0).get_dataset() \
+           .count_rows() == num_rows - 1
+    assert fragment_cache.stats()['num_fragments'] == 9
+
+
+def test_cache_in_place_edit(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('test/hubs/flu-metrocast', hub_dir)
+    cache_dir = tmp_path / 'cache'
+    value_sum = pc.sum(connect_hub(hub_dir, cache_fragments=True, cache_dir=cache_dir).to_table()['value']).as_py()
+
+    # rewrite one file's values in place, keeping its size. its model dir's mtime does not change, so it's only re-listed
+    # with a listing_ttl of 0 (or once the ttl expires)
+    csv_file = next((hub_dir / 'model-output').glob('*/*.csv'))
+    model_dir_mtime_ns = csv_file.parent.stat().st_mtime_ns
+    table = csv.read_csv(csv_file)
+    csv_file.write_text(re.sub(r',1(\d*\.\d+)$', r',2\1', csv_file.read_text(), flags=re.MULTILINE))  # values only
+    assert csv_file.parent.stat().st_mtime_ns == model_dir_mtime_ns
+    value_delta = pc.sum(csv.read_csv(csv_file)['value']).as_py() - pc.sum(table['value']).as_py()
+    assert value_delta > 0
+
+    hub_connection = connect_hub(hub_dir, cache_fragments=True, cache_dir=cache_dir, listing_ttl=0)
+    act_sum = pc.sum(hub_connection.to_table()['value']).as_py()
+    assert act_sum == pytest.approx(value_sum + value_delta)
+    assert act_sum == pytest.approx(pc.sum(connect_hub(hub_dir).to_table()['value']).as_py())
+
+
+def test_cache_filtered_scan(tmp_path):
+    # a filtered first scan only fetches the files that the filter might match
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'), cache_fragments=True, cache_dir=tmp_path)
+    model_filter = pc.field('model_id') == 'umass-ens'
+    with profile() as profile_summary:
+        table = hub_connection.to_table(filter=model_filter)
+    assert sorted(Path(event['path']).name for event in profile_summary.events if event['event'] == 'fetch_fragment') \
+           == ['2023-05-01-umass-ens.csv', '2023-05-08-umass-ens.csv']
+    assert hub_connection.fragment_cache.stats()['num_fragments'] == 2
+    assert table == connect_hub(Path('test/hubs/v4_flusight')).to_table(filter=model_filter)
+    assert hub_connection.aggregate([('value', 'count')], filter=model_filter)['value_count'][0].as_py() \
+           == table.num_rows
+    assert hub_connection.fragment_cache.stats()['num_fragments'] == 2
+
+    # case: no files match
+    assert hub_connection.to_table(filter=pc.field('model_id') == 'no-such-model').schema == hub_connection.schema
+
+    # case: unfiltered fetches the rest
+    assert hub_connection.get_dataset().count_rows() == 292
+    assert hub_connection.fragment_cache.stats()['num_fragments'] == 8
+
+
+def test_prune_and_clear(tmp_path):
+    hub_connection = connect_hub(Path('test/hubs/flu-metrocast'), cache_fragments=True, cache_dir=tmp_path)
+    hub_connection.get_dataset()
+    fragment_cache = FragmentCache(tmp_path)
+    stats = fragment_cache.stats()
+    assert stats['num_fragments'] == 31
+    assert stats['num_bytes'] > 0
+
+    # `keep` protects fragments even when the cap is zero
+    fragment_paths = [dir_entry.path for dir_entry in os.scandir(fragment_cache.fragments_dir)]
+    assert fragment_cache.prune(max_bytes=0, keep={fragment_paths[0]}) == 30
+    assert [dir_entry.path for dir_entry in os.scandir(fragment_cache.fragments_dir)] == [fragment_paths[0]]
+    assert fragment_cache.prune(max_bytes=stats['num_bytes']) == 0
+    assert fragment_cache.clear() == 1
+    assert fragment_cache.stats()['num_fragments'] == 0
+
+
+def test_cache_fragments_requires_cache_dir():
+    with pytest.raises(ValueError, match='cache_fragments requires cache_dir'):
+        connect_hub(Path('test/hubs/flu-metrocast'), cache_fragments=True)
+
+
+def test_cache_csv_na_as_null(tmp_path):
+    # fragments read with different CSV null handling are cached separately
+    mean_filter = pc.field('output_type') == 'mean'
+    for csv_na_as_null, exp_null_count in [(False, 2), (True, 6), (False, 2)]:
+        hub_connection = connect_hub(Path('test/hubs/v4_flusight'), cache_fragments=True, cache_dir=tmp_path,
+                                     csv_na_as_null=csv_na_as_null)
+        assert hub_connection.to_table(filter=mean_filter)['output_type_id'].null_count == exp_null_count
@@ -0,0 +1,109 @@
+import json
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.parquet as parquet
+import pytest
+
+from hubdata import connect_hub, connect_target_data, join_oracle, profile
+from hubdata.create_target_data_schema import TargetType
+
+
+def exp_joined_rows(hub_path: Path) -> list[dict]:
+    """
+    A naive reference join: oracle rows are looked up by observable unit and output type, and by output type ID only
+    for pmf and cdf.
+    """
+    hub_connection = connect_hub(hub_path)
+    key_to_oracle_value = {}
+    for row in connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT).to_table().to_pylist():
+        key_to_oracle_value[(row['location'], row['target_end_date'], row['target'], row['output_type'],
+                             row['output_type_id'] or None)] = row['oracle_value']
+    joined_rows = []
+    for row in hub_connection.to_table().to_pylist():
+        output_type_id = row['output_type_id'] if row['output_type'] in ['pmf', 'cdf'] else None
+        key = (row['location'], row['target_end_date'], row['target'], row['output_type'], output_type_id)
+        if key in key_to_oracle_value:
+            joined_rows.append(row | {'oracle_value': key_to_oracle_value[key]})
+    return joined_rows
+
+
+def sorted_rows(rows: list[dict]) -> list[dict]:
+    return sorted(rows, key=lambda row: tuple(str(value) for value in row.values()))
+
+
+@pytest.mark.parametrize('hub_dir', ['v6_target_file', 'v6_target_dir'])
+def test_join_oracle(hub_dir):
+    hub_path = Path('test/hubs') / hub_dir
+    hub_connection = connect_hub(hub_path)
+    td_connection = connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT)
+    with profile() as profile_summary:
+        tables = list(join_oracle(hub_connection, td_connection))
+    assert [event['round_id'].isoformat() for event in profile_summary.events if event['event'] == 'join_oracle'] \
+           == ['2022-10-22', '2022-11-19']  # one pass per round
+    assert all(pc.unique(table['reference_date']).to_pylist() == [table['reference_date'][0].as_py()]
+               for table in tables)
+    assert tables[0].schema == hub_connection.schema.append(pa.field('oracle_value', pa.float64()))
+
+    exp_rows = exp_joined_rows(hub_path)
+    assert len(exp_rows) == 1098  # every model output row has an oracle value
+    assert sorted_rows(pa.concat_tables(tables).to_pylist()) == sorted_rows(exp_rows)
+
+    # case: filter and categorical columns
+    hub_connection = connect_hub(hub_path, categorical='auto')
+    table = pa.concat_tables(join_oracle(hub_connection, connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT),
+                                         filter=pc.field('output_type') == 'pmf'))
+    assert pa.types.is_dictionary(table.schema.field('location').type)
+    assert sorted_rows(table.cast(table.schema.set(table.schema.get_field_index('location'),
+                                                   pa.field('location', pa.string()))).to_pylist()) \
+           == sorted_rows([row for row in exp_rows if row['output_type'] == 'pmf'])
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet'])
+def test_join_oracle_versioned(tmp_path, file_format):
+    # version v6_target_file's oracle output: an older wrong version and a newer correct one. as parquet, the rows
+    # without output type IDs (mean, median, quantile, and sample) have null `output_type_id`s rather than ''
+    shutil.copytree('test/hubs/v6_target_file', tmp_path, dirs_exist_ok=True)
+    oracle_path = tmp_path / 'target-data/oracle-output.csv'
+    oracle_table = csv.read_csv(oracle_path)
+    if file_format == 'parquet':
+        oracle_table = oracle_table.set_column(oracle_table.schema.get_field_index('output_type_id'), 'output_type_id',
+                                               pc.if_else(pc.equal(oracle_table['output_type_id'], ''), None,
+                                                          oracle_table['output_type_id']))
+    old_table = oracle_table.set_column(oracle_table.schema.get_field_index('oracle_value'), 'oracle_value',
+                                        pc.add(oracle_table['oracle_value'], 1000))
+    versioned_table = pa.concat_tables([
+        table.append_column('as_of', pc.cast(pa.array([as_of] * len(oracle_table)), pa.date32()))
+        for table, as_of in [(old_table, '2022-12-01'), (oracle_table, '2022-12-08')]])
+    if file_format == 'parquet':
+        parquet.write_table(versioned_table, tmp_path / 'target-data/oracle-output.parquet')
+        oracle_path.unlink()
+    else:
+        csv.write_csv(versioned_table, oracle_path)
+    with open(tmp_path / 'hub-config/target-data.json') as fp:
+        target_data = json.load(fp)
+    with open(tmp_path / 'hub-config/target-data.json', 'w') as fp:
+        json.dump(target_data | {'versioned': True}, fp)
+
+    hub_connection = connect_hub(tmp_path)
+    td_connection = connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT)
+    exp_rows = sorted_rows(exp_joined_rows(Path('test/hubs/v6_target_file')))
+    for as_of, offset in [(None, 0), ('2022-12-08', 0), ('2022-12-01', 1000)]:
+        table = pa.concat_tables(join_oracle(hub_connection, td_connection, as_of=as_of))
+        assert table.num_rows == len(exp_rows) == 1098
+        assert sorted(pc.unique(table['output_type']).to_pylist()) == ['cdf', 'mean', 'pmf', 'quantile', 'sample']
+        assert [row['oracle_value'] for row in sorted_rows(table.to_pylist())] \
+               == [exp_row['oracle_value'] + offset for exp_row in exp_rows]
+
+
+def test_join_oracle_errors():
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'))
+    with pytest.raises(ValueError, match='td_conn must be for oracle-output target data'):
+        join_oracle(hub_connection, connect_target_data(hub_connection, TargetType.TIME_SERIES))
+
+    with pytest.raises(ValueError, match='oracle-output target data is not versioned'):
+        join_oracle(hub_connection, connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT), as_of='2022-12-01')
+
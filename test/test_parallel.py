@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pyarrow.compute as pc
+import pytest
+
+from hubdata import connect_hub, profile
+from hubdata.parallel import _dataset_shards
+
+
+def test__dataset_shards():
+    hub_ds = connect_hub(Path('test/hubs/v4_flusight')).get_dataset()  # 5 csv, 2 parquet, and 1 arrow files
+    exp_paths = [fragment.path for fragment in hub_ds.get_fragments()]
+    for max_shards, exp_num_shards in [(1, 3), (3, 4), (8, 8), (100, 8)]:  # NB: shards never mix formats
+        shards = _dataset_shards(hub_ds, max_shards)
+        assert len(shards) == exp_num_shards
+        assert [path for shard in shards for path in shard.files] == exp_paths
+        assert all(shard.schema == hub_ds.schema for shard in shards)
+
+
+def test_to_table_processes():
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'), categorical='auto')
+    table_kwargs = {'columns': ['model_id', 'location', 'value'], 'filter': pc.field('output_type') == 'quantile'}
+    with profile() as profile_summary:
+        act_table = hub_connection.to_table(parallel='processes', workers=2, **table_kwargs)
+    assert act_table.equals(hub_connection.to_table(**table_kwargs))  # same rows in the same order
+    assert act_table.num_rows == 276
+    scan_event = profile_summary.events[-1]
+    assert (scan_event['event'], scan_event['workers'], scan_event['num_rows']) == ('scan_processes', 2, 276)
+
+    with pytest.raises(ValueError, match="invalid parallel='threads'"):
+        hub_connection.to_table(parallel='threads')
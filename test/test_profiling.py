@@ -0,0 +1,166 @@
+from pathlib import Path
+
+import pyarrow.compute as pc
+from pyarrow import fs
+
+from hubdata import connect_hub, profile
+from hubdata.profiling import is_profiling
+
+
+def test_profile_to_table():
+    hub_connection = connect_hub(Path('test/hubs/v4_flusight'))  # mix of csv, parquet, and arrow files
+    with profile() as profile_summary:
+        assert is_profiling()
+        table = hub_connection.to_table(filter=pc.field('horizon') == 1)
+    assert not is_profiling()
+
+    totals = profile_summary.totals()
+    assert totals['counts'] == {'list_files': 1, 'group_files': 1, 'scan_fragment': 8, 'scan': 1}
+    assert totals['files_per_format'] == {'csv': 5, 'parquet': 2, 'arrow': 1}
+    assert totals['num_rows'] == table.num_rows == 141
+    assert totals['num_batches'] == 8
+    assert totals['num_bytes'] == sum(path.stat().st_size for path in Path('test/hubs/v4_flusight/forecasts').rglob('*')
+                                      if path.suffix in ['.csv', '.parquet', '.arrow'])
+
+    scan_event = profile_summary.events[-1]
+    assert scan_event['event'] == 'scan'
+    assert (scan_event['num_fragments'], scan_event['num_rows']) == (8, 141)
+    assert all(event['duration'] >= 0 for event in profile_summary.events if 'duration' in event)
+
+    # profiled and unprofiled tables are the same
+    assert table == hub_connection.to_table(filter=pc.field('horizon') == 1)
+
+
+class StatCountingHandler(fs.FileSystemHandler):
+    """
+    A pyarrow FileSystemHandler over a local directory that records the paths passed to `get_file_info()`, i.e., the
+    per-file stats that a remote file system would do a round trip for.
+    """
+
+
+    def __init__(self, root_dir: str):
+        self.local_fs = fs.LocalFileSystem()
+        self.root_dir = root_dir
+        self.stat_paths = []
+
+
+    def __eq__(self, other):
+        return isinstance(other, StatCountingHandler) and (other.root_dir == self.root_dir)
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    def _local_path(self, path):
+        return f"{self.root_dir}/{path.lstrip('/')}"
+
+
+    def get_type_name(self):
+        return 'stat-counting'
+
+
+    def normalize_path(self, path):
+        return path
+
+
+    def get_file_info(self, paths):
+        self.stat_paths.extend(paths)
+        file_infos = self.local_fs.get_file_info([self._local_path(path) for path in paths])
+        return [fs.FileInfo(path, type=file_info.type, size=file_info.size, mtime=file_info.mtime)
+                for path, file_info in zip(paths, file_infos)]
+
+
+    def get_file_info_selector(self, selector):
+        file_infos = self.local_fs.get_file_info(fs.FileSelector(self._local_path(selector.base_dir),
+                                                                 recursive=selector.recursive,
+                                                                 allow_not_found=selector.allow_not_found))
+        return [fs.FileInfo(file_info.path[len(self.root_dir):], type=file_info.type, size=file_info.size,
+                            mtime=file_info.mtime) for file_info in file_infos]
+
+
+    def open_input_stream(self, path):
+        return self.local_fs.open_input_stream(self._local_path(path))
+
+
+    def open_input_file(self, path):
+        return self.local_fs.open_input_file(self._local_path(path))
+
+
+    def create_dir(self, path, recursive):
+        raise NotImplementedError
+
+
+    def delete_dir(self, path):
+        raise NotImplementedError
+
+
+    def delete_dir_contents(self, path, missing_dir_ok=False):
+        raise NotImplementedError
+
+
+    def delete_root_dir_contents(self):
+        raise NotImplementedError
+
+
+    def delete_file(self, path):
+        raise NotImplementedError
+
+
+    def move(self, src, dest):
+        raise NotImplementedError
+
+
+    def copy_file(self, src, dest):
+        raise NotImplementedError
+
+
+    def open_output_stream(self, path, metadata):
+        raise NotImplementedError
+
+
+    def open_append_stream(self, path, metadata):
+        raise NotImplementedError
+
+
+def test_profile_num_bytes_from_listing():
+    # on a non-local file system, scanned files' sizes come from the listing rather than from a stat per file. NB: only
+    # parquet files are read from non-local file systems
+    handler = StatCountingHandler(str(Path('test/hubs').absolute()))
+    hub_connection = connect_hub('/v4_flusight', filesystem=fs.PyFileSystem(handler))
+    with profile() as profile_summary:
+        hub_connection.to_table()
+    scan_events = [event for event in profile_summary.events if event['event'] == 'scan_fragment']
+    assert len(scan_events) == 2
+    assert all(event['num_bytes'] == Path('test/hubs', event['path'].lstrip('/')).stat().st_size
+               for event in scan_events)
+    assert not {event['path'] for event in scan_events} & set(handler.stat_paths)
+
+
+def test_profile_iter_batches_and_nesting():
+    hub_connection = connect_hub(Path('test/hubs/flu-metrocast'))
+    with profile() as outer_summary:
+        hub_connection.get_dataset()
+        with profile() as inner_summary:
+            num_rows = sum(batch.num_rows for batch in hub_connection.iter_batches(columns=['value']))
+    assert num_rows == 14895
+    assert inner_summary.totals()['num_rows'] == num_rows
+    assert inner_summary.totals()['counts']['scan_fragment'] == 31
+    assert outer_summary.totals()['counts']['list_files'] == 2
+    assert outer_summary.events[2:] == inner_summary.events
+
+
+def test_profile_fragment_cache(tmp_path):
+    with profile() as profile_summary:
+        connect_hub(Path('test/hubs/v4_flusight'), cache_dir=tmp_path, cache_fragments=True).get_dataset()
+    fetch_events = [event for event in profile_summary.events if event['event'] == 'fetch_fragment']
+    assert len(fetch_events) == 8
+    assert sum(event['num_rows'] for event in fetch_events) == 292
+    assert all(event['cast_duration'] == 0 for event in fetch_events if event['path'].endswith('.csv'))
+
+
+def test_no_events_outside_profile():
+    with profile() as profile_summary:
+        pass
+    connect_hub(Path('test/hubs/flu-metrocast')).to_table()
+    assert profile_summary.events == []
@@ -0,0 +1,55 @@
+import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+from hubdata.query import query_expression
+
+SCHEMA = pa.schema([('reference_date', pa.date32()),
+                    ('horizon', pa.int32()),
+                    ('location', pa.string()),
+                    ('output_type', pa.string()),
+                    ('output_type_id', pa.string()),
+                    ('value', pa.float64()),
+                    ('model_id', pa.string())])
+
+
+def test_query_expression_no_filters():
+    assert query_expression(SCHEMA, {}) is None
+
+
+@pytest.mark.parametrize('filters,exp_expression', [
+    ({'output_type': 'quantile'}, pc.field('output_type') == 'quantile'),
+    ({'reference_date': '2022-10-22'},  # str -> date32
+     pc.field('reference_date') == pa.scalar(datetime.date(2022, 10, 22))),
+    ({'reference_date': datetime.date(2022, 10, 22)},
+     pc.field('reference_date') == pa.scalar(datetime.date(2022, 10, 22))),
+    ({'horizon': '1'}, pc.field('horizon') == pa.scalar(1, pa.int32())),  # str -> int32
+    ({'value': 1}, pc.field('value') == pa.scalar(1.0)),  # int -> float64
+    ({'output_type_id': None}, pc.field('output_type_id').is_null()),
+    ({'model_id': ['team1-goodmodel']}, pc.field('model_id') == 'team1-goodmodel'),  # one item -> ==
+    ({'model_id': ['b', 'a']}, pc.field('model_id').isin(pa.array(['b', 'a']))),
+    ({'model_id': {'b', 'a'}}, pc.field('model_id').isin(pa.array(['a', 'b']))),  # sets are sorted
+    ({'horizon': range(0, 3)},
+     (pc.field('horizon') >= pa.scalar(0, pa.int32())) & (pc.field('horizon') < pa.scalar(3, pa.int32()))),
+    ({'horizon': range(0, 5, 2)}, pc.field('horizon').isin(pa.array([0, 2, 4], pa.int32()))),
+    ({'reference_date': slice('2022-10-22', None)},
+     pc.field('reference_date') >= pa.scalar(datetime.date(2022, 10, 22))),
+    ({'output_type': 'quantile', 'horizon': 1},
+     (pc.field('output_type') == 'quantile') & (pc.field('horizon') == pa.scalar(1, pa.int32()))),
+])
+def test_query_expression(filters, exp_expression):
+    assert query_expression(SCHEMA, filters).equals(exp_expression)
+
+
+@pytest.mark.parametrize('filters,exp_match', [
+    ({'bad_col': 1}, "unknown column: 'bad_col'"),
+    ({'horizon': 'US'}, 'cannot convert horizon value'),
+    ({'horizon': 1.5}, 'cannot convert horizon value'),  # lossy
+    ({'reference_date': '2022-13-01'}, 'cannot convert reference_date value'),
+    ({'horizon': slice(0, 4, 2)}, 'slices cannot have a step'),
+])
+def test_query_expression_errors(filters, exp_match):
+    with pytest.raises(ValueError, match=exp_match):
+        query_expression(SCHEMA, filters)
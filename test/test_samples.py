@@ -0,0 +1,81 @@
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pytest
+
+from hubdata import compact_samples, connect_hub, expand_samples, profile
+
+
+def _sorted_rows(table: pa.Table) -> list[dict]:
+    return sorted(table.to_pylist(), key=lambda row: tuple(str(value) for value in row.values()))
+
+
+@pytest.mark.parametrize('categorical', ['none', 'auto'])
+def test_compact_samples(categorical):
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'), categorical=categorical)
+    with profile() as profile_summary:
+        samples_table = compact_samples(hub_connection)
+    assert [event['round_id'].isoformat() for event in profile_summary.events if event['event'] == 'compact_samples'] \
+           == ['2022-10-22', '2022-11-19']
+
+    # one row per forecast, in hub schema order without output_type
+    assert samples_table.num_rows == 18
+    assert samples_table.column_names == [col_name for col_name in hub_connection.schema.names
+                                          if col_name != 'output_type']
+    assert samples_table.schema.field('output_type_id').type == pa.list_(pa.string())
+    assert samples_table.schema.field('value').type == pa.list_(pa.float64())
+    assert samples_table.schema.field('model_id').type == hub_connection.schema.field('model_id').type
+    assert pc.list_value_length(samples_table['value']).to_pylist() == [5] * 18
+
+    # sorted by model_id, then the compound task IDs (reference_date and location), then the other task IDs
+    sort_keys = [(row['model_id'], row['reference_date'], row['location'], row['target'], row['horizon'])
+                 for row in samples_table.to_pylist()]
+    assert sort_keys == sorted(sort_keys)
+    first_row = samples_table.slice(0, 1).to_pylist()[0]
+    assert first_row['output_type_id'] == ['1', '2', '3', '4', '5']
+    assert first_row['value'] == [95.0, 83.0, 89.0, 96.0, 68.0]
+
+    # the reverse transform gets back the hub's sample rows
+    act_table = expand_samples(samples_table, hub_connection.schema)
+    exp_table = hub_connection.to_table(filter=pc.field('output_type') == 'sample')
+    assert act_table.schema == hub_connection.schema
+    assert _sorted_rows(act_table) == _sorted_rows(exp_table)
+    assert samples_table.nbytes < exp_table.nbytes
+
+    # without a schema: the table's columns, with output_type added before output_type_id
+    assert expand_samples(samples_table).column_names \
+           == ['reference_date', 'target', 'horizon', 'location', 'target_end_date', 'output_type', 'output_type_id',
+               'value', 'model_id']
+
+
+def test_compact_samples_fixed_size_and_filter():
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'))
+    samples_table = compact_samples(hub_connection, fixed_size=True, filter=pc.field('model_id') == 'PSI-DICE')
+    assert samples_table.schema.field('value').type == pa.list_(pa.float64(), 5)
+    assert samples_table.schema.field('output_type_id').type == pa.list_(pa.string(), 5)
+    assert set(samples_table['model_id'].to_pylist()) == {'PSI-DICE'}
+    assert expand_samples(samples_table, hub_connection.schema) \
+        .equals(expand_samples(compact_samples(hub_connection, filter=pc.field('model_id') == 'PSI-DICE'),
+                               hub_connection.schema))
+
+    # no sample rows
+    samples_table = compact_samples(hub_connection, filter=pc.field('model_id') == 'no-such-model')
+    assert samples_table.num_rows == 0
+    assert samples_table.schema.field('value').type == pa.list_(pa.float64())
+    assert expand_samples(samples_table, hub_connection.schema).schema == hub_connection.schema
+
+
+def test_compact_samples_fixed_size_error(tmp_path):
+    shutil.copytree('test/hubs/v6_target_file', tmp_path, dirs_exist_ok=True)
+    file_path = tmp_path / 'model-output/PSI-DICE/2022-10-22-PSI-DICE.csv'
+    table = csv.read_csv(file_path, convert_options=csv.ConvertOptions(column_types={'output_type_id': pa.string()}))
+    sample_indices = pc.indices_nonzero(pc.equal(table['output_type'], 'sample'))
+    csv.write_csv(table.filter(pc.not_equal(pa.array(range(table.num_rows)), sample_indices[0])), file_path)
+
+    hub_connection = connect_hub(tmp_path)
+    assert sorted(set(pc.list_value_length(compact_samples(hub_connection)['value']).to_pylist())) == [4, 5]
+    with pytest.raises(ValueError, match='different numbers of samples'):
+        compact_samples(hub_connection, fixed_size=True)
@@ -0,0 +1,144 @@
+import itertools
+import json
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.parquet as parquet
+import pytest
+
+from hubdata import connect_hub, connect_target_data, join_oracle
+from hubdata.create_target_data_schema import TargetType
+from hubdata.scoring import pinball_loss, score_model_output, score_quantiles, score_samples
+
+
+def joined_table(output_type: str, forecasts: dict[str, tuple[list, list, float]]) -> pa.Table:
+    """
+    :param forecasts: maps location to a 3-tuple: (output_type_ids, values, oracle_value)
+    :return: a table with `join_oracle()`-like columns
+    """
+    rows = [{'location': location, 'output_type': output_type, 'output_type_id': output_type_id, 'value': value,
+             'oracle_value': oracle_value, 'model_id': 'team1-model'}
+            for location, (output_type_ids, values, oracle_value) in forecasts.items()
+            for output_type_id, value in zip(output_type_ids, values)]
+    return pa.Table.from_pylist(rows)
+
+
+def naive_scores(rows: list[dict]) -> dict[tuple, dict]:
+    """
+    A reference implementation that scores each forecast in `rows` (`join_oracle()` output) one at a time.
+    """
+    forecast_to_rows = {}
+    for row in rows:
+        forecast = tuple((col_name, value) for col_name, value in row.items()
+                         if col_name not in ['output_type_id', 'value', 'oracle_value'])
+        forecast_to_rows.setdefault(forecast, []).append(row)
+
+    forecast_to_scores = {}
+    for forecast, forecast_rows in forecast_to_rows.items():
+        oracle_value = forecast_rows[0]['oracle_value']
+        if forecast_rows[0]['output_type'] == 'quantile':
+            losses = []
+            for row in forecast_rows:
+                level, value = float(row['output_type_id']), row['value']
+                losses.append(2 * (oracle_value - value) * (level - (1 if oracle_value < value else 0)))
+            forecast_to_scores[forecast] = {'wis': sum(losses) / len(losses)}
+        elif forecast_rows[0]['output_type'] == 'sample':
+            values = [row['value'] for row in forecast_rows]
+            forecast_to_scores[forecast] = {'crps': sum(abs(value - oracle_value) for value in values) / len(values)
+                                            - sum(abs(value1 - value2) for value1, value2
+                                                  in itertools.product(values, values)) / (2 * len(values) ** 2)}
+    return forecast_to_scores
+
+
+def test_pinball_loss():
+    act_losses = pinball_loss(pa.array([1, 3, None]), pa.array([2.0, 2.0, 2.0]), pa.array([0.1, 0.1, 0.1]))
+    assert act_losses.to_pylist() == pytest.approx([0.1, 0.9, None])
+
+
+def test_score_quantiles():
+    table = joined_table('quantile', {'US': (['0.05', '0.25', '0.5', '0.75', '0.95'], [1, 2, 3, 4, 5], 3.5),
+                                      '01': (['0.05', '0.25', '0.5', '0.75', '0.95'], [1, 2, 3, 4, 5], 10),
+                                      '02': (['0.25', '0.75'], [2, 4], 3)})
+    table = pa.concat_tables([table, joined_table('mean', {'US': (['NA'], [3], 3.5)})])  # ignored
+    act_scores = score_quantiles(table).sort_by('location').to_pylist()
+    assert [row['location'] for row in act_scores] == ['01', '02', 'US']
+    assert act_scores[0]['model_id'] == 'team1-model'
+
+    # interval-based WIS: (0.5 * |y - median| + sum(alpha / 2 * interval score)) / (K + 0.5)
+    assert act_scores[2]['wis'] == pytest.approx((0.5 * 0.5 + 0.05 * 4 + 0.25 * 2) / 2.5)
+    assert act_scores[0]['wis'] == pytest.approx((0.5 * 7 + 0.05 * (4 + 2 / 0.1 * 5) + 0.25 * (2 + 2 / 0.5 * 6)) / 2.5)
+    assert [row['ae_median'] for row in act_scores] == [7, None, 0.5]
+    assert [row['interval_coverage_50'] for row in act_scores] == [False, True, True]
+    assert [row['interval_coverage_90'] for row in act_scores] == [False, None, True]
+
+
+def test_score_samples():
+    table = joined_table('sample', {'US': (['1', '2', '3', '4'], [4, 2, 1, 3], 2.5),  # unsorted
+                                    '01': (['5'], [7], 10)})
+    act_scores = score_samples(table).sort_by('location').to_pylist()
+    assert [row['crps'] for row in act_scores] == pytest.approx([3, 1 - 20 / 16 / 2])
+
+
+@pytest.mark.parametrize('categorical', ['none', 'auto'])
+def test_score_model_output(categorical):
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'), categorical=categorical)
+    td_connection = connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT)
+    forecast_to_scores = naive_scores([row for table in join_oracle(hub_connection, td_connection)
+                                       for row in table.cast(pa.schema([pa.field(field.name, field.type.value_type)
+                                                                        if pa.types.is_dictionary(field.type)
+                                                                        else field for field in table.schema]))
+                                       .to_pylist()])
+    act_summary = score_model_output(hub_connection, td_connection)
+    assert act_summary.column_names == ['model_id', 'wis', 'ae_median', 'interval_coverage_50', 'interval_coverage_90',
+                                        'crps']
+    assert act_summary['model_id'].to_pylist() == ['Flusight-baseline', 'MOBS-GLEAM_FLUH', 'PSI-DICE']
+    for row in act_summary.to_pylist():
+        for score_name in ['wis', 'crps']:
+            exp_scores = [scores[score_name] for forecast, scores in forecast_to_scores.items()
+                          if (('model_id', row['model_id']) in forecast) and (score_name in scores)]
+            assert row[score_name] == pytest.approx(sum(exp_scores) / len(exp_scores))
+
+    # case: by task ID. samples are only for horizon 1
+    act_summary = score_model_output(hub_connection, td_connection, by=['model_id', 'horizon'])
+    assert act_summary.num_rows == 6
+    assert [row['crps'] is None for row in act_summary.to_pylist()] == [False, True] * 3
+
+
+def test_score_model_output_versioned_parquet(tmp_path):
+    # versioned parquet oracle output, whose quantile and sample rows have null `output_type_id`s: an older version
+    # whose values are 1000 more, and a newer one that's the same as v6_target_file's
+    shutil.copytree('test/hubs/v6_target_file', tmp_path, dirs_exist_ok=True)
+    oracle_table = csv.read_csv(tmp_path / 'target-data/oracle-output.csv')
+    oracle_table = oracle_table.set_column(oracle_table.schema.get_field_index('output_type_id'), 'output_type_id',
+                                           pc.if_else(pc.equal(oracle_table['output_type_id'], ''), None,
+                                                      oracle_table['output_type_id']))
+    old_table = oracle_table.set_column(oracle_table.schema.get_field_index('oracle_value'), 'oracle_value',
+                                        pc.add(oracle_table['oracle_value'], 1000))
+    parquet.write_table(pa.concat_tables([
+        table.append_column('as_of', pc.cast(pa.array([as_of] * len(oracle_table)), pa.date32()))
+        for table, as_of in [(old_table, '2022-12-01'), (oracle_table, '2022-12-08')]]),
+        tmp_path / 'target-data/oracle-output.parquet')
+    (tmp_path / 'target-data/oracle-output.csv').unlink()
+    with open(tmp_path / 'hub-config/target-data.json') as fp:
+        target_data = json.load(fp)
+    with open(tmp_path / 'hub-config/target-data.json', 'w') as fp:
+        json.dump(target_data | {'versioned': True}, fp)
+
+    hub_connection = connect_hub(Path('test/hubs/v6_target_file'))
+    exp_summary = score_model_output(hub_connection, connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT))
+    hub_connection = connect_hub(tmp_path)
+    td_connection = connect_target_data(hub_connection, TargetType.ORACLE_OUTPUT)
+    act_summary = score_model_output(hub_connection, td_connection)
+    assert act_summary.num_rows == 3
+    assert all((row['wis'] is not None) and (row['crps'] is not None) for row in act_summary.to_pylist())
+    assert act_summary['model_id'] == exp_summary['model_id']
+    for score_name in ['wis', 'ae_median', 'crps']:
+        assert act_summary[score_name].to_pylist() == pytest.approx(exp_summary[score_name].to_pylist())
+
+    # the older version's scores are worse
+    old_summary = score_model_output(hub_connection, td_connection, as_of='2022-12-01')
+    assert all(old_row['wis'] > exp_row['wis'] for old_row, exp_row
+               in zip(old_summary.to_pylist(), exp_summary.to_pylist()))
@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pytest
+
+from hubdata import connect_hub, connect_target_data
+from hubdata.create_target_data_schema import TargetType
+from hubdata.sql import latest_versions
+
+
+@pytest.mark.parametrize('group_by,filter_expr', [
+    ([], None),
+    (['model_id'], None),
+    (['model_id', 'output_type'], pc.field('output_type') != 'sample'),
+])
+def test_aggregate(group_by, filter_expr):
+    hub_connection = connect_hub(Path('test/hubs/v6_target_dir'))
+    aggregations = [('value', 'count'), ('value', 'max'), ('horizon', 'min')]
+    act_table = hub_connection.aggregate(aggregations, group_by=group_by, filter=filter_expr)
+    exp_table = hub_connection.to_table(filter=filter_expr).group_by(group_by).aggregate(aggregations)
+    assert act_table.column_names == group_by + ['value_count', 'value_max', 'horizon_min']
+    if group_by:
+        sort_keys = [(col_name, 'ascending') for col_name in group_by]
+        act_table, exp_table = act_table.sort_by(sort_keys), exp_table.sort_by(sort_keys)
+    assert act_table.select(exp_table.column_names) == exp_table
+
+
+def test_latest_versions_null_keys():
+    # nulls are key values: they match each other but not '', including in dictionary columns
+    table = pa.table({'key': pa.array(['a', None, '', 'a', None, '']).dictionary_encode(),
+                      'id': [1, None, None, 1, None, None],
+                      'version': [1, 1, 1, 2, 2, 0],
+                      'value': ['a1', 'null1', 'empty1', 'a2', 'null2', 'empty0']})
+    act_table = latest_versions(ds.dataset(table), ['key', 'id'], 'version')
+    assert act_table.schema == table.schema
+    assert sorted(act_table['value'].to_pylist()) == ['a2', 'empty1', 'null2']
+    assert sorted(latest_versions(ds.dataset(table), ['key', 'id'], 'version', ds.field('version') < 2)['value']
+                  .to_pylist()) == ['a1', 'empty1', 'null1']
+
+
+def test_sql():
+    pytest.importorskip('duckdb')
+    hub_connection = connect_hub(Path('test/hubs/v6_target_dir'))
+    act_table = hub_connection.sql("SELECT model_id, count(*) AS n FROM model_output WHERE output_type = 'quantile' "
+                                   "GROUP BY model_id ORDER BY model_id")
+    assert act_table.to_pylist() == [{'model_id': 'Flusight-baseline', 'n': 132},
+                                     {'model_id': 'MOBS-GLEAM_FLUH', 'n': 132},
+                                     {'model_id': 'PSI-DICE', 'n': 132}]
+
+    # target data relations
+    assert hub_connection.sql('SELECT count(*) AS n FROM oracle_output').to_pylist() == [{'n': 627}]
+    assert hub_connection.sql('SELECT count(*) AS n FROM time_series').to_pylist() \
+           == [{'n': connect_target_data(Path('test/hubs/v6_target_dir'), TargetType.TIME_SERIES).get_dataset()
+                .count_rows()}]
+
+    # case: hub without target data
+    with pytest.raises(RuntimeError, match='did not find'):
+        connect_hub(Path('test/hubs/simple')).sql('SELECT * FROM time_series')
+
+
+def test_sql_without_duckdb(monkeypatch):
+    monkeypatch.setattr(sys.modules['hubdata.sql'], 'duckdb', None)
+    with pytest.raises(ImportError, match='hubdata\\[sql\\]'):
+        connect_hub(Path('test/hubs/v6_target_dir')).sql('SELECT count(*) FROM model_output')
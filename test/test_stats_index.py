@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from hubdata import build_stats_index, connect_hub
+
+
+def _fragment_names(hub_ds, filter_expr) -> list[str]:
+    return sorted(Path(fragment.path).name for fragment in hub_ds.get_fragments(filter=filter_expr))
+
+
+def test_build_stats_index(tmp_path):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)  # mix of csv, parquet, and arrow files
+    stats_index_path = build_stats_index(tmp_path)
+    assert Path(stats_index_path) == (tmp_path / '.hubdata' / 'stats-index.parquet').absolute()
+
+    stats_index = pq.read_table(stats_index_path)
+    assert stats_index.num_rows == 8
+    assert stats_index.column_names == ['path', 'size', 'mtime_ns'] \
+           + [f'{col_name}.{stat}' for col_name in ['forecast_date', 'target', 'horizon', 'target_date', 'location',
+                                                    'output_type']
+              for stat in ['min', 'max', 'null_count']]
+    row = [row for row in stats_index.to_pylist() if row['path'] == 'umass-ens/2023-05-01-umass-ens.csv'][0]
+    assert (row['horizon.min'], row['horizon.max'], row['horizon.null_count']) == (2, 2, 0)
+    assert (row['output_type.min'], row['output_type.max']) == ('pmf', 'pmf')
+
+
+@pytest.mark.parametrize('filter_expr', [
+    pc.field('output_type') == 'mean',
+    pc.field('horizon') == 4,
+    pc.field('location').isin(['01', '02']),
+    (pc.field('output_type') == 'quantile') & (pc.field('horizon') < 3),
+])
+def test_get_dataset_stats_index(tmp_path, filter_expr):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)
+    exp_table = connect_hub(tmp_path).to_table(filter=filter_expr)
+    build_stats_index(tmp_path)
+
+    # the index lets pyarrow skip files, but the results are unchanged
+    act_table = connect_hub(tmp_path).to_table(filter=filter_expr)
+    assert act_table.sort_by('value') == exp_table.sort_by('value')
+
+
+def test_get_dataset_stats_index_skips_files(tmp_path):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)
+    build_stats_index(tmp_path)
+    hub_ds = connect_hub(tmp_path).get_dataset()
+    all_names = _fragment_names(hub_ds, None)
+    assert len(all_names) == 8
+
+    # only hub-baseline files have mean rows
+    assert _fragment_names(hub_ds, pc.field('output_type') == 'mean') \
+           == [name for name in all_names if 'hub-baseline' in name]
+
+    # modified files are not skipped until they are re-indexed
+    csv_path = tmp_path / 'forecasts' / 'umass-ens' / '2023-05-01-umass-ens.csv'
+    with open(csv_path, 'a') as csv_fp:
+        csv_fp.write('2023-05-01,1,wk ahead inc flu hosp,2023-05-08,US,mean,NA,42\n')
+    hub_ds = connect_hub(tmp_path).get_dataset()
+    assert '2023-05-01-umass-ens.csv' in _fragment_names(hub_ds, pc.field('output_type') == 'mean')
+    assert 42 in hub_ds.to_table(filter=pc.field('output_type') == 'mean')['value'].to_pylist()
+
+
+def test_build_stats_index_incremental(tmp_path):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)
+    stats_index_path = build_stats_index(tmp_path)
+    rows = {row['path']: row for row in pq.read_table(stats_index_path).to_pylist()}
+
+    # remove one file and modify another. only the modified one is re-read
+    os.remove(tmp_path / 'forecasts' / 'hub-baseline' / '2023-04-24-hub-baseline.csv')
+    csv_path = tmp_path / 'forecasts' / 'umass-ens' / '2023-05-01-umass-ens.csv'
+    with open(csv_path, 'a') as csv_fp:
+        csv_fp.write('2023-05-01,9,wk ahead inc flu hosp,2023-05-08,US,mean,NA,42\n')
+    new_rows = {row['path']: row for row in pq.read_table(build_stats_index(tmp_path)).to_pylist()}
+    assert 'hub-baseline/2023-04-24-hub-baseline.csv' not in new_rows
+    assert new_rows['umass-ens/2023-05-01-umass-ens.csv']['horizon.max'] == 9
+    assert new_rows['umass-ens/2023-05-01-umass-ens.csv']['output_type.min'] == 'mean'
+    unchanged_path = 'hub-ensemble/2023-05-08-hub-ensemble.parquet'
+    assert new_rows[unchanged_path] == rows[unchanged_path]
+
+
+def test_stats_index_schema_mismatch(tmp_path):
+    shutil.copytree('test/hubs/v4_flusight', tmp_path, dirs_exist_ok=True)
+    build_stats_index(tmp_path)
+    tasks_json_path = tmp_path / 'hub-config' / 'tasks.json'
+    with open(tasks_json_path) as tasks_fp:
+        tasks = json.load(tasks_fp)
+    tasks['output_type_id_datatype'] = 'character'
+    tasks['rounds'][0]['model_tasks'][0]['task_ids']['horizon']['optional'].append('x')  # horizon -> string
+    with open(tasks_json_path, 'w') as tasks_fp:
+        json.dump(tasks, tasks_fp)
+
+    hub_connection = connect_hub(tmp_path)
+    assert hub_connection._stats_expressions() is None